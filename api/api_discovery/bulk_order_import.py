@@ -0,0 +1,47 @@
+from functools import wraps
+from flask import request, jsonify
+from flask_jwt_extended import verify_jwt_in_request
+import logging
+import safrs
+from config.config import Args
+from logic.system import bulk_order_import
+
+app_logger = logging.getLogger("api_logic_server_app")
+
+def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_decorators = []):
+    pass
+
+    def admin_required():
+        """
+        Access token required if security enabled (as in ontimize_api.py, but not optional - this endpoint writes).
+        """
+        def wrapper(fn):
+            @wraps(fn)
+            def decorator(*args, **kwargs):
+                if Args.instance.security_enabled == False:
+                    return fn(*args, **kwargs)
+                verify_jwt_in_request()  # must be issued if security enabled
+                return fn(*args, **kwargs)
+            return decorator
+        return wrapper
+
+    @app.route('/bulk_order_import', methods=['POST'])
+    @admin_required()
+    def bulk_order_import_service():
+        """
+        Bulk load orders, with check_credit logic, in batched flushes (logic/system/bulk_order_import.py)
+
+        Test it with (if security is enabled, add -H "Authorization: Bearer <access_token>"):
+
+            curl -X POST http://localhost:5656/bulk_order_import -H "Content-Type: application/json" \\
+                -d '{"orders": [{"customer_id": 1, "notes": "bulk", "items": [{"product_id": 1, "quantity": 2}]}]}'
+        """
+        payload = request.get_json(silent=True)
+        orders = payload.get("orders") if isinstance(payload, dict) else payload
+        if not isinstance(orders, list):
+            return jsonify({"errors": ["expected {\"orders\": [...]}"]}), 400
+        try:
+            result = bulk_order_import.import_orders(safrs.DB.session, orders, log=app_logger.debug)
+        except bulk_order_import.BulkImportError as e:
+            return jsonify({"errors": e.errors}), 400
+        return jsonify(result)
@@ -9,6 +9,7 @@ import safrs
 from flask import request, jsonify
 from flask_jwt_extended import get_jwt, jwt_required, verify_jwt_in_request
 from safrs import jsonapi_rpc
+from safrs.errors import ValidationError
 from database import models
 import json
 import sys
@@ -22,6 +23,8 @@ from config.config import Config
 import os
 from pathlib import Path
 from api.system.expression_parser import parsePayload
+from api.system import resource_registry
+from api.system import batch_write
 from api.system.gen_pdf_report import gen_report
 from api.system.gen_csv_report import gen_report as csv_gen_report
 from api.system.gen_pdf_report import export_pdf
@@ -57,6 +60,7 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
     """
     _project_dir = project_dir
     app_logger.debug("api/api_discovery/ontimize_api.py - services for ontimize") 
+    resource_registry.build()  # model metadata, once - not per request
 
     
     def admin_required():
@@ -85,8 +89,7 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
             return jsonify({})
         resource = find_model(entity)
         api_clz = resource["model"]
-        resources = getMetaData(api_clz.__name__)
-        attributes = resources["resources"][api_clz.__name__]["attributes"]
+        attributes = resource["attributes"]
         if type in ["csv",'CSV']:
             return csv_gen_report(api_clz, request, entity, queryParm, columns, columnTitles, attributes) 
         elif type == "pdf": 
@@ -107,8 +110,7 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
         entity = payload["entity"]
         resource = find_model(entity)
         api_clz = resource["model"]
-        resources = getMetaData(api_clz.__name__)
-        attributes = resources["resources"][api_clz.__name__]["attributes"]
+        attributes = resource["attributes"]
     
         return gen_report(api_clz, request, _project_dir, payload, attributes)
     @app.route("/api/export/csv", methods=['POST','OPTIONS'])
@@ -184,12 +186,16 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
         api_attributes = resource["attributes"]
         api_clz = resource["model"]
         
-        payload = '{}' if request.data == b'' else json.loads(request.data)
+        payload = {} if request.data == b'' else json.loads(request.data)
+        if isinstance(payload, list) and method in ['POST','PUT','PATCH','DELETE']:
+            # batch: [{"filter": {key}, "data": {...}}, ...] - 1 keyed query, 1 commit
+            success, results = batch_write.batch_write(session, api_clz, method, payload)
+            message = f"{method}:True" if success else f"{method}: batch not written"
+            return jsonify({"code": 0 if success else 1, "message": message, "data": results, "sqlTypes": None})
         expressions, filter, columns, sqltypes, offset, pagesize, orderBy, data = parsePayload(api_clz, payload)
         result = {}
         if method == 'GET':
-            pagesize = 999 #if isSearch else pagesize
-            return get_rows(request, api_clz, filter, orderBy, columns, pagesize, offset)
+            return get_rows(request, api_clz, filter, orderBy, columns, pagesize, offset)  # pageSize, up to ONTIMIZE_MAX_PAGE_SIZE
         
         if method in ['PUT','PATCH']:
             sql_alchemy_row = session.query(api_clz).filter(text(filter)).one()
@@ -222,9 +228,8 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
                 #GET (sent as POST)
                 #rows = get_rows_by_query(api_clz, filter, orderBy, columns, pagesize, offset)
                 if "TypeAggregate" in clz_type:
-                    return get_rows_agg(request, api_clz, clz_type, filter, columns)
+                    return get_rows_agg(request, api_clz, clz_type, payload.get("filter", {}), columns, sqltypes)
                 else:
-                    pagesize = 999 # if isSearch else pagesize
                     return get_rows(request, api_clz, None, orderBy, columns, pagesize, offset)
         try:        
             session.commit()
@@ -239,12 +244,7 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
         return jsonify({"code":0,"message":f"{method}:True","data":result,"sqlTypes":None})   #{f"{method}":True})
     
     def find_model(clz_name:str) -> any:
-        clz_members = getMetaData()
-        resources = clz_members.get("resources")
-        for resource in resources:
-            if resource == clz_name:
-                return resources[resource]
-        return None
+        return resource_registry.resource(clz_name)
     
     def login(request):
         url = f"{request.scheme}://{request.host}/api/auth/login"
@@ -280,92 +280,23 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
         #return jsonify(access_token=access_token)
         return jsonify({"code":0,"message":"Login Successful","data":{"access_token":access_token}})
     
-    def get_rows_agg(request: any, api_clz, agg_type, filter, columns):
-        key = api_clz.__name__
-        resources = getMetaData(key)
-        attributes = resources["resources"][key]["attributes"]
-        list_of_columns = ""
-        sep = ""
-        attr_list = list(api_clz._s_columns)
-        table_name = api_clz._s_type
-        #api_clz.__mapper__.attrs #TODO map the columns to the attributes to build the select list
-        for a in attributes:
-            name = a["name"]
-            t = a["type"] #INTEGER or VARCHAR(N)
-            #list_of_columns.append(api_clz._sa_class_manager.get(n))
-            attr = a["attr"]
-            #MAY need to do upper case compares
-            if name in columns:
-                list_of_columns = f'{list_of_columns}{sep}{name}'
-                sep = ","
-        sql = f' count(*), {list_of_columns} from {table_name} group by {list_of_columns}'
-        print(sql)
-        # TODO HARDCODED for now....
-        data = {}
-        if "customerTypeAggregate" == agg_type:
-            data = {"data": [
-                {
-                    "AMOUNT": 24,
-                    "DESCRIPTION": "Normal"
-                },
-                {
-                    "AMOUNT": 15,
-                    "DESCRIPTION": "VIP"
-                },
-                {
-                    "AMOUNT": 36,
-                    "DESCRIPTION": "Other"
-                }
-            ]
-            }
-        elif "accountTypeAggregate" == agg_type:
-            data = {"data": [
-                {
-                    "AMOUNT": 32,
-                    "ACCOUNTTYPENAME": "Savings",
-                    "ACCOUNTTYPEID": 1
-                },
-                {
-                    "AMOUNT": 36,
-                    "ACCOUNTTYPENAME": "Checking",
-                    "ACCOUNTTYPEID": 0
-                },
-                {
-                    "AMOUNT": 30,
-                    "ACCOUNTTYPENAME": "Payroll",
-                    "ACCOUNTTYPEID": 3
-                },
-                {
-                    "AMOUNT": 23,
-                    "ACCOUNTTYPENAME": "Market",
-                    "ACCOUNTTYPEID": 2
-                }
-            ]
-            }
-        elif "employeeTypeAggregate" == agg_type:
-            data = {"data": [
-                {
-                    "AMOUNT": 27,
-                    "EMPLOYEETYPENAME": "Manager"
-                },
-                {
-                    "AMOUNT": 485,
-                    "EMPLOYEETYPENAME": "Employee"
-                }
-            ]
-            }
+    def get_rows_agg(request: any, api_clz, agg_type, filter: dict, columns: list, sqltypes: dict = None):
+        """ group by columns, with COUNT / SUM / AVG / MIN / MAX (api/system/aggregate_query.py) - filter is the Ontimize filter """
+        from api.system import aggregate_query
+        try:
+            rows = aggregate_query.aggregate(session, api_clz, columns, filter, sqltypes)
+        except ValidationError as ex:
+            return jsonify({"code": 1, "message": f"{agg_type}: {ex.message if hasattr(ex, 'message') else ex}", "data": None})
+        data = {"data": rows}
         data["code"] = 0
         data["message"] = ""
         data["sqlType"] = {}
-        #rows = session.query(text(sql)).all()
-        #rows = session.query(models.Account.ACCOUNTTYPEID,func.count(models.Account.AccountID)).group_by(models.Account.ACCOUNTTYPEID).all()
         return data
     
     def get_rows(request: any, api_clz, filter: str, order_by: str, columns: list, pagesize: int, offset: int):
         # New Style
         key = api_clz.__name__.lower()
-        resources = getMetaData(api_clz.__name__)
-        attributes = resources["resources"][api_clz.__name__]["attributes"]
+        attributes = resource_registry.resource(api_clz.__name__)["attributes"]
         list_of_columns = []
         for a in attributes:
             name = a["name"]
@@ -381,9 +312,17 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
                 
         from api.system.custom_endpoint import CustomEndpoint
         request.method = 'GET'
-        r = CustomEndpoint(model_class=api_clz, fields=list_of_columns, filter_by=filter, pagesize=pagesize, offset=offset)
-        result = r.execute(request=request)
+        payload = request.get_json(silent=True) or {}
+        stream = payload.get("stream") is True or request.args.get("stream") == "true"  # export: all rows, streamed
+        max_rows = Config.ONTIMIZE_EXPORT_MAX_ROWS if stream else Config.ONTIMIZE_MAX_PAGE_SIZE
+        if stream and not payload.get("pageSize") and not request.args.get("page[limit]"):
+            pagesize = max_rows
+        r = CustomEndpoint(model_class=api_clz, fields=list_of_columns, filter_by=filter, pagesize=min(int(pagesize), max_rows), offset=offset,
+                           max_pagesize=max_rows, count_mode=Config.ONTIMIZE_COUNT)
         service_type: str = Config.ONTIMIZE_SERVICE_TYPE
+        if stream:
+            return r.stream(request=request, style=service_type)
+        result = r.execute(request=request)
         return r.transform(service_type, key, result) # JSONAPI or LAC or OntimizeEE ARGS.service_type
     
     def get_rows_by_query(api_clz, filter, orderBy, columns, pagesize, offset):
@@ -434,62 +373,20 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
                     with contextlib.suppress(Exception):
                         my_date = float(data[t])/1000
                         data[t] = datetime.datetime.fromtimestamp(my_date) #.strftime('%Y-%m-%d %H:%M:%S')
-        """
-        Converts SQLAlchemy result (mapped or raw) to dict array of un-nested rows
-
-        Args:
-            result (object): list of serializable objects (e.g., dict)
-
-        Returns:
-            list of rows as dicts
-        """
-        rows = []
-        for each_row in result:
-            row_as_dict = {}
-            print(f'type(each_row): {type(each_row)}')
-            if isinstance (each_row, sqlalchemy.engine.row.Row):  # raw sql, eg, sample catsql
-                key_to_index = each_row._key_to_index             # note: SQLAlchemy 2 specific
-                for name, value in key_to_index.items():
-                    row_as_dict[name] = each_row[value]
-            else:
-                row_as_dict = each_row.to_dict()                  # safrs helper
-            rows.append(row_as_dict)
-        return rows
+        return data
 
 def getMetaData(resource_name:str = None, include_attributes: bool = True) -> dict:
-        import inspect
-        import sys
-        resource_list = []  # array of attributes[], name (so, the name is last...)
+        """ {"resources": {name: {"attributes": [...], "model": class}}} - from api/system/resource_registry.py (built once) """
         resource_objs = {}  # objects, named = resource_name
-
-        models_name = "database.models"
-        cls_members = inspect.getmembers(sys.modules["database.models"], inspect.isclass)
-        for each_cls_member in cls_members:
-            each_class_def_str = str(each_cls_member)
-            if (f"'{models_name}." in each_class_def_str and
-                            "Ab" not in each_class_def_str):
-                each_resource_name = each_cls_member[0]
-                each_resource_class = each_cls_member[1]
-                each_resource_mapper = each_resource_class.__mapper__
-                if resource_name is None or resource_name == each_resource_name:
-                    resource_object = {"name": each_resource_name}
-                    resource_list.append(resource_object)
-                    resource_objs[each_resource_name] = {}
-                    if include_attributes:
-                        attr_list = []
-                        for each_attr in each_resource_mapper.attrs:
-                            if not each_attr._is_relationship:
-                                try:
-                                    attribute_object = {"name": each_attr.key,
-                                                        "attr": each_attr,
-                                                        "type": str(each_attr.expression.type)}
-                                except Exception as ex:
-                                    attribute_object = {"name": each_attr.key,
-                                                        "exception": f"{ex}"}
-                                attr_list.append(attribute_object)
-                        resource_object["attributes"] = attr_list
-                        resource_objs[each_resource_name] = {"attributes": attr_list, "model": each_resource_class}
+        registry = resource_registry.resources()
+        if resource_name is not None:
+            each_resource = resource_registry.resource(resource_name)
+            registry = {resource_name: each_resource} if each_resource is not None else {}
+        for each_resource_name, each_resource in registry.items():
+            resource_objs[each_resource_name] = {}
+            if include_attributes:
+                resource_objs[each_resource_name] = {"attributes": each_resource["attributes"], "model": each_resource["model"]}
         # pick the format you like
         #return_result = {"resources": resource_list}
         return_result = {"resources": resource_objs}
-        return return_result
\ No newline at end of file
+        return return_result
@@ -19,6 +19,17 @@ def add_service(app, api, project_dir, swagger_host: str, PORT: str, method_deco
         """
         return api_utils.server_log(request, jsonify)
 
+
+    @app.route('/ai_supplier_metrics')
+    def ai_supplier_metrics():
+        """
+        AI supplier selection metrics (logic/system/ai_guard.py): decision latency, fallback rate, circuit state, eg
+
+        curl -X GET "http://localhost:5656/ai_supplier_metrics"
+        """
+        from logic.system import ai_guard
+        return jsonify(ai_guard.get_guard().metrics())
+
     
     @app.route('/metadata')
     def metadata():
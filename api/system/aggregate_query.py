@@ -0,0 +1,128 @@
+"""
+Aggregates (GROUP BY) for Ontimize *TypeAggregate services - used by api/api_discovery/ontimize_api.py (get_rows_agg)
+
+Requested columns are compiled into 1 parameterized query on the entity:
+
+    attribute names             group by columns (eg, "customer_id")
+    FUNC(attribute) / FUNC(*)   aggregates - COUNT, SUM, AVG, MIN, MAX (eg, "SUM(amount_total)"),
+                                returned under the requested name
+    AMOUNT                      COUNT(*) - also returned when no aggregates are requested
+
+The Ontimize filter ({"attribute": value, ...}) becomes bound parameters; filter expressions
+(@basic_expression, @filter_expression) use the expression parser, also with bound values.
+Grants apply (the query runs on the grants session).  Results are cached per (entity, columns, filter, user), and discarded on
+writes to the entity (api/system/record_count.py).
+
+You do not normally need to alter this file
+"""
+import datetime
+import decimal
+import json
+import logging
+import re
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from safrs.errors import ValidationError
+from api.system import record_count, resource_registry
+from api.system.expression_parser import BASIC_EXPRESSION, FILTER_EXPRESSION, filterClause
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE_FUNCTIONS = {"count": func.count, "sum": func.sum, "avg": func.avg, "min": func.min, "max": func.max}
+
+COUNT_COLUMN = "AMOUNT"
+""" COUNT(*), as the Ontimize aggregate services """
+
+_aggregate_pattern = re.compile(r"^\s*(\w+)\s*\(\s*(\*|\w+)\s*\)\s*$")
+
+
+def aggregate(session: Session, model_class, columns: list[str], filter: dict = None, sqltypes: dict = None) -> list[dict]:
+    """ Return (cached) aggregate rows of model_class - group by columns, with aggregates
+
+    Args:
+        session (Session): session with grants (eg, safrs.DB.session)
+        model_class: model.Entity
+        columns (list[str]): group by attributes, FUNC(attribute) aggregates, AMOUNT (see module doc)
+        filter (dict): Ontimize filter
+        sqltypes (dict): Ontimize sqltypes (for filter expressions)
+
+    Raises:
+        ValidationError: unknown column, filter column or aggregate function
+
+    Returns:
+        list[dict]: 1 row per group - {column: value}, ordered by the group by columns
+    """
+    filter = filter or {}
+    entity_name = model_class.__name__
+    group_by, aggregates = _compile_columns(model_class, columns)
+    key = ("aggregate", tuple(columns), json.dumps(filter, sort_keys=True, default=str),
+           json.dumps(sqltypes, sort_keys=True, default=str))
+
+    def query_aggregates() -> list[dict]:
+        select_list = [each_attr.label(each_name) for each_name, each_attr in group_by] \
+            + [each_aggregate.label(each_name) for each_name, each_aggregate in aggregates]
+        qry = session.query(*select_list).select_from(model_class).filter(*_compile_filter(model_class, filter, sqltypes))
+        if group_by:
+            group_attrs = [each_attr for each_name, each_attr in group_by]
+            qry = qry.group_by(*group_attrs).order_by(*group_attrs)
+        logger.debug(f"aggregate {entity_name}: {qry}")
+        return [{each_key: _json_value(each_value) for each_key, each_value in each_row._mapping.items()}
+                for each_row in qry.all()]
+
+    return record_count.cached(entity_name, key, query_aggregates)
+
+
+def _compile_columns(model_class, columns: list[str]) -> tuple[list, list]:
+    """ requested columns as ([(name, group by attribute)], [(name, aggregate)]) """
+    resource_columns = resource_registry.resource(model_class.__name__)["columns"]
+    attribute_names = {each_name.lower(): each_name for each_name in resource_columns}
+    group_by = []
+    aggregates = []
+    for each_column in columns:
+        if each_column == COUNT_COLUMN:  # before attributes - eg, Item.amount
+            aggregates.append((each_column, func.count()))
+        elif each_column.lower() in attribute_names:
+            group_by.append((each_column, getattr(model_class, attribute_names[each_column.lower()])))
+        elif match := _aggregate_pattern.match(each_column):
+            function_name, argument = match.group(1).lower(), match.group(2)
+            if function_name not in AGGREGATE_FUNCTIONS:
+                raise ValidationError(f"Unknown aggregate function {function_name} on entity {model_class.__name__}")
+            if argument == "*":
+                if function_name != "count":
+                    raise ValidationError(f"{function_name}(*) is not supported on entity {model_class.__name__}")
+                aggregates.append((each_column, func.count()))
+                continue
+            if argument.lower() not in attribute_names:
+                raise ValidationError(f"Unknown aggregate column {argument} on entity {model_class.__name__}")
+            attr = getattr(model_class, attribute_names[argument.lower()])
+            aggregates.append((each_column, AGGREGATE_FUNCTIONS[function_name](attr)))
+        else:
+            raise ValidationError(f"Unknown column {each_column} on entity {model_class.__name__}")
+    if not aggregates:
+        aggregates.append((COUNT_COLUMN, func.count()))
+    return group_by, aggregates
+
+
+def _compile_filter(model_class, filter: dict, sqltypes: dict) -> list:
+    """ attribute filters as bound parameters, expressions via the expression parser - other keys are rejected """
+    resource_columns = resource_registry.resource(model_class.__name__)["columns"]
+    criteria = []
+    for each_key, each_value in filter.items():
+        if each_key in resource_columns:
+            criteria.append(getattr(model_class, each_key) == each_value)
+        elif each_key in [BASIC_EXPRESSION, FILTER_EXPRESSION]:
+            clause = filterClause(model_class, {each_key: each_value}, sqltypes)
+            if clause is not None:
+                criteria.append(clause)
+        else:
+            raise ValidationError(f"Unknown filter column {each_key} on entity {model_class.__name__}")
+    return criteria
+
+
+def _json_value(value: any) -> any:
+    """ numbers for charts (SUM / AVG are Decimal on some databases), dates as text """
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
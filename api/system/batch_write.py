@@ -0,0 +1,150 @@
+"""
+Batched multi-row writes for Ontimize - used by api/api_discovery/ontimize_api.py (api_search)
+
+A JSON array payload writes many rows in 1 request (eg, grid bulk edits):
+
+    POST            [{"data": {...}}, ...]                              insert
+    PUT / PATCH     [{"filter": {key: value}, "data": {...}}, ...]      update
+    DELETE          [{"filter": {key: value}}, ...]                     delete
+
+Elements may also provide "sqltypes", as for single row writes.
+Update / delete filters identify rows by primary key - the rows are read with 1 keyed query (grants apply).
+Filter values are converted to the key column types (eg, "1" for an INTEGER key).
+
+All rows are written in 1 transaction, with 1 commit (logic is enforced on the flush).
+If any row fails, nothing is written.
+
+Returns 1 result per element, in order: {"code": 0 | 1, "message", "data"}
+
+You do not normally need to alter this file
+"""
+import datetime
+import logging
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from api.system import resource_registry
+from api.system.expression_parser import fixup_data
+
+logger = logging.getLogger(__name__)
+
+NOT_WRITTEN = "Not written - other rows in the batch failed"
+
+
+def batch_write(session: Session, model_class, method: str, rows: list) -> tuple[bool, list[dict]]:
+    """ Insert (POST), update (PUT / PATCH) or delete (DELETE) rows of model_class, with 1 commit
+
+    Args:
+        session (Session): session with grants (eg, safrs.DB.session)
+        model_class: model.Entity
+        method (str): POST | PUT | PATCH | DELETE
+        rows (list): payload elements (see module doc)
+
+    Returns:
+        tuple[bool, list[dict]]: (all rows written, per-row results)
+    """
+    resource = resource_registry.resource(model_class.__name__)
+    primary_key = resource["primary_key"]
+    key_types = _key_types(resource)
+    results = [None] * len(rows)
+    changes = []  # (index, key, data)
+    for index, each_row in enumerate(rows):
+        try:
+            changes.append((index, *_parse_row(method, each_row, primary_key, key_types)))
+        except ValueError as ex:
+            results[index] = _result(1, str(ex))
+
+    targets = {}
+    if method != "POST":
+        targets = _read_rows(session, model_class, primary_key, [each_key for _, each_key, _ in changes])
+
+    written = []
+    for index, each_key, each_data in changes:
+        if method == "POST":
+            sql_alchemy_row = model_class()
+            for each_name in resource["columns"]:
+                if each_data.get(each_name) is not None:
+                    setattr(sql_alchemy_row, each_name, each_data[each_name])
+            session.add(sql_alchemy_row)
+            written.append((index, sql_alchemy_row))
+            continue
+        sql_alchemy_row = targets.get(each_key)
+        if sql_alchemy_row is None:
+            results[index] = _result(1, f"{model_class.__name__} {dict(zip(primary_key, each_key))} not found")
+        elif method == "DELETE":
+            session.delete(sql_alchemy_row)
+            written.append((index, dict(zip(primary_key, each_key))))
+        else:
+            for each_name, each_value in each_data.items():
+                setattr(sql_alchemy_row, each_name, each_value)
+            written.append((index, sql_alchemy_row))
+
+    if any(each_result is not None for each_result in results):
+        session.rollback()
+        return False, [each_result or _result(1, NOT_WRITTEN) for each_result in results]
+    try:
+        session.commit()
+    except Exception as ex:
+        session.rollback()
+        msg = f"{ex.message if hasattr(ex, 'message') else ex}"
+        logger.info(f"batch {method} {model_class.__name__} ({len(rows)} rows) failed: {msg}")
+        return False, [_result(1, msg) for _ in rows]
+    logger.debug(f"batch {method} {model_class.__name__}: {len(rows)} rows")
+    for index, each_written in written:
+        results[index] = _result(0, f"{method}:True", each_written)
+    return True, results
+
+
+def _parse_row(method: str, row: any, primary_key: tuple, key_types: tuple) -> tuple[tuple, dict]:
+    """ (key values, data) of a payload element - raises ValueError if not valid for method """
+    if not isinstance(row, dict):
+        raise ValueError(f"Batch rows must be objects, not {row}")
+    data = fixup_data(row.get("data"), row.get("sqltypes")) or {}
+    if method in ["POST", "PUT", "PATCH"] and not data:
+        raise ValueError("Batch row has no data")
+    if method == "POST":
+        return (), data
+    filter = row.get("filter") or {}
+    missing = [each_name for each_name in primary_key if each_name not in filter]
+    if missing:
+        raise ValueError(f"Batch row filter must provide the primary key {list(primary_key)} - missing {missing}")
+    return tuple(_typed_value(each_name, filter[each_name], each_type)
+                 for each_name, each_type in zip(primary_key, key_types)), data
+
+
+def _key_types(resource) -> tuple:
+    """ python type of each primary key column (None - not known) """
+    key_types = []
+    for each_name in resource["primary_key"]:
+        try:
+            key_types.append(resource["columns"][each_name].type.python_type)
+        except NotImplementedError:
+            key_types.append(None)
+    return tuple(key_types)
+
+
+def _typed_value(name: str, value: any, python_type: type) -> any:
+    """ filter value as the key column type (eg, "1" for 1) - raises ValueError if not convertible """
+    if python_type is None or value is None or isinstance(value, python_type):
+        return value
+    try:
+        if python_type in [datetime.date, datetime.datetime, datetime.time] and isinstance(value, str):
+            return python_type.fromisoformat(value)
+        return python_type(value)
+    except (TypeError, ValueError) as ex:
+        raise ValueError(f"Batch row filter {name} must be {python_type.__name__}, not {value}") from ex
+
+
+def _read_rows(session: Session, model_class, primary_key: tuple, keys: list[tuple]) -> dict:
+    """ {key: row} for keys - 1 query """
+    if not keys:
+        return {}
+    if len(primary_key) == 1:
+        criteria = getattr(model_class, primary_key[0]).in_([each_key[0] for each_key in keys])
+    else:
+        criteria = tuple_(*[getattr(model_class, each_name) for each_name in primary_key]).in_(keys)
+    return {tuple(getattr(each_row, each_name) for each_name in primary_key): each_row
+            for each_row in session.query(model_class).filter(criteria).all()}
+
+
+def _result(code: int, message: str, data: any = None) -> dict:
+    return {"code": code, "message": message, "data": data}
@@ -4,13 +4,14 @@ import logging
 import contextlib
 from sqlalchemy import Column, Table, ForeignKey
 from sqlalchemy.orm.decl_api import DeclarativeMeta #sqlalchemy.orm.decl_api.DeclarativeMeta
-from sqlalchemy.orm import relationships, relationship
+from sqlalchemy.orm import relationships, relationship, selectinload, joinedload, load_only
+from sqlalchemy.orm.interfaces import ONETOMANY, MANYTOONE
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy_utils import get_referencing_foreign_keys
 from sqlalchemy import event, MetaData, and_, or_
 from sqlalchemy.inspection import inspect
 from sqlalchemy.sql import text
-from flask import jsonify
+from flask import jsonify, Response, stream_with_context
 from sqlalchemy_utils.query_chain import QueryChain
 import flask_sqlalchemy
 import safrs
@@ -18,10 +19,15 @@ from safrs.errors import JsonapiError, ValidationError
 from security.system.authorization import Security
 from typing import List, Dict, Tuple
 import json 
-import requests
+import base64
+import datetime
+import decimal
+import functools
+import importlib
 import config.config as config
-from config.config import Args
-from api.system.expression_parser import parsePayload
+from config.config import Args, OptLocking
+from api.system.expression_parser import parsePayload, filterClause
+from api.system import record_count, resource_registry
 
 resource_logger = logging.getLogger("api.customize_api")
 
@@ -30,6 +36,73 @@ db = safrs.DB
 
 session = db.session  # type: sqlalchemy.orm.scoping.scoped_session
 
+IN_LIST_CHUNK_SIZE = {"sqlite": 999, "mssql": 2000, "oracle": 1000}
+""" bound parameters per join key IN list, by dialect (default 1000) - more keys are fetched in chunks """
+
+CHILD_LIMIT = 10
+""" rows per parent row, for child endpoints """
+
+
+_json_encoder = None
+
+def json_encoder() -> callable:
+    """ compact JSON encoder (obj -> str) for streamed responses, per Config.CUSTOM_ENDPOINT_JSON_ENCODER """
+    global _json_encoder
+    if _json_encoder is None:
+        name = config.Config.CUSTOM_ENDPOINT_JSON_ENCODER or "json"
+        if name == "orjson":
+            try:
+                import orjson
+                _json_encoder = lambda obj: orjson.dumps(obj, default=str).decode("utf-8")
+            except ImportError:
+                resource_logger.warning("CUSTOM_ENDPOINT_JSON_ENCODER: orjson is not installed - using json")
+        elif name != "json":
+            module_name, function_name = name.split(":")
+            _json_encoder = getattr(importlib.import_module(module_name), function_name)
+        if _json_encoder is None:
+            _json_encoder = functools.partial(json.dumps, ensure_ascii=False, separators=(",", ":"), default=str)
+    return _json_encoder
+
+
+def _decimal_to_str(value: any) -> any:
+    return str(value) if isinstance(value, decimal.Decimal) else value
+
+
+def _date_to_str(value: any) -> any:
+    return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime.date) else value
+
+
+def _value_to_str(value: any) -> any:
+    return _date_to_str(_decimal_to_str(value))
+
+
+_row_converters: dict = {}
+
+
+def row_converter(model_class: DeclarativeMeta) -> tuple:
+    """
+    CustomEndpoint.rows_to_dict conversions for model_class, resolved once from its column types:
+    ([(key, converter)] - Decimal / date columns as strings, keys skipped (state, relationships), add id attribute)
+    """
+    if model_class not in _row_converters:
+        mapper = inspect(model_class)
+        converters = []
+        for each_attr in mapper.column_attrs:
+            try:
+                python_type = each_attr.columns[0].type.python_type
+            except NotImplementedError:
+                python_type = None  # unknown: check each value
+            if python_type is None:
+                converters.append((each_attr.key, _value_to_str))
+            elif issubclass(python_type, decimal.Decimal):
+                converters.append((each_attr.key, _decimal_to_str))
+            elif issubclass(python_type, datetime.date):
+                converters.append((each_attr.key, _date_to_str))
+        skip = {"_sa_instance_state"} | set(mapper.relationships.keys())  # loaded relationships are in __dict__ too
+        id_attr = "id" not in mapper.column_attrs and hasattr(model_class, "id")
+        _row_converters[model_class] = (converters, skip, id_attr)
+    return _row_converters[model_class]
+
 
 class DotDict(dict):
     """ dot.notation access to dictionary attributes """
@@ -81,6 +154,9 @@ class CustomEndpoint():
             , isCombined: bool = False
             , pagesize: int = 100
             , offset: int = 0
+            , compiled_query: bool = False
+            , max_pagesize: int = None
+            , count_mode: str = None
             ):
         """
 
@@ -97,6 +173,10 @@ class CustomEndpoint():
             :order_by is Column object used to sort aac result (e.g. order_by=models.Customer.Name)
             :isParent = if True - use parent foreign key to join single lookup (ManyToOne)
             :isCombined =  combine the fields of the isParent = routeTrue with the _parentResource (flatten) 
+            :compiled_query = if True (root) - fetch the tree with 1 statement + relationship loaders (selectinload/joinedload)
+            :pagesize = most rows per page - requests (page[limit] / pageSize) may ask for fewer
+            :max_pagesize = most rows per page, whatever the request asks for (None - no limit)
+            :count_mode = totalQueryRecordsNumber unless the request says (count=): exact | estimated | none
             
         """
         if not model_class:
@@ -116,6 +196,9 @@ class CustomEndpoint():
         self.isParent= isParent 
         self.pagesize = pagesize
         self.offset = offset
+        self.compiled_query = compiled_query
+        self.max_pagesize = max_pagesize
+        self.count_mode = count_mode
         self.totalQueryRecordsNumber =  999
         self.startRecordIndex = 0
         if isinstance(join_on, tuple):
@@ -131,17 +214,27 @@ class CustomEndpoint():
         self._model_class_name: str = self._model_class._s_class_name
         # inspect(model_class).primary_key[0].type = Integer() ...
         self._parentResource: CustomEndpoint = None  # ROOT
-        self._pkeyList: list = [] # primary key list  collect when needed - do not store
-        self._fkeyList: list = [] # foreign_key list (used by isParent)  collect when needed - do not store
+        self._pkeyList: dict = {} # primary keys (ordered set - dict keys)  collect when needed - do not store
+        self._fkeyList: dict = {} # foreign_keys (ordered set, used by isParent)  collect when needed - do not store
+        self._joinKeyName: str = None # child: key attribute filtered by the parent keys (rows are limited per value)
         self._dictRows: list = [] # temporary holding for query results (Phase 1)
+        self._rowIndex: dict = {} # _dictRows grouped by join key value, per key name (built when linking)
+        self._loadedRows: list = [] # compiled_query: ORM rows, with children loaded
+        self._rowsRead: bool = False # get: root rows already read (execute does not query them again, even if none)
+        self._streaming: str = None # stream: response style
+        self._shaper: tuple = None # (field pairs,) - fields compiled by _fieldPairs
+        self._keyset: dict = None # keyset pagination (root): decoded continuation token ({} - first page), None - offset paging
+        self._keysetLast = None # keyset: last root row read, and rows read (for the next continuation token)
+        self._keysetCount: int = 0
+        self._keysetSort: tuple = (None, True) # keyset: (sort attribute or None - primary key only, ascending)
+        self._payloadFilter: tuple = None # (filter SQL, clause with bound values) - payload filter (filterClause)
+        self._countMode: str = None # totalQueryRecordsNumber: exact | estimated (record_count), None - not counted (999)
+        self.continuationToken: str = None # keyset: token for the next page (None - no more rows)
         self._parentRow = Dict[str, any] # keep track of linkage
         self._method = None
         self._href = None
         self._columnNames = [k.key for k in self._model_class._s_columns]
-        key = self._model_class_name
-        from api.api_discovery.ontimize_api import getMetaData
-        resources = getMetaData(key)
-        self._attributes = resources["resources"][key]["attributes"]
+        self._attributes = resource_registry.resource(self._model_class.__name__)["attributes"]
         self._quote = '`' if Args.backtic_as_quote else '"'
         
     def __str__(self):
@@ -162,38 +255,48 @@ class CustomEndpoint():
         if request.method == 'OPTIONS':
             return jsonify(success=True)
         
-        serverURL = f"{request.host_url}api"
-        query = f"{serverURL}/{self._model_class_name}?include={include}"
         args = request.args
         key, value,  limit, offset, order_by, filter_ = self.parseArgs(args)
+        qry = session.query(self._model_class)  # in-process: grants apply to the session, as for /api
         if altKey is not None:
-            query += f"&filter%5B{self.primaryKey}%5D={altKey}"
+            qry = qry.filter(getattr(self._model_class, self.primaryKey) == altKey)
         elif key is not None and value is not None:
-            query += f"&filter%5B{key}%5D={value}"
-        else: 
-            #query =  query if filter_ is None or filter_ is '1=1' else f"{query} and {filter_}"
-            query = (
-                query
-                if filter_ is None or filter_ == '1=1'
-                else f"{query} and {filter_}"
-            )
+            key_name, key_value = key.strip('"`'), value.strip("'")  # filter / sysfilter values are bound, not SQL text
+            if key_name not in self._columnNames:
+                raise ValidationError(f"Unknown attribute {key_name} on entity {self._model_class_name}")
+            qry = qry.filter(getattr(self._model_class, key_name) == key_value)
+        elif filter_ is not None and filter_ != '1=1':
+            filter_name, equals, filter_value = filter_.partition("=")
+            filter_name = filter_name.strip().strip('"`')
+            if not equals or filter_name not in self._columnNames:  # request values are bound, never SQL text
+                raise ValidationError(f"filter must be attribute=value on entity {self._model_class_name}: {filter_}")
+            qry = qry.filter(filterClause(self._model_class, {filter_name: filter_value.strip().strip("'")}))
+        if order_by is not None and order_by in self._columnNames:
+            qry = qry.order_by(getattr(self._model_class, order_by))
         self._href = f"{request.url_root[:-1]}{request.path}"
-        print(f"limit: {limit}, offset: {offset}, sort: {order_by}, query: {query}")
-        params = {'page[limit]': limit, 'page[offset]': offset}
-        resource_logger.debug(f"CustomEndpoint get using query: {query}")
-        if Args.security_enabled:
-            jwt = request.headers.get("Authorization") or ""
-            header = {"Authorization": jwt,"Content-Type": "application/json"}
-            result = requests.get(query, headers=header, params=params)
-        else:
-            result = requests.get(query, params=params)
-        if result.status_code == 200:
-            jsonResult = json.loads(result.content)
-            self._populateResponse(jsonResult) # Pass the JSON result to CustomEndpoint 
-            result = self.execute(request) # a dict of args
-            return result
-        return {"error": result.status_code}
+        resource_logger.debug(f"limit: {limit}, offset: {offset}, sort: {order_by}, include: {include}")
+        resource_logger.debug(f"CustomEndpoint get using query: {qry}")
+        for row in qry.limit(int(limit)).offset(int(offset)).all():
+            attributes = self._attributesOf(row)  # as the JSON:API response (children: per-level queries)
+            self._dictRows.append(attributes)
+            self._pkeyList[attributes[self.primaryKey]] = None
+        self._rowsRead = True
+        return self.execute(request) # a dict of args
         
+    def stream(self: CustomEndpoint, request: safrs.request.SAFRSRequest, altKey: str = None, style: str = "LAC") -> Response:
+        """
+        execute (GET) as a streaming Response - rows are serialized one at a time, compact
+        (Config.CUSTOM_ENDPOINT_JSON_ENCODER), and endpoints without children read rows in batches,
+        so memory stays flat for large pages and exports.
+
+        Args:
+            :request (safrs.request.SAFRSRequest):
+            :altKey (str, optional): as execute
+            :style (str): "LAC" ({alias: [rows]}), or "OntimizeEE" / "JSONAPI" (as transform)
+        """
+        self._streaming = style
+        return self.execute(request, altKey)
+
     def execute(self: CustomEndpoint, request: safrs.request.SAFRSRequest, altKey: str = None) -> dict:
         """
         execute a model_class resource 
@@ -206,6 +309,9 @@ class CustomEndpoint():
             'page[limit]=10 or limit=10
             'sort=CompanyName'
             'filter[id]=ALFKI or Id=ALFKI
+            'continuationToken=' (or Ontimize payload "continuationToken") - keyset pagination: pass the
+                continuationToken of the previous response ("" or null for the first page)
+            'count=exact | estimated' (or Ontimize payload "count", default Config.CUSTOM_ENDPOINT_COUNT) - totalQueryRecordsNumber
             
         #self._model_class.get_instance("ALFKI") returns the Cusomter/OrderList/OrderDetailList and Product
         #util.row_to_dict(self._model_class.get_instance("ALFKI").OrderList[0].OrderDetailList[0].Product)
@@ -234,16 +340,14 @@ class CustomEndpoint():
             args = request.args
             if len(request.data) > 0:
                 payload = json.loads(request.data.decode('utf-8'))
-            self._printIncludes(1) # debug print
+            if resource_logger.isEnabledFor(logging.DEBUG):
+                self._printIncludes(1)
             if method == 'DELETE':
                 raise ValidationError( 'Delete is not supported at this time')
             elif method == 'OPTIONS':
                 return jsonify(success=True)
             elif method in ["PUT","PATCH"]:
-                api = "api" # TODO Args.api_prefix()
-                serverURL = f"{request.host_url}{api}"
-                url = f"{serverURL}/{self._model_class_name}"
-                return self.handlePayload(method=method, payload=payload, url=url, jwt=jwt, altKey=altKey)
+                return self.handlePayload(method=method, payload=payload, altKey=altKey)
             elif method == 'POST':
                 try:
                     return self.insert_or_update(payload=payload, altKey=altKey)
@@ -252,8 +356,16 @@ class CustomEndpoint():
             elif method == 'GET':
                 if payload:
                     expressions, filter_, columns, sqltypes, offset, limit, order_by, data = parsePayload(clz=self._model_class, payload=payload)
+                    if filter_:
+                        self._payloadFilter = (filter_, filterClause(self._model_class, payload.get("filter") or {}, sqltypes))
                 else:
                     pkey , value,  limit, offset, order_by , filter_  = self.parseArgs(args)
+                if "continuationToken" in payload or "continuationToken" in args:
+                    self._keysetSort = self._keysetOrder(order_by)
+                    self._keyset = self.decodeContinuationToken(
+                        payload.get("continuationToken") if "continuationToken" in payload else args.get("continuationToken"))
+                    offset = self._keyset.get("i", offset)
+                self._countMode = record_count.count_mode(payload.get("count") if "count" in payload else args.get("count"), self.count_mode)
         #serverURL = f"{request.host_url}api"
         #query = f"{serverURL}/{self._model_class_name}"
         self.startRecordIndex = int(offset)
@@ -263,18 +375,34 @@ class CustomEndpoint():
         _quote = '`' if Args.backtic_as_quote else '"'
         if value is not None and value != 'undefined':
             filter_by = f'{_quote}{pkey}{_quote} = {self.quoteStr(value)}'
-            self._pkeyList.append(self.quoteStr(value))
+            self._pkeyList[self.quoteStr(value)] = None
         elif altKey is not None:
             filter_by = f'{_quote}{pkey}{_quote} = {self.quoteStr(altKey)}'
-            self._pkeyList.append(self.quoteStr(altKey))
+            self._pkeyList[self.quoteStr(altKey)] = None
         filter_by = filter_by if filter_ is None else f"{filter_by} and {filter_}" if filter_by is not None else filter_
         self._href = f"{request.url_root[:-1]}{request.path}"
-        limit =  max(self.pagesize, int(limit))
-        print(f"limit: {limit}, offset: {offset}, sort: {order_by},filter_by: {filter_by}, add_filter {filter_}")
+        limit = min(max(int(limit), 1), self.pagesize)  # the request may ask for fewer rows, not more
+        if self.max_pagesize is not None:
+            limit = min(limit, self.max_pagesize)
+        resource_logger.debug(f"limit: {limit}, offset: {offset}, sort: {order_by},filter_by: {filter_by}, add_filter {filter_}")
         try:
-            self._createRows(limit=limit,offset=offset,order_by=order_by,filter_by=filter_by, expressions=expressions) 
-            self._executeChildren()
+            if self._countMode is not None:
+                self.totalQueryRecordsNumber = self._countRows(filter_by)
+            options = self._compiledOptions() if self.compiled_query else None
+            if options is not None:
+                self._createRows(limit=limit,offset=offset,order_by=order_by,filter_by=filter_by, expressions=expressions, options=options)
+                self._populateLoadedChildren(self._loadedRows)
+            else:
+                self._createRows(limit=limit,offset=offset,order_by=order_by,filter_by=filter_by, expressions=expressions) 
+                self._executeChildren()
+            if self._streaming:
+                return self._streamResponse(self._streaming, limit)
             self._modifyRows(result)
+            if self._keyset is not None:
+                self.continuationToken = self._nextContinuationToken(limit)
+                result["continuationToken"] = self.continuationToken
+            if self._countMode is not None:
+                result["totalQueryRecordsNumber"] = self.totalQueryRecordsNumber
             return json.dumps(result, indent=4, ensure_ascii=False).encode('utf8')
         except Exception as ex:
             resource_logger.error(f"CustomEndpoint error {ex}")
@@ -294,54 +422,151 @@ class CustomEndpoint():
                 child._href = f"{self.modifyPath(self._href)}{child._model_class_name}"
                 child._processChildren()
         
-    def _collectPKeys(self, keyName)-> list:
-        keyList = []
+    def _childList(self) -> list[CustomEndpoint]:
+        return [self.children] if isinstance(self.children, CustomEndpoint) else self.children
+
+    def _compiledOptions(self) -> list | None:
+        """
+        compiled_query: the CustomEndpoint tree as loader options on the root query -
+        selectinload for children (1 IN query per level), joinedload for isParent lookups, load_only per level fields.
+
+        Returns None (use per-level queries) if security is enabled (relationship loads bypass grants),
+        a join is not a relationship (eg, join_on list), or a child has filter_by / order_by
+        """
+        if Args.instance.security_enabled:
+            resource_logger.debug("compiled_query: security enabled - using per-level queries (grants)")
+            return None
+        options = self._loaderOptions()
+        if options is None:
+            return None
+        columns = self._loadColumns()
+        return [load_only(*columns)] + options if columns else options
+
+    def _loaderOptions(self) -> list | None:
+        options = []
+        for child in self._childList():
+            relationship = self._relationshipTo(child)
+            child_options = child._loaderOptions()
+            if relationship is None or child_options is None:
+                resource_logger.debug(f"compiled_query: no relationship for {child.alias} - using per-level queries")
+                return None
+            if child.filter_by is not None or child.order_by is not None:
+                resource_logger.debug(f"compiled_query: filter_by / order_by on {child.alias} - using per-level queries")
+                return None
+            loader = joinedload(relationship) if child.isParent else selectinload(relationship)
+            columns = child._loadColumns()
+            if columns:
+                loader = loader.load_only(*columns)
+            if child_options:
+                loader = loader.options(*child_options)
+            options.append(loader)
+        return options
+
+    def _relationshipTo(self, child: CustomEndpoint) -> any:
+        """ relationship attribute (on this model) for child.join_on - 1:n for children, n:1 for isParent """
+        join = child.join_on
+        if isinstance(join, list) or join is None:
+            return None
+        if not isinstance(join, tuple) and isinstance(join.property, sqlalchemy.orm.RelationshipProperty):
+            return join if join.class_ is self._model_class else None
+        join_columns = {each.property.columns[0] for each in (join if isinstance(join, tuple) else (join,))}
+        for each_relationship in inspect(self._model_class).relationships:
+            if each_relationship.mapper.class_ is child._model_class \
+                    and each_relationship.direction == (MANYTOONE if child.isParent else ONETOMANY) \
+                    and join_columns & (set(each_relationship.local_columns) | set(each_relationship.remote_side)):
+                return getattr(self._model_class, each_relationship.key)
+        return None
+
+    def _loadColumns(self) -> list:
+        """ fields + key columns (for load_only), or [] for all columns (checksums read every column) """
+        if Args.instance.opt_locking != OptLocking.IGNORED.value:
+            return []
+        return self._projectedColumns()
+
+    def _projectedColumns(self) -> list:
+        """ attributes for fields (as _modifyRow), primary and foreign keys (for linking) - [] if no fields """
+        pairs = self._fieldPairs()
+        if pairs is None:
+            return []
+        names = {fieldName for fieldName, alias in pairs}
+        result = []
+        for each_attr in inspect(self._model_class).column_attrs:
+            column = each_attr.columns[0]
+            if each_attr.key in names or column.primary_key or column.foreign_keys \
+                    or each_attr is self._keysetProperty():
+                result.append(getattr(self._model_class, each_attr.key))
+        return result
+
+    def _populateLoadedChildren(self, rows: list):
+        """ compiled_query: children's _dictRows from the relationships loaded with rows (no queries) """
+        for child in self._childList():
+            child._parentResource = self
+            child._href = f"{self.modifyPath(self._href)}{child._model_class_name}"
+            child._createFilterFromKeys()  # join keys (foreignKey, primaryKey) as per-level
+            key = self._relationshipTo(child).key
+            loaded = {}
+            for row in rows:
+                related = getattr(row, key)
+                for each in related[:CHILD_LIMIT] if isinstance(related, list) else [] if related is None else [related]:
+                    loaded[id(each)] = each
+            child._loadedRows = list(loaded.values())
+            child._dictRows = self.rows_to_dict(child._loadedRows)
+            child._rowIndex = {}
+            child._populateLoadedChildren(child._loadedRows)
+
+    def _collectPKeys(self, keyName)-> dict:
+        keyList = {}
         if keyName is None:
             return keyList
         for row in self._dictRows:
-            if keyName in row:
-                key = row.get(keyName)
-                if key is not None and key not in keyList:
-                    keyList.append(key)
+            key = row.get(keyName)
+            if key is not None:
+                keyList[key] = None
 
         self._pkeyList = keyList
         return keyList
         
-    def _collectParentKeys(self, keyName: str) -> list:
-        keyList = []
+    def _collectParentKeys(self, keyName: str) -> dict:
+        keyList = {}
         #if not self.isParent or keyName is None:
         if self._parentResource is None or keyName is None:
             return self._parentResource._pkeyList
         for row in self._parentResource._dictRows:
-            if keyName in row:
-                key = row.get(keyName)
-                if key is not None and key not in keyList:
-                    keyList.append(key)
+            key = row.get(keyName)
+            if key is not None:
+                keyList[key] = None
 
         self._fkeyList = keyList
         return keyList
 
-    def _createRows(self,limit:int = 10, offset = 0, filter_by: str = None, order_by: str = None, expressions: list = []):
+    def _createRows(self,limit:int = CHILD_LIMIT, offset = 0, filter_by: str = None, order_by: str = None, expressions: list = [], options: list = None):
         """
         execute and store rows based on list of keys in model
-        :limit = 10
-        :offset = 0
+        :limit = CHILD_LIMIT (children: per parent row)
+        :offset = 0 (children: per parent row)
         :filter_by root only
         :order_by root only
         :expressions = list of expressions
+        :options = loader options (compiled_query root) - rows kept in _loadedRows
         """
         # If _populateResponse is used - the _dictRows are already filled
         # or the parent resource has now rows - so no need to fetch
-        if len(self._dictRows) > 0 or \
+        if self._rowsRead or len(self._dictRows) > 0 or \
             (self._parentResource is not None \
             and len(self._parentResource._dictRows) == 0):
             return
         model_class = self._model_class
         model_class_name = self._model_class_name
-        queryFilter = self._createFilterFromKeys()
-        session_qry= session.query(model_class)
+        queryFilters = self._createFilterFromKeys()
+        columns = self._projectedColumns() if options is None and self.calling is None else []
+        if columns:  # read only: Row tuples of fields + keys (no entities, identity map or checksum events)
+            session_qry = session.query(*columns)
+        else:
+            session_qry= session.query(model_class)
+        if options:
+            session_qry = session_qry.options(*options)
         #result = session.execute(select(model_class).where(text("Id = 'ALFKI'"))).all() #.join(models.Customer.OrderList)).order()
-        if queryFilter is None or queryFilter == 'None':
+        if queryFilters is None:
             #query = select(self._model_class)
             resource_logger.debug(
                     f"CreateRows on {model_class_name} using filter_by: {self.filter_by} order_by: {self.order_by}")
@@ -352,13 +577,13 @@ class CustomEndpoint():
                 if filter_by is not None and 'undefined' not in filter_by:
                     resource_logger.debug(
                     f"Adding filter_by: {filter_by}")
-                    qry = qry.filter(text(filter_by))
-                rows = qry.limit(limit).offset(offset).all()
+                    qry = qry.filter(self._filterCriteria(filter_by))
+                rows = self._fetchPage(qry, limit, offset)
             else:
                 if filter_by is not None:
                     resource_logger.debug(
                     f"Adding filter_by: {filter_by}")
-                    session_qry = session_qry.filter(text(filter_by))
+                    session_qry = session_qry.filter(self._filterCriteria(filter_by))
                 
                 if order_by:
                     if isinstance(order_by, list) and len(order_by) > 0:
@@ -374,34 +599,177 @@ class CustomEndpoint():
                     else:
                         if order_by in self._attributes:
                             session_qry = session_qry.order_by(text(order_by))
-                rows = session_qry.limit(limit).offset(offset).all()
+                rows = self._fetchPage(session_qry, limit, offset)
         else:
             resource_logger.debug(
-                f"CreateRows on {model_class_name} using QueryFilter: {queryFilter} order_by: {self.order_by}")
+                f"CreateRows on {model_class_name} using QueryFilter: {queryFilters[0]} ({len(queryFilters)} chunks) order_by: {self.order_by}")
+            rows = []
+            ordering = []
             if self.order_by is not None:
-                    if self.order_by in self._attributes:
-                        session_qry = session_qry.filter(text(queryFilter)).order_by(self.order_by)
-            elif  self.filter_by is None:
-                session_qry = session_qry.filter(text(queryFilter))
-            else:
-                if filter_by:
-                    resource_logger.debug(
-                    f"Adding on {model_class_name} using filter_by: {filter_by}")
-                    session_qry = session_qry.filter(text(filter_by))#.filter(text(self.filter_by))
+                ordering.append(self.order_by)
             if order_by:
                 col_name = order_by[0]["columnName"]
                 for a in self._attributes:
                     if a['attr'].key == col_name:
                         col_name = a['attr'].columns[0].name
                         break
-                session_qry = session_qry.order_by(text(col_name))
-            rows = session_qry.limit(limit).offset(offset).all()
+                ordering.append(text(col_name))
+            for queryFilter in queryFilters:  # 1 query per chunk of parent keys (and filter_by)
+                chunk_filters = [queryFilter]
+                if filter_by:
+                    resource_logger.debug(
+                    f"Adding on {model_class_name} using filter_by: {filter_by}")
+                    chunk_filters.append(self._filterCriteria(filter_by))
+                rows += self._limitPerParent(session_qry, chunk_filters, ordering, limit, offset).all()
         if rows:    
-            dictRows = self.rows_to_dict(rows)
+            dictRows = self._iterRowsToDict(rows) if self._isStreamingRows() else self.rows_to_dict(rows)
             self._dictRows = dictRows
+            self._rowIndex = {}
+            if options is not None:
+                self._loadedRows = rows
         
 
-    def _createFilterFromKeys(self):
+    def _limitPerParent(self, qry, filters: list, ordering: list, limit: int, offset: int):
+        """ qry for child rows, from offset up to limit rows for each parent key - bounded in SQL:
+
+            ... JOIN (SELECT pkey, ROW_NUMBER() OVER (PARTITION BY fkey ORDER BY ordering, pkey) AS row_number
+                      FROM child WHERE filters) ON pkey WHERE row_number > offset AND row_number <= offset + limit
+        """
+        mapper = inspect(self._model_class)
+        primaryKeys = list(mapper.primary_key)
+        joinKey = mapper.columns[self._joinKeyName] if self._joinKeyName in mapper.columns \
+            else mapper.local_table.c[self._joinKeyName]
+        rowNumber = sqlalchemy.func.row_number().over(partition_by=joinKey, order_by=ordering + primaryKeys)
+        ranked = session.query(*primaryKeys, rowNumber.label("row_number")).filter(*filters).subquery()
+        return qry.join(ranked, and_(*[each == rankedKey for each, rankedKey in zip(primaryKeys, ranked.c)])) \
+            .filter(ranked.c.row_number > offset, ranked.c.row_number <= offset + limit) \
+            .order_by(joinKey, ranked.c.row_number)
+
+    def _isStreamingRows(self) -> bool:
+        return self._streaming is not None and len(self._childList()) == 0
+
+    def _fetch(self, qry) -> any:
+        """ root query rows - read lazily, in batches, when streaming an endpoint without children """
+        if self._isStreamingRows():
+            return qry.yield_per(int(config.Config.CUSTOM_ENDPOINT_STREAM_BATCH))
+        return qry.all()
+
+    def _countRows(self, filter_by: str = None) -> int:
+        """ root rows matching the page query filters (as _createRows), cached by record_count """
+        filters = [self.filter_by] if self.filter_by is not None else []
+        if filter_by is not None and (self.filter_by is None or 'undefined' not in filter_by):
+            filters.append(filter_by)
+        criteria = [text(self.filter_by)] if self.filter_by is not None else []
+        criteria += [self._filterCriteria(each) for each in filters[len(criteria):]]
+        return record_count.record_count(session, self._model_class, criteria,
+                                         filter_key=" and ".join(filters), mode=self._countMode)
+
+    def _filterCriteria(self, filter_by: str) -> any:
+        """ filter_by for the query - the payload filter with bound values (same statement per filter shape), else SQL text """
+        if self._payloadFilter is not None and filter_by == self._payloadFilter[0] and self._payloadFilter[1] is not None:
+            return self._payloadFilter[1]
+        return text(filter_by)
+
+    def _fetchPage(self, qry, limit: int, offset: int) -> any:
+        """ root page - limit / offset, or keyset (seek past the continuation token's sort value and key) """
+        if self._keyset is None:
+            return self._fetch(qry.limit(limit).offset(offset))
+        sort_attr, ascending = self._keysetSort
+        pkey_attr = getattr(self._model_class, self._pkeyProperty().key)
+        order = [each.asc() if ascending else each.desc() for each in ([sort_attr] if sort_attr is not None else []) + [pkey_attr]]
+        qry = qry.order_by(None).order_by(*order)
+        if "k" not in self._keyset:  # first page, or previous page ended on a null sort value - offset (i)
+            qry = qry.offset(offset)
+        else:
+            key = self._keysetValue(self._keyset["k"], pkey_attr)
+            after = pkey_attr > key if ascending else pkey_attr < key
+            if sort_attr is not None:
+                value = self._keysetValue(self._keyset["v"], sort_attr)
+                beyond = sort_attr > value if ascending else sort_attr < value
+                after = or_(beyond, and_(sort_attr == value, after))
+            qry = qry.filter(after)
+        rows = self._fetch(qry.limit(limit))
+        if isinstance(rows, list):
+            self._keysetCount = len(rows)
+            self._keysetLast = rows[-1] if rows else None
+            return rows
+        return self._trackKeyset(rows)
+
+    def _trackKeyset(self, rows):
+        """ streamed rows - note the last row, for the next continuation token """
+        for row in rows:
+            self._keysetCount += 1
+            self._keysetLast = row
+            yield row
+
+    def _pkeyProperty(self):
+        return inspect(self._model_class).get_property_by_column(inspect(self._model_class).primary_key[0])
+
+    def _keysetProperty(self):
+        """ keyset sort column property (selected with the fields), or None """
+        sort_attr = self._keysetSort[0] if self._keyset is not None else None
+        return sort_attr.property if sort_attr is not None else None
+
+    def _keysetOrder(self, order_by) -> tuple:
+        """ (sort attribute, ascending) from the request sort (Ontimize orderBy, sort=[-]name), or order_by= - (None, True): primary key """
+        name, ascending = None, True
+        if isinstance(order_by, list) and len(order_by) > 0:
+            name, ascending = order_by[0]["columnName"], order_by[0].get("ascendent", True)
+        elif isinstance(order_by, str) and order_by:
+            name, ascending = order_by.lstrip("-"), not order_by.startswith("-")
+        elif isinstance(self.order_by, sqlalchemy.orm.attributes.InstrumentedAttribute):
+            name = self.order_by.key
+        elif isinstance(self.order_by, str):
+            name = self.order_by
+        column_attrs = inspect(self._model_class).column_attrs
+        if name is None or name not in column_attrs or column_attrs[name] is self._pkeyProperty():
+            return None, ascending
+        return getattr(self._model_class, name), ascending
+
+    @staticmethod
+    def _keysetValue(value: any, attr) -> any:
+        """ continuation token value (json) as the column type """
+        if value is None:
+            return value
+        try:
+            python_type = attr.property.columns[0].type.python_type
+        except NotImplementedError:
+            return value
+        if python_type in [datetime.date, datetime.datetime, datetime.time] and isinstance(value, str):
+            return python_type.fromisoformat(value)
+        if python_type is decimal.Decimal:
+            return decimal.Decimal(f"{value}")
+        return CustomEndpoint._typedKey(value, python_type)
+
+    def decodeContinuationToken(self, token: str) -> dict:
+        """ keyset position from an opaque continuationToken ({} - first page) - it must match the request sort """
+        if not token:
+            return {}
+        try:
+            keyset = json.loads(base64.urlsafe_b64decode(token.encode("ascii") + b"=" * (-len(token) % 4)))
+        except Exception as ex:
+            raise ValidationError(f"Invalid continuationToken on entity {self._model_class_name}") from ex
+        sort_attr, ascending = self._keysetSort
+        if keyset.get("s") != (sort_attr.key if sort_attr is not None else None) or keyset.get("a") != ascending:
+            raise ValidationError(f"continuationToken does not match the sort order on entity {self._model_class_name}")
+        return keyset
+
+    def _nextContinuationToken(self, limit: int) -> str | None:
+        """ opaque token for the page after the last row read - None if the page was not full (no more rows) """
+        if self._keysetLast is None or self._keysetCount < limit:
+            return None
+        sort_attr, ascending = self._keysetSort
+        keyset = {"s": sort_attr.key if sort_attr is not None else None, "a": ascending,
+                  "i": self.startRecordIndex + self._keysetCount}
+        value = getattr(self._keysetLast, sort_attr.key) if sort_attr is not None else None
+        if sort_attr is None or value is not None:  # else null sort value: next page by offset i
+            keyset["v"] = value
+            keyset["k"] = getattr(self._keysetLast, self._pkeyProperty().key)
+        token = json.dumps(keyset, separators=(",", ":"), default=str)
+        return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii").rstrip("=")  # url safe, unpadded
+
+    def _createFilterFromKeys(self) -> list | None:
+        """ join key filters - 1 per chunk of parent keys (None: not a child, or no parent keys) """
         aFilter = None
         if self.join_on:
             """
@@ -412,17 +780,14 @@ class CustomEndpoint():
             
         """     
         if isinstance(self.join_on, list):
-            andOp = ""
             for join in self.join_on:
-                aFilter = self.buildJoin(andOp, join)
-                andOp = " and "
+                aFilter = self.buildJoin(join)
         else:
-            aFilter = self.buildJoin("", self.join_on)        
+            aFilter = self.buildJoin(self.join_on)        
     
         return aFilter
 
-    def buildJoin(self, andOp: str, join: Column) -> str:
-        joinStr = None
+    def buildJoin(self, join: Column) -> list | None:
         if join is not None:
             if join.__class__.__name__ == 'InstrumentedAttribute':
                 if hasattr(join,"prop") and join.prop.__class__.__name__ == 'RelationshipProperty':
@@ -443,39 +808,40 @@ class CustomEndpoint():
                 keyName = join[1].key if self.isParent else pkeyName
             
             keys = self._collectParentKeys(keyName)
-            if keys is not None:
-                joinStrKeys = self._extractedFromKeys(fkeyName , keys)
-            return f"{andOp}{joinStrKeys}"
+            self._joinKeyName = fkeyName
+            return self._extractedFromKeys(fkeyName , keys)
         return None
             
 
-    def _extractedFromKeys(self, keyName: str, keys: object):
+    def _extractedFromKeys(self, keyName: str, keys: object) -> list | None:
+        """ keyName IN (keys) as bound parameters, chunked to the backend's parameter limit """
         if keys is None or len(keys) == 0:
             return None
-        keys = f"{keys}"
-        keys = keys.replace("[", "")
-        keys = keys.replace("]", "")
-        result = ""
-        if len(keys) > 0:
-            result = f'{keyName} in ({keys})'
-            result = result.replace(".", "\".\"")
-        if self.filter_by is not None:
-            result += f" and text({self.filter_by})"
+        mapper = inspect(self._model_class)
+        column = mapper.columns[keyName] if keyName in mapper.columns else mapper.local_table.c[keyName]
+        chunkSize = IN_LIST_CHUNK_SIZE.get(session.get_bind().dialect.name, 1000)
+        keys = list(keys)
+        result = []
+        for start in range(0, len(keys), chunkSize):
+            keyFilter = column.in_(keys[start:start + chunkSize])
+            if self.filter_by is not None:
+                keyFilter = and_(keyFilter, text(self.filter_by))
+            result.append(keyFilter)
         return result
 
     def _printIncludes(self, level: int):
         parenName = self._parentResource._model_class_name if self._parentResource is not None else "None"
         if self.foreignKey:
-            print(
-                level * ' ', f"CustomEndpoint alias: {self.alias} model: {self._model_class.__name__} primaryKey: {self.primaryKey} join_on: {self.foreignKey} parent: {parenName}")
+            resource_logger.debug(
+                f"{level * ' '} CustomEndpoint alias: {self.alias} model: {self._model_class.__name__} primaryKey: {self.primaryKey} join_on: {self.foreignKey} parent: {parenName}")
         else:
-            print(
-                level * ' ', f"CustomEndpoint alias: {self.alias} model: {self._model_class.__name__} primaryKey: {self.primaryKey} parent: {parenName}")
+            resource_logger.debug(
+                f"{level * ' '} CustomEndpoint alias: {self.alias} model: {self._model_class.__name__} primaryKey: {self.primaryKey} parent: {parenName}")
         if isinstance(self.fields, tuple) and len(self.fields) > 0:
             fields = self.getPrintableFields()
-            print(level * '  ', f"Fields: {fields}", sep=", ")
+            resource_logger.debug(f"{level * '  '} Fields: {fields}")
         elif isinstance(self.fields, sqlalchemy.orm.attributes.InstrumentedAttribute):
-            print(level * '  ', f"Fields: {self.fields.key}", sep=", ")
+            resource_logger.debug(f"{level * '  '} Fields: {self.fields.key}")
         if isinstance(self.children, CustomEndpoint):
             self.children._parentResource = self
             self.children._printIncludes(level + 1)
@@ -500,16 +866,58 @@ class CustomEndpoint():
         Args:
             result dict modified and shaped JSON
         """
-        result[self.alias] = []
+        result[self.alias] = list(self._iterModifiedRows())
+
+    def _iterModifiedRows(self):
+        """ root rows, modified and linked to their children - 1 at a time """
         for row in self._dictRows:
             newRow = self._modifyRow(row)
-            result[self.alias].append(newRow)
             #need to link each newRow with one or more childRows
             if isinstance(self.children, CustomEndpoint):
                 self.children._linkAndModifyRows(row, newRow)
             elif len(self.children) > 0:
                 for child in self.children:
                     child._linkAndModifyRows(row, newRow)
+            yield newRow
+
+    def _streamResponse(self, style: str, limit: int) -> Response:
+        """ serialize rows as they are modified (shape as transform(style)) """
+        encode = json_encoder()
+
+        def generate():
+            if style == "OntimizeEE":
+                yield '{"code":0,"totalQueryRecordsNumber":' + encode(self.totalQueryRecordsNumber) \
+                    + ',"startRecordIndex":' + encode(self.startRecordIndex) + ',"message":"ApiLogicServer","sqlTypes":{},"data":['
+            elif style == "JSONAPI":
+                yield '{"data":['
+            else:
+                yield '{' + encode(self.alias) + ':['
+            count = 0
+            try:
+                for newRow in self._iterModifiedRows():
+                    if style in ["OntimizeEE", "JSONAPI"]:
+                        newRow = self.move_checksum(newRow)
+                    if style == "JSONAPI":
+                        pkey = newRow.get(self.primaryKey, newRow.get("id", newRow.get("Id")))
+                        newRow = {"attributes": newRow, "type": self._model_class_name, "id": pkey}
+                    yield ("," if count > 0 else "") + encode(newRow)
+                    count += 1
+            except Exception as ex:
+                resource_logger.error(f"CustomEndpoint stream error {ex}")
+                raise
+            meta = {}
+            if self._keyset is not None:  # known once the rows are read
+                self.continuationToken = self._nextContinuationToken(limit)
+                meta["continuationToken"] = self.continuationToken
+            if style == "JSONAPI":
+                total = self.totalQueryRecordsNumber if self._countMode is not None else count
+                yield '],"meta":' + encode({"count": count, "limit": self.pagesize, "total": total, **meta}) + '}'
+            else:
+                if style == "LAC" and self._countMode is not None:
+                    meta["totalQueryRecordsNumber"] = self.totalQueryRecordsNumber
+                yield ']' + "".join(f",{encode(key)}:{encode(value)}" for key, value in meta.items()) + '}'
+
+        return Response(stream_with_context(generate()), mimetype="application/json")
 
     def _linkAndModifyRows(self, row: dict, modifiedRow: dict):
         """
@@ -520,49 +928,92 @@ class CustomEndpoint():
         """
         if not self.isCombined:
             modifiedRow[self.alias] = []
-        self._parentRow  = DotDict(row)
+        self._parentRow  = DotDict(row) if self.calling is not None else row
         pkeyValue = row[self.foreignKey.key] if self.isParent and self.foreignKey.key in row else row[self.primaryKey]
         fkey = self.primaryKey  if self.isParent and self.primaryKey in row else self.foreignKey.key if self.foreignKey is not None else None
-        for dictRow in self._dictRows:
-            if fkey is not None and f"{pkeyValue}" == f"{dictRow[fkey]}":
-                newRow = self._modifyRow(dictRow)
-                if self.isParent and self.isCombined:
-                    modifiedRow |= newRow
-                else:
-                    modifiedRow[self.alias].append(newRow)
-                if isinstance(self.children, CustomEndpoint):
-                    self.children._linkAndModifyRows(dictRow, newRow)
-                elif len(self.children) > 0:
-                    for include in self.children:
-                        include._linkAndModifyRows(dictRow, newRow)
+        if fkey is None:
+            return
+        rowIndex, keyType = self._getRowIndex(fkey)
+        for dictRow in rowIndex.get(self._typedKey(pkeyValue, keyType), []):
+            newRow = self._modifyRow(dictRow)
+            if self.isParent and self.isCombined:
+                modifiedRow |= newRow
+            else:
+                modifiedRow[self.alias].append(newRow)
+            if isinstance(self.children, CustomEndpoint):
+                self.children._linkAndModifyRows(dictRow, newRow)
+            elif len(self.children) > 0:
+                for include in self.children:
+                    include._linkAndModifyRows(dictRow, newRow)
 
-    def _modifyRow(self, dict_row: dict) -> dict:
-        #row = self.transform('LAC','',dict_row)
-        newRow = DotDict({})
-        tableRow = DotDict(dict_row)
+    def _getRowIndex(self, keyName: str) -> tuple[dict, type]:
+        """
+        _dictRows grouped by (typed) keyName value - built once, so linking is a lookup per parent row
+        Returns:
+            (index dict {key value: [dictRow]}, python type of keyName column)
+        """
+        if keyName not in self._rowIndex:
+            keyType = None
+            with contextlib.suppress(Exception):  # eg, python_type not implemented
+                keyType = getattr(self._model_class, keyName).type.python_type
+            rowIndex = {}
+            for dictRow in self._dictRows:
+                if keyName in dictRow:
+                    rowIndex.setdefault(self._typedKey(dictRow[keyName], keyType), []).append(dictRow)
+            self._rowIndex[keyName] = (rowIndex, keyType)
+        return self._rowIndex[keyName]
+
+    @staticmethod
+    def _typedKey(value: any, keyType: type) -> any:
+        """ key value as the join column type (rows_to_dict / JSON:API ids may be strings) """
+        if value is None or isinstance(value, keyType or str):
+            return value
+        if keyType is None:
+            return f"{value}"
+        try:
+            return keyType(value)
+        except (TypeError, ValueError, ArithmeticError):
+            return value
+
+    def _fieldPairs(self) -> list[tuple[str, str]] | None:
+        """
+        fields compiled once (per endpoint) to (row key, output alias) pairs - None: no fields (all row keys)
+        """
+        if self._shaper is not None:
+            return self._shaper[0]
+        pairs = None
         if isinstance(self.fields, sqlalchemy.orm.attributes.InstrumentedAttribute):
-            f = self.fields
-            fieldName = f[0].key if isinstance(f, tuple) else f.key
-            alias = f[1] if isinstance(f, tuple) else fieldName
-            if fieldName in tableRow:
-                newRow[alias] = tableRow[fieldName]
+            pairs = [(self.fields.key, self.fields.key)]
         elif len(self.fields) > 0:
+            pairs = []
             for f in self.fields:
                 if isinstance(f,str):
                     fieldName = f
                     alias = fieldName
-                elif isinstance(f[0], sqlalchemy.sql. schema.Column):
+                elif not isinstance(f, tuple):
+                    fieldName = alias = f.key
+                elif isinstance(f[0], sqlalchemy.sql.schema.Column):
                     alias = f[0].description 
-                    fieldName = f[1] if isinstance(f, tuple) else fieldName
+                    fieldName = f[1]
                 else:
-                    fieldName = f[0].key if isinstance(f, tuple) else f.key
-                    alias = f[1] if isinstance(f, tuple) else fieldName
-                if fieldName in tableRow:
-                    newRow[alias] = tableRow[fieldName]
+                    fieldName = f[0].key
+                    alias = f[1]
+                pairs.append((fieldName, alias))
+        self._shaper = (pairs,)
+        return pairs
+
+    def _modifyRow(self, dict_row: dict) -> dict:
+        #row = self.transform('LAC','',dict_row)
+        pairs = self._fieldPairs()
+        if pairs is None:
+            newRow = dict(dict_row)
         else:
-            newRow = tableRow
+            newRow = {alias: dict_row[fieldName] for fieldName, alias in pairs if fieldName in dict_row}
+        tableRow = dict_row
         # allow adding or changes using defined function
         if self.calling is not None:
+            newRow = DotDict(newRow)  # dot.notation access for calling functions
+            tableRow = DotDict(dict_row)
             try:
                 resource_logger.debug(f"calling function {self.calling}")
                 self.calling(newRow, tableRow, self._parentRow)
@@ -576,7 +1027,7 @@ class CustomEndpoint():
     def insertCheckSum(self, newRow: dict, tableRow: dict):
         if Args.opt_locking == "required" \
             and ("S_CheckSum" not in newRow and "S_CheckSum" in tableRow):
-            newRow["S_CheckSum"] = tableRow.S_CheckSum
+            newRow["S_CheckSum"] = tableRow["S_CheckSum"]
             newRow = self.move_checksum(newRow)
         elif "@metadata" in tableRow:
             newRow["@metadata"] = tableRow["@metadata"]
@@ -621,8 +1072,7 @@ class CustomEndpoint():
             if self.primaryKey == "id" and "id" not in row:
                 row["id"] = key #this is a hack since id is a jsonapi reserved value
             self._dictRows.append(row) 
-            if key not in self._pkeyList:
-                self._pkeyList.append(key)
+            self._pkeyList[key] = None
             model_type = data["type"]
             resource_logger.debug(f"_populateResponse row class on {self._model_class_name} using model_type: {model_type} with key {key}")
         if self.children is not None:
@@ -653,8 +1103,7 @@ class CustomEndpoint():
                         #relns = row["relationships"]
                         self._dictRows.append(attrRow)
                         key = attrRow[self.primaryKey]
-                        if key not in self._pkeyList:
-                            self._pkeyList.append(key)
+                        self._pkeyList[key] = None
         if self.children is not None:
             if isinstance(self.children, list):
                 for child in self.children:
@@ -683,49 +1132,44 @@ class CustomEndpoint():
             result.append(d)
         return result
     
-    def handlePayload(self, method: str, payload: any, url: str, jwt: str,altKey: str = None) -> any:
-        """ tests
-            stmt = ""
-            if method == 'POST':
-                stmt = insert(self._model_class).values(payload)
-            #elif  stmt = update(self._model_class).values(payload) #.where(self.primaryKey = 1)
-            clz = self._model_class
-            key = self.populateClass(clz, payload)
-            db.session.add(clz)
-            #db.engine.execute(stmt)
-            # db.session.select().filter_by().one()
-            return db.engine.execute(f"select * from {self._model_class_name} limit 1").one()
+    def handlePayload(self, method: str, payload: any, altKey: str = None) -> any:
         """
-        j = self.create_args(method, payload, altKey)
-        # check payload for a single row
-        clz = self._model_class
-        #key = self.populateClass(clz, payload)
-        print(self.to_dict(payload))
-        #  need to do a loop to post/patch each level
-        #pkey = None
-        #for row, model_clz in self.getRowFrom(payload, pkey): #cascade primary key
-        #    pkey = insert(self.model_clz).values(dmlColumnKeyMapping(row)).returning(model_clz.get(self.primary_key))
-        #    or
-        #    populate(model_clz, row, pkey)
-        #    session.add(model_clz)
-        #    pkey = model_clz.get(self.primary_key) if hassattr(model_clz, self.primary_key) else None
-        
-        key = altKey if altKey else payload[self.primaryKey] if self.primaryKey in payload else "-1"
-        if Args.security_enabled:
-            header = {"Authorization": jwt,"Content-Type": "application/json","accept": "application/vnd.api+json"}
-            response = (
-                requests.post(url=url, json=j, headers=header) #insert(self._model_class).values(self.dmlColumnKeyMapping(row)).returning("id")
-                if method == 'POST'
-                    else requests.patch(url=f"{url}/{key}", json=j, headers=header) #update(self._model_class).values(self.dmlColumnKeyMapping(row))
-            )
-        else:
-            response = {}
-            if method == "POST":
-                response = requests.post(url=url, json=j) 
-            elif method in ["PUT","PATCH" ]:
-                response = requests.patch(url=f"{url}/{key}", data=j) 
-        data  = json.loads(response.text)["data"]["attributes"]        
-        return json.dumps(data,indent=4, ensure_ascii=False).encode('utf8') if response.status_code < 301 else response.content
+        Insert (POST) or update (PUT/PATCH) a row in-process, on the logic-enabled session -
+        rules, grants and optimistic locking (@metadata checksum) run as for the JSON:API
+
+        Returns:
+            bytes: JSON attributes of the saved row
+        """
+        key = altKey if altKey else payload[self.primaryKey] if self.primaryKey in payload else None
+        try:
+            if method == 'POST':
+                sql_alchemy_row = self.copy_dict_to_row(payload=dict(payload))
+                session.add(sql_alchemy_row)
+            else:
+                if key is None:
+                    raise ValidationError(f"{self.primaryKey} is required")
+                primaryKey = getattr(self._model_class, self.primaryKey)  # query (not session.get) - grants apply
+                sql_alchemy_row = session.query(self._model_class) \
+                    .filter(primaryKey == self._typedKey(key, self.primaryKeyType.python_type)).one_or_none()
+                if sql_alchemy_row is None:
+                    raise ValidationError(f"{self._model_class_name} {key} not found")
+                attributes = self._model_class._s_jsonapi_attrs
+                for name, value in self.move_metadata(dict(payload)).items():
+                    if name in attributes and name != self.primaryKey:
+                        setattr(sql_alchemy_row, name, value)
+            session.commit()
+        except Exception as ex:
+            session.rollback()
+            raise ValidationError( f'{method} error on entity {self._model_class_name} msg: {ex}') from ex
+        data = self._attributesOf(sql_alchemy_row)
+        return json.dumps(data,indent=4, ensure_ascii=False).encode('utf8')
+
+    def _attributesOf(self, row: object) -> dict:
+        """ row attributes, as in a JSON:API response (including jsonapi_attr, eg, S_CheckSum) """
+        attributes = row.to_dict()
+        if self.primaryKey not in attributes:
+            attributes[self.primaryKey] = getattr(row, self.primaryKey)  # id is a jsonapi reserved value
+        return attributes
 
     def populateClass(self, clz, payload):
         for p in payload:
@@ -774,28 +1218,39 @@ class CustomEndpoint():
         Returns:
             dict: dict array
         """
-        from decimal import Decimal
-        import datetime 
-        rows = []
+        return list(self._iterRowsToDict(result))
+
+    def rows_to_columns(self: CustomEndpoint, rows: list[dict]) -> dict:
+        """
+        Columnar form of dict rows (eg, rows_to_dict, or modified rows) - {column: [value per row]}
+
+        Args:
+            rows (list[dict]): rows (a column missing from a row is None)
+
+        Returns:
+            dict: lists per column, in order of first appearance
+        """
+        columns = {}
+        for each_row in rows:
+            for each_key in each_row:
+                columns.setdefault(each_key, None)
+        return {each_key: [each_row.get(each_key) for each_row in rows] for each_key in columns}
+
+    def _iterRowsToDict(self, result: any):
         for each_row in result:
-            row_as_dict = {}
-            print(f'type(each_row): {type(each_row)}')
-            if isinstance (each_row, sqlalchemy.engine.row.Row):  # sqlalchemy.engine.row
-                row_as_dict = each_row._asdict()
+            if isinstance (each_row, sqlalchemy.engine.row.Row):  # projected columns of this model
+                converters, id_attr = row_converter(self._model_class)[0], False
+                row_as_dict = dict(each_row._mapping)
             else:
-                for a,v, in each_row.__dict__.items(): 
-                    if a != "_sa_instance_state":
-                        if isinstance(v, Decimal):
-                            row_as_dict[a] = str(v) 
-                        elif isinstance(v, datetime.date):
-                            row_as_dict[a] = v.strftime('%Y-%m-%d %H:%M:%S')
-                        else:
-                            row_as_dict[a] = v
-            if hasattr(each_row,"id"):
+                converters, skip, id_attr = row_converter(each_row.__class__)
+                row_as_dict = {a: v for a, v in each_row.__dict__.items() if a not in skip}
+            for each_key, convert in converters:
+                if each_key in row_as_dict:
+                    row_as_dict[each_key] = convert(row_as_dict[each_key])
+            if id_attr:
                 with contextlib.suppress(Exception):
                     row_as_dict["id"] = each_row.id
-            rows.append(row_as_dict)
-        return rows
+            yield row_as_dict
 
     def row_to_dict(self: CustomEndpoint, row
                 , replace_attribute_tag: str = ""
@@ -913,12 +1368,21 @@ class CustomEndpoint():
                     "total": len(result)
                 }        
             }
+            if self._keyset is not None:
+                data["meta"]["continuationToken"] = self.continuationToken
+            if self._countMode is not None:
+                data["meta"]["total"] = self.totalQueryRecordsNumber
             result = data
         elif style == "OntimizeEE":
             #API Bridge - lets Ontimize work out-of-the-box
             recordsNumber = self.totalQueryRecordsNumber #if len(result) == 0 else self.startRecordIndex
             startRecord = self.startRecordIndex
             result = {"code":0,"totalQueryRecordsNumber": recordsNumber, "startRecordIndex": startRecord, "message":"ApiLogicServer","data": result ,"sqlTypes":{}}
+            if self._keyset is not None:
+                result["continuationToken"] = self.continuationToken
+        elif style == "Columnar":
+            # lists per column - compact for grids / charts of flat endpoints
+            result = {key: self.rows_to_columns(result if isinstance(result, list) else [result])}
         #if style == "LAC": default
         return result
     
@@ -1002,7 +1466,7 @@ class CustomEndpoint():
             object: SQLAlchemy row / sub-rows, ready to insert
         """
 
-        print( f"to_row receives row_dict: {row_dict}" )
+        resource_logger.debug(f"to_row receives row_dict: {row_dict}")
 
         custom_endpoint = self
         if current_endpoint is not None:
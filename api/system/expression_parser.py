@@ -8,11 +8,15 @@ JSON:API filtering strategies
 import sqlalchemy
 import safrs
 import json
+import re
+import threading
+from functools import lru_cache
 from flask import request
 from sqlalchemy.orm import joinedload, Query
 from operator import not_, and_, or_, eq, ne, lt, le, gt, ge
 from sqlalchemy import or_ as OR_
 from sqlalchemy import and_ as AND_
+from sqlalchemy import bindparam, text
 from decimal import Decimal
 
 BASIC_EXPRESSION =  "@basic_expression"
@@ -48,6 +52,19 @@ ONTIMIZE_OPERATORS = {
     'AND_NOT' : " AND NOT "
 }
 
+PLAN_CACHE_SIZE = 512
+"""Compiled filter plans (parseFilter), by (model, filter shape) - also parsed filter args (advancedFilter)"""
+
+_plans: dict = {}
+""" {(model, filter shape, sqltypes, quote): FilterPlan} """
+_plans_lock = threading.Lock()
+
+_param_pattern = re.compile("\x00(\\d+)\x00")
+_not_in_filter_pattern = re.compile(r"filter\[(\w+)\]\[(\w+)\]")
+_json_filter_pattern = re.compile(r"filter\[(\w+)\]")
+_equal_pattern = re.compile(r"equal\((\w+),(\w+)\)")
+_notequal_pattern = re.compile(r"notequal\((\w+),(\w+)\)")
+
 
 class DotDict(dict):
     """dot.notation access to dictionary attributes"""
@@ -105,6 +122,71 @@ def parsePayload(clz, payload: str):
 
 
 def parseFilter(clz: any, filter: dict, sqltypes: any):
+    """
+    Ontimize filter as SQL text (values rendered), and filters list - see filterClause for bound values
+    Parsed once per (model, filter shape) - see filterPlan
+    """
+    plan, values = filterPlan(clz, filter, sqltypes)
+    return plan.sql_where(values), plan.filters(values)
+
+
+def filterClause(clz: any, filter: dict, sqltypes: any = None):
+    """
+    Ontimize filter as a SQLAlchemy clause, values bound as parameters (None if no filter)
+    Same statement for the same filter shape - database statement caches can hit
+    """
+    plan, values = filterPlan(clz, filter, sqltypes)
+    return plan.clause(values)
+
+
+def filterPlan(clz: any, filter: dict, sqltypes: any):
+    """
+    (FilterPlan, values) - the filter shape (attributes, operators, nesting) is compiled once per model,
+    values (filter attribute values, expression rop's) are taken from this filter
+    """
+    from config.config import Config
+    values = []
+    shape = _filterShape(filter or {}, values)
+    key = (clz, json.dumps(shape, default=repr), json.dumps(sqltypes, sort_keys=True, default=str), Config.BACKTIC_AS_QUOTE)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = FilterPlan(*_compileFilter(clz, shape, sqltypes), params=_shapeParams(shape))
+        with _plans_lock:
+            if len(_plans) >= PLAN_CACHE_SIZE:
+                _plans.pop(next(iter(_plans)))
+            _plans[key] = plan
+    return plan, values
+
+
+def _filterShape(filter: dict, values: list) -> dict:
+    """ filter with values replaced by FilterParam's (appended to values) """
+    def param(value):
+        values.append(value)
+        return FilterParam(len(values) - 1)
+
+    def expression(node):
+        if not isinstance(node, dict):
+            return node
+        return {each_key: param(each_value) if each_key == "rop" and not isinstance(each_value, dict) and each_value is not None
+                else expression(each_value) for each_key, each_value in node.items()}
+
+    return {f: expression(value) if f in [BASIC_EXPRESSION, FILTER_EXPRESSION] else param(value)
+            for f, value in filter.items()}
+
+
+def _shapeParams(shape: any) -> list:
+    """ FilterParam's of shape, by index """
+    params = []
+    if isinstance(shape, FilterParam):
+        params.append(shape)
+    elif isinstance(shape, dict):
+        for each_value in shape.values():
+            params += _shapeParams(each_value)
+    return sorted(params, key=lambda each: each.index)
+
+
+def _compileFilter(clz: any, filter: dict, sqltypes: any):
+    """ sql_where and filters for a filter shape - values are FilterParam slots """
     # sourcery skip: merge-duplicate-blocks, remove-pass-elif
     filters = []
     sql_where = ""
@@ -125,22 +207,94 @@ def parseFilter(clz: any, filter: dict, sqltypes: any):
             from config.config import Config
             _quote = '`' if Config.BACKTIC_AS_QUOTE else '"' 
             attr = ""
-            if f in clz._s_jsonapi_attrs and f != "id":
-                attr = clz._s_jsonapi_attrs[f]._proxy_key
+            name = _attributeNames(clz)[0].get(f.upper(), f)  # only attribute names reach the SQL text
+            if name in clz._s_jsonapi_attrs and name != "id":
+                attr = clz._s_jsonapi_attrs[name]._proxy_key
             elif f == "id":
                 attr = f'{_quote}{clz.__tablename__}{_quote}.{_quote}id{_quote}'
                 _quote = ""
-            elif attr == "":
-                attr =  f'{_quote}{clz.__tablename__}{_quote}.{_quote}{f}{_quote}'
-                _quote = ""
-            q = "'" if isinstance(value, str) else ""
-            sql_where += f'{join} {_quote}{attr}{_quote} = {q}{value}{q}'
+            else:
+                from safrs import ValidationError
+                raise ValidationError(f'Invalid filter, unknown attribute "{f}" on entity {clz.__name__}')
+            sql_where += f'{join} {_quote}{attr}{_quote} = {value.slot("eq")}'
             #name = clz._s_jsonapi_attrs[f] if f !: "id" else clz.id
             filters.append({"join": join,"lop": attr, "op": "eq", "rop": value})
             join = " AND "
             
     return sql_where, filters
 
+
+class FilterParam:
+    """ a filter value in a filter shape - the plan renders (or binds) the request's value in its slot """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.kind = "eq"
+        self.sqltype = None
+
+    def __repr__(self):
+        return f"FilterParam({self.index})"
+
+    def slot(self, kind: str, sqltype: any = None) -> str:
+        """ placeholder in the plan SQL - kind eq (attribute = value) or expr (expression rop) """
+        self.kind = kind
+        self.sqltype = sqltype
+        return f"\x00{self.index}\x00"
+
+    def value(self, value: any) -> any:
+        """ value as compared - DATE / TIMESTAMP expression values are epoch millis """
+        if self.sqltype in [91,93]:
+            from datetime import datetime
+            fmt = "%Y-%m-%d %H:%M:%S" if self.sqltype == 93 else "%Y-%m-%d"
+            return datetime.fromtimestamp(value / 1000).strftime(fmt)
+        return value
+
+    def literal(self, value: any) -> str:
+        """ value as SQL text """
+        value = self.value(value)
+        if isinstance(value, (list, tuple)):
+            return "(" + ", ".join(f"'{each}'" if isinstance(each, str) else f"{each}" for each in value) + ")"
+        if self.kind == "eq":
+            q = "'" if isinstance(value, str) else ""
+        else:
+            q = "'" if value and isinstance(value, str) else ""
+        return f"{q}{value}{q}"
+
+
+class FilterPlan:
+    """ a filter shape, parsed - SQL text with a slot per value """
+
+    def __init__(self, sql_where: str, filters: list, params: list):
+        self._sql_where = sql_where
+        self._filters = filters
+        self._params = params
+        self._bound_sql = _param_pattern.sub(lambda match: f":fp_{match.group(1)}", sql_where)
+        self._bound_indexes = [int(each) for each in _param_pattern.findall(sql_where)]
+
+    def sql_where(self, values: list) -> str:
+        return _param_pattern.sub(lambda match: self._params[int(match.group(1))].literal(values[int(match.group(1))]), self._sql_where)
+
+    def filters(self, values: list) -> list:
+        filters = []
+        for each_filter in self._filters:
+            rop = each_filter.get("rop")
+            if isinstance(rop, FilterParam):
+                rop = values[rop.index]
+            elif isinstance(rop, str):
+                rop = _param_pattern.sub(lambda match: self._params[int(match.group(1))].literal(values[int(match.group(1))]), rop)
+            filters.append({**each_filter, "rop": rop})
+        return filters
+
+    def clause(self, values: list):
+        if self._sql_where == "":
+            return None
+        binds = []
+        for each_index in self._bound_indexes:
+            value = self._params[each_index].value(values[each_index])
+            binds.append(bindparam(f"fp_{each_index}", value, expanding=isinstance(value, (list, tuple))))
+        return text(self._bound_sql).bindparams(*binds)
+
+
 def fixup_sort(clz, data):
     sort = None
     if data and isinstance(data, list):
@@ -254,6 +408,11 @@ class BasicExpression:
     def _parseExpression(self, expr) -> str:
         if expr.op != None and expr.rop != None:
             value = expr.rop
+            if isinstance(value, FilterParam):  # plan (filterPlan) - value rendered / bound per request
+                sqltype = self.sqltypes[expr.lop] if self.sqltypes and expr.lop in self.sqltypes else None
+                slot = value.slot("expr", sqltype)
+                self.filters.append({"join": self.join_condition,"lop": expr.lop, "op": expr.op, "rop": slot})
+                return f'{self.join_condition} "{expr.lop}" {expr.op} {slot}'
             
             if self.sqltypes and expr.lop in self.sqltypes and self.sqltypes[expr.lop] in [91,93]:
                 from datetime import datetime
@@ -274,11 +433,55 @@ def convert_attrname(attrname, attrs):
         (a[0] for a in attrs.items() if a[0].upper() == attrname.upper()),
         attrname,
     )
+
+_attribute_names: dict = {}
+""" {model: ({upper case attribute name: attribute name}, primary key attribute name)} """
+
+
+def _attributeNames(cls) -> tuple:
+    """ attribute names by upper case name, and the primary key attribute - scanned once per model """
+    names = _attribute_names.get(cls)
+    if names is None:
+        by_upper = {}
+        primary_key = None
+        for a in cls._s_jsonapi_attrs.items():
+            by_upper.setdefault(a[0].upper(), a[0])
+            if "primary_key=True" in str(a):
+                primary_key = a[0]
+        names = _attribute_names[cls] = (by_upper, primary_key)
+    return names
+
+
+def clear_model_caches():
+    """ discard the per-model caches (attribute names, filter plans) - eg, database.models was reloaded """
+    with _plans_lock:
+        _plans.clear()
+    _attribute_names.clear()
+
+
+def _loadFilterArg(item: str) -> any:
+    """ filter arg (json), parsed once per distinct arg - a copy, so callers may alter it """
+    return _copyJson(_parsedFilterArg(item))
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _parsedFilterArg(item: str) -> any:
+    return json.loads(item)
+
+
+def _copyJson(value: any) -> any:
+    """ copy of json.loads value (dicts and lists - other values are immutable) """
+    if isinstance(value, dict):
+        return {each_key: _copyJson(each_value) for each_key, each_value in value.items()}
+    if isinstance(value, list):
+        return [_copyJson(each_value) for each_value in value]
+    return value
+
+
 def advancedFilter(cls, args) -> any:
     filters = []
     expressions = []
     from safrs import ValidationError
-    import re
     import urllib.parse
     import operator
     sqlWhere = ""
@@ -288,7 +491,7 @@ def advancedFilter(cls, args) -> any:
         try:
             val = item
             if isinstance(item, str):
-                val = json.loads(item)
+                val = _loadFilterArg(item)
         except Exception as e:
             print(f"json load filter item: {item} exception:",e)
             val = item
@@ -306,7 +509,6 @@ def advancedFilter(cls, args) -> any:
                     expressions.append(attr.like( item['val']))
                 else:
                     expressions.append(attr.eq(clean(item['val'])))
-            for e in expressions : print(e," : ", e.right.value)
             return expressions, sqlWhere
         else:
             if isinstance(val, dict):
@@ -329,10 +531,10 @@ def advancedFilter(cls, args) -> any:
                     for f, value in val.items():
                         filters.append({"lop": f, "op": "eq", "rop": value})
 
-        not_in_filter = re.search(r"filter\[(\w+)\]\[(\w+)\]", req_arg)
-        json_filter = filter_attr = re.search(r"filter\[(\w+)\]", req_arg)
-        equal_exp = filter_attr = re.search(r"equal\((\w+),(\w+)\)", req_arg)
-        notequal_exp = filter_attr = re.search(r"notequal\((\w+),(\w+)\)", req_arg)
+        not_in_filter = _not_in_filter_pattern.search(req_arg)
+        json_filter = filter_attr = _json_filter_pattern.search(req_arg)
+        equal_exp = filter_attr = _equal_pattern.search(req_arg)
+        notequal_exp = filter_attr = _notequal_pattern.search(req_arg)
         if json_filter:
             #filter[attrname]=value
             name = json_filter.group(1)
@@ -364,15 +566,15 @@ def advancedFilter(cls, args) -> any:
     #query = cls._s_query
     join =  ""
     expression_holder= []
+    attribute_names, primary_key = _attributeNames(cls) if filters else ({}, None)
     for flt in filters:
-        attr_name = convert_attrname(flt.get("lop"), cls._s_jsonapi_attrs)
+        lop = flt.get("lop")
+        attr_name = attribute_names.get(lop.upper(), lop)
         attr_val = flt.get("rop")
         if attr_name not in ["id","ID","Id"] and attr_name not in cls._s_jsonapi_attrs:
             raise ValidationError(f'Invalid filter "{flt}", unknown attribute "{attr_name}"')
-        if attr_name in ["id","ID","Id"]:
-            for a in cls._s_jsonapi_attrs.items(): 
-                if "primary_key=True" in str(a): 
-                    attr_name = a[0]
+        if attr_name in ["id","ID","Id"] and primary_key is not None:
+            attr_name = primary_key
         op_name = flt.get("op", "").strip().upper()
         if op_name not in ONTIMIZE_OPERATORS:
             raise ValidationError(f'Invalid filter {flt}, unknown operator: {op_name}')
@@ -407,7 +609,6 @@ def advancedFilter(cls, args) -> any:
             final_expr.append(AND_(*expr.expr))
         else:
             final_expr.append(expr.expr)
-    for e in expressions : print(e," : ", e.right.value)
     return expressions, sqlWhere #query.filter(or_(*expressions))
 
 def clean(val):
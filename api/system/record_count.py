@@ -0,0 +1,171 @@
+"""
+Record counts for CustomEndpoint / Ontimize responses (totalQueryRecordsNumber) - used by api/system/custom_endpoint.py
+Also caches other per-table results (eg, api/system/aggregate_query.py), with the same invalidation - see cached()
+
+Counts are requested per call (count=exact | estimated), or for every call by config.Config.CUSTOM_ENDPOINT_COUNT:
+
+    exact       SELECT COUNT(*) with the same filter (and grants) as the page query
+    estimated   unfiltered counts use database statistics (fast on very large tables,
+                approximate until the table is analyzed); filtered counts are exact
+    none        no count - totalQueryRecordsNumber stays 999 (default)
+
+Counts are cached per (entity, filter, user), and discarded when the table is written
+(flush, commit, rollback or bulk update/delete, on any session of this server process).
+Entries also expire after CUSTOM_ENDPOINT_COUNT_TTL seconds, for writes by other processes.
+
+You do not normally need to alter this file
+"""
+import contextlib
+import logging
+import threading
+import time
+from typing import Callable, Optional
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+from config.config import Args, Config
+from security.system.authorization import Grant, Security
+
+logger = logging.getLogger(__name__)
+
+COUNT_MODES = ["exact", "estimated"]
+
+WRITTEN_KEY = "record_count_written"
+""" session.info key for entity names written in this transaction """
+
+_cache: dict = {}
+""" {(entity name, key.., user): (result, time)} """
+_lock = threading.Lock()
+
+ESTIMATE_SQL = {
+    "postgresql": "SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table_name)",
+    "mysql": "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :table_name",
+    "mariadb": "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :table_name",
+    "mssql": "SELECT SUM(row_count) FROM sys.dm_db_partition_stats WHERE object_id = OBJECT_ID(:table_name) AND index_id IN (0, 1)",
+    "oracle": "SELECT num_rows FROM user_tables WHERE table_name = UPPER(:table_name)",
+    "sqlite": "SELECT stat FROM sqlite_stat1 WHERE tbl = :table_name LIMIT 1",
+}
+""" table row estimates from database statistics, by dialect """
+
+
+def count_mode(requested: Optional[str], default: Optional[str] = None) -> Optional[str]:
+    """ exact | estimated | None - the request's count=, else default (eg, the endpoint's), else Config.CUSTOM_ENDPOINT_COUNT """
+    mode = requested or default or Config.CUSTOM_ENDPOINT_COUNT
+    return mode if mode in COUNT_MODES else None
+
+
+def record_count(session: Session, model_class, criteria: list, filter_key: str, mode: str = "exact") -> int:
+    """ Return (cached) count of model_class rows matching criteria
+
+    Args:
+        session (Session): session with grants (eg, safrs.DB.session)
+        model_class: model.Entity
+        criteria (list): filter clauses, as for the page query
+        filter_key (str): cache key for criteria (eg, the filter SQL)
+        mode (str): exact | estimated (unfiltered counts from database statistics)
+
+    Returns:
+        int: number of rows
+    """
+    entity_name = model_class.__name__
+
+    def count_rows() -> int:
+        count = None
+        if mode == "estimated" and len(criteria) == 0 and not _has_grants(entity_name):
+            count = estimated_count(session, model_class)
+        if count is None:
+            count = session.query(func.count()).select_from(model_class).filter(*criteria).scalar()
+        logger.debug(f"record_count {mode} {entity_name} {filter_key}: {count}")
+        return count
+
+    return cached(entity_name, ("count", filter_key, mode), count_rows)
+
+
+def cached(entity_name: str, key: tuple, compute: Callable[[], any]) -> any:
+    """ Return compute() result, cached per (entity_name, key, user) until entity_name is written (or TTL)
+
+    Args:
+        entity_name (str): model class name - writes to it discard the result
+        key (tuple): identifies the result (eg, query kind, columns, filter) - hashable
+        compute (Callable): computes the result (on a cache miss)
+    """
+    cache_key = (entity_name, key, _user_key())
+    now = time.time()
+    with _lock:
+        cached_result = _cache.get(cache_key)
+        if cached_result is not None and now - cached_result[1] < Config.CUSTOM_ENDPOINT_COUNT_TTL:
+            return cached_result[0]
+    result = compute()
+    with _lock:
+        _cache[cache_key] = (result, now)
+    return result
+
+
+def estimated_count(session: Session, model_class) -> Optional[int]:
+    """ row estimate from database statistics (None - not supported, or table not analyzed) """
+    sql = ESTIMATE_SQL.get(session.get_bind().dialect.name)
+    if sql is None:
+        return None
+    try:
+        with session.get_bind().connect() as connection:
+            estimate = connection.execute(text(sql), {"table_name": model_class.__table__.name}).scalar()
+    except Exception as ex:
+        logger.debug(f"estimated_count {model_class.__name__} unavailable: {ex}")
+        return None
+    if isinstance(estimate, str):  # sqlite_stat1: "rows [rows per index key ...]"
+        estimate = estimate.split(" ")[0]
+    if estimate is None or float(estimate) < 0:  # postgresql: -1 - never analyzed
+        return None
+    return int(float(estimate))
+
+
+def invalidate(entity_name: str):
+    """ discard cached results of entity_name """
+    with _lock:
+        for each_key in [each for each in _cache if each[0] == entity_name]:
+            _cache.pop(each_key, None)
+
+
+def _user_key() -> Optional[str]:
+    """ grants may filter by user (roles, tenant) - counts are cached per user when security is enabled """
+    if not Args.instance.security_enabled:
+        return None
+    with contextlib.suppress(Exception):
+        return str(Security.current_user().id)
+    return None
+
+
+def _has_grants(entity_name: str) -> bool:
+    return Args.instance.security_enabled and entity_name in Grant.grants_by_table
+
+
+@event.listens_for(Session, "after_flush")
+def _written(session: Session, flush_context):
+    """ invalidate on flush (this transaction), and again on commit (other sessions may have counted meanwhile) """
+    written = session.info.setdefault(WRITTEN_KEY, set())
+    for each_instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        written.add(each_instance.__class__.__name__)
+    for each_entity_name in written:
+        invalidate(each_entity_name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_written(orm_execute_state):
+    """ query(..).update() / delete(), insert() statements """
+    if (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert) \
+            and orm_execute_state.bind_mapper is not None:
+        entity_name = orm_execute_state.bind_mapper.class_.__name__
+        orm_execute_state.session.info.setdefault(WRITTEN_KEY, set()).add(entity_name)
+        invalidate(entity_name)
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session: Session):
+    for each_entity_name in session.info.pop(WRITTEN_KEY, set()):
+        invalidate(each_entity_name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session: Session):
+    """ results cached since the flush included the rolled back writes """
+    for each_entity_name in session.info.pop(WRITTEN_KEY, set()):
+        invalidate(each_entity_name)
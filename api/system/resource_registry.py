@@ -0,0 +1,93 @@
+"""
+Resource registry - metadata for each model in database/models.py, built once (not per request)
+
+Used by api/api_discovery/ontimize_api.py (find_model, getMetaData) and api/system/custom_endpoint.py.
+
+Each resource is an immutable mapping:
+
+    name            resource (class) name
+    model           model class
+    attributes      (descriptor per non-relationship attribute: {"name", "attr", "type", "column"}, ...)
+    columns         {attribute name: Column}
+    sqltypes        {attribute name: SQL type (eg, INTEGER, VARCHAR(N))}
+    primary_key     (attribute names,)
+
+The registry is built at startup (ontimize_api.add_service), or on first use.
+It is rebuilt when database.models is reloaded (a class no longer matches its entry), or by build() -
+this also clears the expression parser's per-model caches.
+
+You do not normally need to alter this file
+"""
+import inspect
+import logging
+import sys
+import threading
+from types import MappingProxyType
+from typing import Mapping, Optional
+from api.system import expression_parser
+
+logger = logging.getLogger(__name__)
+
+MODELS_NAME = "database.models"
+
+_registry: Mapping[str, Mapping] = None
+""" {resource name: resource} - replaced (never altered) by build() """
+_lock = threading.Lock()
+
+
+def build() -> Mapping[str, Mapping]:
+    """ (re)build the registry from database.models """
+    global _registry
+    with _lock:
+        models_module = sys.modules[MODELS_NAME]
+        registry = {}
+        for each_resource_name, each_resource_class in inspect.getmembers(models_module, inspect.isclass):
+            each_class_def_str = str((each_resource_name, each_resource_class))
+            if f"'{MODELS_NAME}." in each_class_def_str and "Ab" not in each_class_def_str \
+                    and hasattr(each_resource_class, "__mapper__"):
+                registry[each_resource_name] = _resource(each_resource_name, each_resource_class)
+        _registry = MappingProxyType(registry)
+        expression_parser.clear_model_caches()
+        logger.debug(f"resource registry built: {len(registry)} resources")
+        return _registry
+
+
+def resources() -> Mapping[str, Mapping]:
+    """ all resources, by name """
+    return _registry if _registry is not None else build()
+
+
+def resource(resource_name: str) -> Optional[Mapping]:
+    """ resource by name (None if not a model) - rebuilt if database.models was reloaded """
+    registry = resources()
+    entry = registry.get(resource_name)
+    if entry is not None and getattr(sys.modules[MODELS_NAME], resource_name, None) is not entry["model"]:
+        entry = build().get(resource_name)
+    return entry
+
+
+def _resource(resource_name: str, resource_class) -> Mapping:
+    mapper = resource_class.__mapper__
+    attributes = []
+    columns = {}
+    sqltypes = {}
+    for each_attr in mapper.attrs:
+        if not each_attr._is_relationship:
+            try:
+                attribute_object = {"name": each_attr.key,
+                                    "attr": each_attr,
+                                    "type": str(each_attr.expression.type),
+                                    "column": each_attr.columns[0]}
+                columns[each_attr.key] = each_attr.columns[0]
+                sqltypes[each_attr.key] = attribute_object["type"]
+            except Exception as ex:
+                attribute_object = {"name": each_attr.key,
+                                    "exception": f"{ex}"}
+            attributes.append(MappingProxyType(attribute_object))
+    primary_key = tuple(mapper.get_property_by_column(each_column).key for each_column in mapper.primary_key)
+    return MappingProxyType({"name": resource_name,
+                             "model": resource_class,
+                             "attributes": tuple(attributes),
+                             "columns": MappingProxyType(columns),
+                             "sqltypes": MappingProxyType(sqltypes),
+                             "primary_key": primary_key})
@@ -102,7 +102,31 @@ class Config:
         BACKTIC_AS_QUOTE = True
         
     ONTIMIZE_SERVICE_TYPE = "OntimizeEE" #  "OntimizeEE" uses the API Bridge / "JSONAPI" / "LAC" | Args.service_type
-        
+    ONTIMIZE_MAX_PAGE_SIZE = 1000  # Ontimize searches: client pageSize / offset are honored, up to this many rows
+    ONTIMIZE_EXPORT_MAX_ROWS = 100000  # Ontimize searches with "stream": true (export) - rows streamed, not paged
+    ONTIMIZE_COUNT = "none"  # Ontimize searches totalQueryRecordsNumber: none (999) | exact | estimated - or per request: payload "count"
+    if os.getenv('ONTIMIZE_MAX_PAGE_SIZE'):
+        ONTIMIZE_MAX_PAGE_SIZE = int(os.getenv('ONTIMIZE_MAX_PAGE_SIZE'))  # type: ignore
+    if os.getenv('ONTIMIZE_EXPORT_MAX_ROWS'):
+        ONTIMIZE_EXPORT_MAX_ROWS = int(os.getenv('ONTIMIZE_EXPORT_MAX_ROWS'))  # type: ignore
+    if os.getenv('ONTIMIZE_COUNT'):
+        ONTIMIZE_COUNT = os.getenv('ONTIMIZE_COUNT')  # type: ignore # type: str
+
+    CUSTOM_ENDPOINT_JSON_ENCODER = "json"  # streamed responses: json | orjson (pip install orjson) | module:function (obj -> str)
+    """ CustomEndpoint.stream (api/system/custom_endpoint.py) """
+    CUSTOM_ENDPOINT_STREAM_BATCH = 500  # rows read per batch when streaming endpoints without children
+    if os.getenv('CUSTOM_ENDPOINT_JSON_ENCODER'):
+        CUSTOM_ENDPOINT_JSON_ENCODER = os.getenv('CUSTOM_ENDPOINT_JSON_ENCODER')  # type: ignore # type: str
+    if os.getenv('CUSTOM_ENDPOINT_STREAM_BATCH'):
+        CUSTOM_ENDPOINT_STREAM_BATCH = int(os.getenv('CUSTOM_ENDPOINT_STREAM_BATCH'))  # type: ignore
+    CUSTOM_ENDPOINT_COUNT = "none"  # totalQueryRecordsNumber: none (999) | exact | estimated - or per request: count=
+    """ api/system/record_count.py """
+    CUSTOM_ENDPOINT_COUNT_TTL = 300  # seconds - cached counts (and aggregates) are also discarded on writes to their table
+    if os.getenv('CUSTOM_ENDPOINT_COUNT'):
+        CUSTOM_ENDPOINT_COUNT = os.getenv('CUSTOM_ENDPOINT_COUNT')  # type: ignore # type: str
+    if os.getenv('CUSTOM_ENDPOINT_COUNT_TTL'):
+        CUSTOM_ENDPOINT_COUNT_TTL = int(os.getenv('CUSTOM_ENDPOINT_COUNT_TTL'))  # type: ignore
+
     app_logger.debug(f'config.py - SQLALCHEMY_DATABASE_URI: {SQLALCHEMY_DATABASE_URI}')
 
     # as desired, use env variable: export SQLALCHEMY_DATABASE_URI='sqlite:////Users/val/dev/servers/docker_api_logic_project/database/db.sqliteXX'
@@ -183,6 +207,78 @@ class Config:
     N8N_PRODUCER = None # comment out to enable N8N producer
     # Consumer under consideration
 
+    # AI Supplier Selection (logic/logic_discovery/check_credit.py)
+    AI_DECISION_CACHE = "memory"  # memory | sqlite | redis://localhost:6379/0 | none
+    """ where AI supplier decisions are cached (logic/system/ai_decision_cache.py) """
+    AI_DECISION_CACHE_TTL = 3600  # seconds
+    AI_DECISION_CACHE_SIZE = 1000  # entries, least recently used are evicted
+    if os.getenv('AI_DECISION_CACHE'):  # e.g. export AI_DECISION_CACHE=sqlite
+        AI_DECISION_CACHE = os.getenv('AI_DECISION_CACHE')  # type: ignore # type: str
+        app_logger.debug(f'AI Decision Cache .. overridden from env variable: {AI_DECISION_CACHE}')
+    if os.getenv('AI_DECISION_CACHE_TTL'):
+        AI_DECISION_CACHE_TTL = int(os.getenv('AI_DECISION_CACHE_TTL'))  # type: ignore
+    if os.getenv('AI_DECISION_CACHE_SIZE'):
+        AI_DECISION_CACHE_SIZE = int(os.getenv('AI_DECISION_CACHE_SIZE'))  # type: ignore
+    AI_SUPPLIER_SELECTION = "sync"  # sync | batch | deferred
+    """ sync: 1 AI request per Item; batch: 1 AI request for all the Items in a transaction (logic/system/ai_supplier_batch.py)
+        deferred: provisional price (lowest cost supplier), AI re-prices later in background (logic/system/ai_supplier_worker.py) """
+    AI_SUPPLIER_WORKERS = 2  # background threads for deferred selection
+    if os.getenv('AI_SUPPLIER_SELECTION'):  # e.g. export AI_SUPPLIER_SELECTION=batch
+        AI_SUPPLIER_SELECTION = os.getenv('AI_SUPPLIER_SELECTION')  # type: ignore # type: str
+        app_logger.debug(f'AI Supplier Selection .. overridden from env variable: {AI_SUPPLIER_SELECTION}')
+    if os.getenv('AI_SUPPLIER_WORKERS'):
+        AI_SUPPLIER_WORKERS = int(os.getenv('AI_SUPPLIER_WORKERS'))  # type: ignore
+    AI_SUPPLIER_PREFILTER = True
+    """ rules choose single / dominant suppliers without AI (logic/system/supplier_scoring.py) """
+    if os.getenv('AI_SUPPLIER_PREFILTER'):  # e.g. export AI_SUPPLIER_PREFILTER=False
+        AI_SUPPLIER_PREFILTER = os.getenv('AI_SUPPLIER_PREFILTER').lower() not in ["false", "0", "no"]  # type: ignore
+    AI_CLIENT_BASE_URL = None  # e.g., http://localhost:8765/v1 (local stub server); None means OPENAI_BASE_URL, else OpenAI
+    """ pooled AI client settings (logic/system/ai_client.py) """
+    AI_CLIENT_TIMEOUT = 30  # seconds to read a response
+    AI_CLIENT_CONNECT_TIMEOUT = 5  # seconds
+    AI_CLIENT_MAX_RETRIES = 2  # with exponential backoff
+    AI_CLIENT_MAX_CONNECTIONS = 20
+    AI_CLIENT_KEEPALIVE = 60  # seconds an idle connection is kept open
+    if os.getenv('AI_CLIENT_BASE_URL'):
+        AI_CLIENT_BASE_URL = os.getenv('AI_CLIENT_BASE_URL')  # type: ignore # type: str
+        app_logger.debug(f'AI Client Base URL .. overridden from env variable: {AI_CLIENT_BASE_URL}')
+    if os.getenv('AI_CLIENT_TIMEOUT'):
+        AI_CLIENT_TIMEOUT = float(os.getenv('AI_CLIENT_TIMEOUT'))  # type: ignore
+    if os.getenv('AI_CLIENT_CONNECT_TIMEOUT'):
+        AI_CLIENT_CONNECT_TIMEOUT = float(os.getenv('AI_CLIENT_CONNECT_TIMEOUT'))  # type: ignore
+    if os.getenv('AI_CLIENT_MAX_RETRIES'):
+        AI_CLIENT_MAX_RETRIES = int(os.getenv('AI_CLIENT_MAX_RETRIES'))  # type: ignore
+    if os.getenv('AI_CLIENT_MAX_CONNECTIONS'):
+        AI_CLIENT_MAX_CONNECTIONS = int(os.getenv('AI_CLIENT_MAX_CONNECTIONS'))  # type: ignore
+    if os.getenv('AI_CLIENT_KEEPALIVE'):
+        AI_CLIENT_KEEPALIVE = float(os.getenv('AI_CLIENT_KEEPALIVE'))  # type: ignore
+    AI_GUARD_DEADLINE = 10  # seconds per AI call, then first candidate is used
+    """ AI call guard (logic/system/ai_guard.py) - metrics at /ai_supplier_metrics """
+    AI_GUARD_SLOW_CALL = 5  # seconds - slower calls count as failures
+    AI_GUARD_FAILURES = 3  # consecutive failures that open the circuit (first candidate is used)
+    AI_GUARD_RESET = 30  # seconds the circuit stays open, then 1 trial call
+    AI_GUARD_BUDGET = 120  # AI calls per minute (0: unlimited)
+    if os.getenv('AI_GUARD_DEADLINE'):
+        AI_GUARD_DEADLINE = float(os.getenv('AI_GUARD_DEADLINE'))  # type: ignore
+    if os.getenv('AI_GUARD_SLOW_CALL'):
+        AI_GUARD_SLOW_CALL = float(os.getenv('AI_GUARD_SLOW_CALL'))  # type: ignore
+    if os.getenv('AI_GUARD_FAILURES'):
+        AI_GUARD_FAILURES = int(os.getenv('AI_GUARD_FAILURES'))  # type: ignore
+    if os.getenv('AI_GUARD_RESET'):
+        AI_GUARD_RESET = float(os.getenv('AI_GUARD_RESET'))  # type: ignore
+    if os.getenv('AI_GUARD_BUDGET'):
+        AI_GUARD_BUDGET = int(os.getenv('AI_GUARD_BUDGET'))  # type: ignore
+    AI_AUDIT_RETENTION_DAYS = 90  # SysSupplierReq rows older than this are deleted by the retention job (0: keep all)
+    """ SysSupplierReq audit storage (logic/system/supplier_audit.py) """
+    AI_AUDIT_ARCHIVE_DIR = None  # e.g., 'database/archive' - rows are archived (gzipped json lines) before delete
+    AI_AUDIT_TOP_N = 3  # ranked candidates kept in SysSupplierReq.top_n (0: all)
+    if os.getenv('AI_AUDIT_RETENTION_DAYS'):
+        AI_AUDIT_RETENTION_DAYS = int(os.getenv('AI_AUDIT_RETENTION_DAYS'))  # type: ignore
+    if os.getenv('AI_AUDIT_ARCHIVE_DIR'):
+        AI_AUDIT_ARCHIVE_DIR = os.getenv('AI_AUDIT_ARCHIVE_DIR')  # type: ignore # type: str
+    if os.getenv('AI_AUDIT_TOP_N'):
+        AI_AUDIT_TOP_N = int(os.getenv('AI_AUDIT_TOP_N'))  # type: ignore
+
     OPT_LOCKING = "optional"
     if os.getenv('OPT_LOCKING'):  # e.g. export OPT_LOCKING=required
         opt_locking_export = os.getenv('OPT_LOCKING')  # type: ignore # type: str
@@ -86,6 +86,8 @@ import oracledb
 import integration.kafka.kafka_producer as kafka_producer
 import integration.kafka.kafka_consumer as kafka_consumer
 import integration.n8n.n8n_producer as n8n_producer
+import logic.system.ai_supplier_worker as ai_supplier_worker
+import logic.system.ai_client as ai_client
 
 
 
@@ -344,6 +346,9 @@ def api_logic_server_setup(flask_app: Flask, args: Args):
 
             n8n_producer.n8n_producer()
 
+            ai_client.ai_client()
+            ai_supplier_worker.ai_supplier_worker(flask_app)
+
             SAFRSBase._s_auto_commit = False
             session.close()
         
@@ -1,7 +1,8 @@
 # coding: utf-8
 import datetime
+import zlib
 from sqlalchemy import DECIMAL, DateTime  # API Logic Server GenAI assist
-from sqlalchemy import Column, DECIMAL, Date, ForeignKey, Integer, String, JSON
+from sqlalchemy import Column, DECIMAL, Date, ForeignKey, Integer, String, JSON, Boolean, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -181,15 +182,67 @@ class SysSupplierReq(Base):  # type: ignore
     id = Column(Integer, primary_key=True)
     item_id = Column(Integer, ForeignKey("item.id"), index=True, nullable=True)
     product_id = Column(Integer, ForeignKey("product.id"), index=True, nullable=False)
-    request = Column(String(2000))          # inputs used for ranking (per-line summary)
+    request = Column(String(2000))          # inputs used for ranking (per-line summary) - legacy rows, see prompt_hash
+    prompt_hash = Column(String(64), ForeignKey("sys_supplier_prompt.prompt_hash"), index=True)  # deduplicated, compressed request
     top_n   = Column(JSON)                  # ranked candidates with rationales
     chosen_supplier_id = Column(Integer, ForeignKey("supplier.id"))
     reason = Column(String(500))
-    created_on = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    from_cache = Column(Boolean, default=False)     # decision served from ai_decision_cache (no AI call)
+    status = Column(String(20))             # provisional (deferred AI selection pending) | selecting | chosen | failed
+    created_on = Column(DateTime, default=datetime.datetime.utcnow, nullable=False, index=True)  # retention
 
     # parent relationships (access parent)
     item : Mapped["Item"] = relationship(back_populates="SysSupplierReqList")
     product : Mapped["Product"] = relationship(back_populates="SysSupplierReqList")
     chosen_supplier : Mapped["Supplier"] = relationship()
+    sys_supplier_prompt : Mapped["SysSupplierPrompt"] = relationship()
 
     # child relationships (access children)
+
+    @jsonapi_attr
+    def prompt(self) -> str:
+        """ the AI request (decompressed from sys_supplier_prompt, or legacy request) """
+        if isinstance(self, type):  # class access (eg, api discovery)
+            return None
+        if self.sys_supplier_prompt is not None:
+            return self.sys_supplier_prompt.prompt
+        return self.request
+
+
+
+class SysSupplierDecisionCache(Base):  # type: ignore
+    """
+    description: System table caching AI supplier decisions (sqlite backend of logic/system/ai_decision_cache.py).
+    """
+    __tablename__ = "sys_supplier_decision_cache"
+    _s_collection_name = 'SysSupplierDecisionCache'  # type: ignore
+
+    id = Column(Integer, primary_key=True)
+    decision_key = Column(String(64), unique=True, index=True, nullable=False)  # hash of supplier options, world conditions, model
+    supplier_id = Column(Integer)
+    reasoning = Column(String(2000))
+    request = Column(String(2000))
+    created_on = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    last_used_on = Column(DateTime, default=datetime.datetime.utcnow, nullable=False, index=True)  # LRU eviction
+    hit_count = Column(Integer, default=0)
+
+
+
+class SysSupplierPrompt(Base):  # type: ignore
+    """
+    description: System table of distinct AI supplier requests (prompts), compressed - referenced by SysSupplierReq.prompt_hash.
+    """
+    __tablename__ = "sys_supplier_prompt"
+    _s_collection_name = 'SysSupplierPrompt'  # type: ignore
+    exclude_attrs = ["payload"]  # binary - api shows prompt
+
+    prompt_hash = Column(String(64), primary_key=True)  # sha256 of the request
+    payload = Column(LargeBinary, nullable=False)       # zlib compressed request (json)
+    created_on = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    @jsonapi_attr
+    def prompt(self) -> str:
+        """ the AI request (decompressed) """
+        if isinstance(self, type):  # class access (eg, api discovery)
+            return None
+        return zlib.decompress(self.payload).decode("utf-8")
@@ -1,14 +1,14 @@
 import datetime
 from decimal import Decimal
 import json
-import os
 from time import time
 from logic_bank.exec_row_logic.logic_row import LogicRow
 from logic_bank.extensions.rule_extensions import RuleExtension
 from logic_bank.logic_bank import Rule
-from openai import OpenAI
-from sqlalchemy import JSON
 from database import models
+from logic.system import ai_client, ai_decision_cache, ai_guard, ai_supplier_batch, ai_supplier_worker, supplier_audit, supplier_candidates, supplier_scoring
+from logic.system.supplier_candidates import SupplierCandidate
+from config.config import Config
 import logging
 
 app_logger = logging.getLogger(__name__)
@@ -58,6 +58,9 @@ def declare_logic():
 
     def ItemUnitPriceFromSupplier(row: models.Item, old_row: models.Item, logic_row: LogicRow):
         """Deterministic rule decides when AI should run."""
+        if logic_row.is_updated() and row.product_id == old_row.product_id:
+            # same product - price stands (copy semantics), or is re-priced by deferred AI selection (logic/system/ai_supplier_worker.py)
+            return row.unit_price
         if row.product.count_suppliers == 0:
             logic_row.debug(f"Item {row.id} - Product not from supplier")
             return row.product.unit_price  # No change if no supplier
@@ -73,84 +76,204 @@ def declare_logic():
         sys_supplier_req_logic_row.insert(reason="Supplier Svc Request ", row=sys_supplier_req)  # triggers rules...
         return sys_supplier_req.chosen_unit_price
 
-    Rule.formula(derive=models.Item.unit_price, calling=ItemUnitPriceFromSupplier)   # invokes the function above
+    Rule.formula(derive=models.Item.unit_price, calling=ItemUnitPriceFromSupplier)  # invokes the function above
 
 
     def choose_supplier_for_item_with_ai(row: models.SysSupplierReq, old_row: models.SysSupplierReq, logic_row: LogicRow):
         '''  Choose a supplier for the SysSupplierReq using AI (simulated here).
              Sets chosen_supplier_id and chosen_unit_price on the SysSupplierReq row.
              If no APIKey (use the stub out) or ai error, defaults to first candidate.
+             In batch mode (config.py AI_SUPPLIER_SELECTION), 1 AI request covers every Item pending in the flush.
+             In deferred mode, the lowest cost supplier is provisional, and a background worker re-prices with AI.
+             Rules decide without AI when there is no real trade-off (config.py AI_SUPPLIER_PREFILTER).
         '''
-        def call_ai_service_to_choose_supplier(suppliers: list[models.ProductSupplier]) -> tuple[models.ProductSupplier, str, str]:
-            # Simulate AI service call - in reality, this would call an external AI service
-            return_supplier = None            
-            debug_test = True  # Set True to simulate a disruption scenario
-            start_time = time()
-            api_key = os.getenv("APILOGICSERVER_CHATGPT_APIKEY")
-            if not api_key:
-                reasoning = "Failure: no API key for AI service; defaulting to first supplier"
-            else:
-                client = OpenAI(api_key=api_key)
-                world_conditions = 'ship aground in Suez Canal' if debug_test else ''
-                supplier_options = [{'supplier_id': s.supplier_id, 'unit_cost': float(s.unit_cost), 
-                                     'lead_time_days': s.lead_time_days, 'region': s.region} 
-                        for s in suppliers]
-                messages = [
-                    {"role": "system", "content": "You are a supply chain optimization assistant that selects the best supplier based on cost, lead time, and current world conditions. You must respond with valid JSON only.  Customers are US only."},
-                    {"role": "user", "content": f"Current world conditions: {world_conditions}"},
-                    {"role": "user", "content": f"Supplier options: {json.dumps(supplier_options)}"},
-                    {"role": "user", "content": """Respond with a JSON object containing:
-                    - 'reasoning': A brief explanation of your decision process
-                    - 'ai_supplier': An object with 'supplier_id', 'unit_cost', and 'lead_time_days' for your selected supplier"""}
-                ]
+        debug_test = True  # Set True to simulate a disruption scenario
+        ai_model = 'gpt-4o-2024-08-06'
+        world_conditions = 'ship aground in Suez Canal' if debug_test else ''
+        system_message = {"role": "system", "content": "You are a supply chain optimization assistant that selects the best supplier based on cost, lead time, and current world conditions. You must respond with valid JSON only.  Customers are US only."}
+        decision_cache = ai_decision_cache.get_decision_cache()
+
+        def to_supplier_options(suppliers: tuple[SupplierCandidate, ...]) -> list[dict]:
+            return [s.to_option() for s in suppliers]
+
+        def choose_supplier_by_rule(supplier_options: list[dict]) -> dict:
+            """ decision for single candidate / Pareto dominant supplier, else None (AI decides) """
+            if not Config.AI_SUPPLIER_PREFILTER:
+                return None
+            rule_decision = supplier_scoring.prefilter(supplier_options, world_conditions)
+            if rule_decision is None:
+                return None
+            return {**rule_decision, 'request': None, 'from_cache': False, 'decided_by': 'rule'}
+
+        def call_ai_service(messages: list[dict]) -> tuple[dict, str]:
+            """ returns (AI response (json), None), or (None, reason) if no API key or refused / failed by guard """
+            client = ai_client.get_client()  # pooled (keep-alive, timeouts, retries), see config.py AI_CLIENT_*
+            if client is None:
+                return None, "no API key for AI service"
+            guard = ai_guard.get_guard()  # deadline, circuit breaker, budget - see config.py AI_GUARD_*
+
+            def create_completion() -> dict:
                 completion = client.chat.completions.create(
-                    model='gpt-4o-2024-08-06',
+                    model=ai_model,
                     messages=messages,
-                    response_format={"type": "json_object"}
+                    response_format={"type": "json_object"},
+                    timeout=guard.deadline
                 )
                 data = completion.choices[0].message.content
-                request = json.dumps(messages)
-                response_dict = json.loads(data)  # Now guaranteed to be pure JSON
-                
-                # Extract reasoning and chosen supplier
-                reasoning = response_dict.get('reasoning', 'No reasoning provided')
-                ai_supplier_id = response_dict.get('ai_supplier', {}).get('supplier_id')
-                
-                if not ai_supplier_id:
-                    reasoning = "Failure: AI response missing 'ai_supplier' field"
+                return json.loads(data)  # Now guaranteed to be pure JSON
+
+            return guard.call(create_completion)
+
+        def call_ai_service_to_choose_supplier(suppliers: tuple[SupplierCandidate, ...]) -> tuple[SupplierCandidate, str, str, bool]:
+            # Simulate AI service call - in reality, this would call an external AI service
+            #   identical requests are served from the decision cache (see config.py AI_DECISION_CACHE)
+            supplier_options = to_supplier_options(suppliers)
+            rule_decision = choose_supplier_by_rule(supplier_options)
+            if rule_decision is not None:
+                return use_decision(suppliers, rule_decision, None)
+            messages = [
+                system_message,
+                {"role": "user", "content": f"Current world conditions: {world_conditions}"},
+                {"role": "user", "content": f"Supplier options: {json.dumps(supplier_options)}"},
+                {"role": "user", "content": """Respond with a JSON object containing:
+                - 'reasoning': A brief explanation of your decision process
+                - 'ai_supplier': An object with 'supplier_id', 'unit_cost', and 'lead_time_days' for your selected supplier"""}
+            ]
+            request = json.dumps(messages)
+            cache_key = ai_decision_cache.decision_key(supplier_options, world_conditions, ai_model)
+            decision = decision_cache.get(cache_key, session=logic_row.session)
+            if decision is not None:
+                decision = {**decision, 'from_cache': True}
+            else:
+                response_dict, failure = call_ai_service(messages)
+                decided_by = 'ai'
+                if response_dict is None:
+                    reasoning = f"{failure}; defaulting to first supplier"
+                    ai_supplier_id = None
+                    decided_by = 'fallback'
+                else:  # Extract reasoning and chosen supplier
+                    reasoning = response_dict.get('reasoning', 'No reasoning provided')
+                    ai_supplier_id = response_dict.get('ai_supplier', {}).get('supplier_id')
+                    if not ai_supplier_id:
+                        reasoning = "Failure: AI response missing 'ai_supplier' field"
+                decision = {'supplier_id': ai_supplier_id, 'reasoning': reasoning, 'request': request, 'from_cache': False, 'decided_by': decided_by}
+            return use_decision(suppliers, decision, cache_key)
+
+        def call_ai_service_to_choose_suppliers_for_batch(product_ids: list[int]) -> dict[int, dict]:
+            """ 1 AI request for all products not in the decision cache; returns {product_id: decision} """
+            decisions = {}
+            batch_products = []
+            for each_product_id in product_ids:
+                supplier_options = to_supplier_options(get_supplier_options(each_product_id))
+                if len(supplier_options) == 0:
+                    continue
+                rule_decision = choose_supplier_by_rule(supplier_options)
+                if rule_decision is not None:
+                    decisions[each_product_id] = rule_decision
+                    continue
+                cache_key = ai_decision_cache.decision_key(supplier_options, world_conditions, ai_model)
+                decision = decision_cache.get(cache_key, session=logic_row.session)
+                if decision is not None:
+                    decisions[each_product_id] = {**decision, 'from_cache': True, 'decided_by': 'ai', 'cache_key': cache_key}
+                else:
+                    batch_products.append({'product_id': each_product_id, 'supplier_options': supplier_options, 'cache_key': cache_key})
+            if len(batch_products) == 0:
+                return decisions
+            messages = [
+                system_message,
+                {"role": "user", "content": f"Current world conditions: {world_conditions}"},
+                {"role": "user", "content": f"Products and supplier options: {json.dumps([{'product_id': p['product_id'], 'supplier_options': p['supplier_options']} for p in batch_products])}"},
+                {"role": "user", "content": """Choose 1 supplier for each product.  Respond with a JSON object containing:
+                - 'decisions': A list with 1 object per product, containing 'product_id', 'supplier_id' for your selected supplier, and 'reasoning': A brief explanation of your decision process"""}
+            ]
+            request = json.dumps(messages)
+            logic_row.log(f"Batch AI request to choose suppliers for products {[p['product_id'] for p in batch_products]}")
+            response_dict, failure = call_ai_service(messages)
+            ai_decisions = {}
+            if response_dict is not None:
+                for each_ai_decision in response_dict.get('decisions', []):
+                    if isinstance(each_ai_decision, dict):
+                        ai_decisions[each_ai_decision.get('product_id')] = each_ai_decision
+            for each_product in batch_products:
+                ai_decision = ai_decisions.get(each_product['product_id'], {})
+                ai_supplier_id = ai_decision.get('supplier_id')
+                decided_by = 'ai'
+                if response_dict is None:
+                    reasoning = f"{failure}; defaulting to first supplier"
+                    decided_by = 'fallback'
+                elif not ai_supplier_id:
+                    reasoning = f"Failure: AI response missing decision for product {each_product['product_id']}"
                 else:
-                    for supplier in suppliers:  # Find the selected supplier in our list
-                        if supplier.supplier_id == ai_supplier_id:
-                            return_supplier = supplier
-                            break
-                    if return_supplier is None:
-                        reasoning = f"AI selected supplier {ai_supplier_id} not found in candidates, using first available"
-                    
+                    reasoning = ai_decision.get('reasoning', 'No reasoning provided')
+                decisions[each_product['product_id']] = {'supplier_id': ai_supplier_id, 'reasoning': reasoning, 'request': request,
+                                                         'from_cache': False, 'decided_by': decided_by, 'cache_key': each_product['cache_key']}
+            return decisions
+
+        def use_decision(suppliers: tuple[SupplierCandidate, ...], decision: dict, cache_key: str) -> tuple[SupplierCandidate, str, str, bool]:
+            """ find decided supplier in candidates (default: first), caching successful AI decisions
+                reason is prefixed with the deciding path: Rule, AI, AI (cached) or Fallback """
+            return_supplier = None
+            decided_by = decision.get('decided_by', 'ai')
+            ai_supplier_id = decision.get('supplier_id')
+            reasoning = decision.get('reasoning', 'No reasoning provided')
+            from_cache = decision.get('from_cache', False)
+            if ai_supplier_id:
+                for supplier in suppliers:  # Find the selected supplier in our list
+                    if supplier.supplier_id == ai_supplier_id:
+                        return_supplier = supplier
+                        break
+                if return_supplier is None:
+                    reasoning = f"AI selected supplier {ai_supplier_id} not found in candidates, using first available"
+                    from_cache = False
+                elif not from_cache and decided_by == 'ai':  # only successful AI decisions are cached
+                    decision_cache.put(cache_key, {'supplier_id': ai_supplier_id, 'reasoning': reasoning, 'request': decision.get('request')},
+                                       session=logic_row.session)
             if return_supplier is None:  # Fallback if AI selected supplier not found
                 return_supplier = suppliers[0]
-            return return_supplier, reasoning, request
+            path = {'rule': 'Rule', 'fallback': 'Fallback'}.get(decided_by, 'AI (cached)' if from_cache else 'AI')
+            reasoning = f"{path}: {reasoning}"
+            return return_supplier, reasoning, decision.get('request'), from_cache
         
-        def get_supplier_options(row: models.SysSupplierReq) -> list[models.ProductSupplier]:
-            # Gather supplier options for the given SysSupplierReq
-            supplier_options = []
-            if row.product and row.product.ProductSupplierList:
-                for each_supplier in row.product.ProductSupplierList:
-                    # Add supplier with region info to the suppliers list
-                    supplier_with_region = each_supplier
-                    supplier_with_region.region = each_supplier.supplier.region if hasattr(each_supplier.supplier, 'region') else None
-                    supplier_options.append(supplier_with_region)
-                    logic_row.log(f"SysSupplierReq {row.id} has supplier candidate {each_supplier.supplier_id} ")
+        def get_supplier_options(product_id: int) -> tuple[SupplierCandidate, ...]:
+            # Gather supplier options (with region) for the given Product - 1 query
+            supplier_options = supplier_candidates.get_supplier_candidates(logic_row.session, product_id)
+            logic_row.log(f"Product {product_id} has supplier candidates {[each.supplier_id for each in supplier_options]} ")
             return supplier_options
 
-        if logic_row.is_inserted():
-            # Call AI service to choose supplier based on request and top_n
-            supplier_options = get_supplier_options(row=row)
-            chosen_supplier, reason, request = call_ai_service_to_choose_supplier(supplier_options)
+        if logic_row.is_inserted() or (logic_row.is_updated() and row.status == "selecting"):
+            # Call AI service to choose supplier based on request and top_n (selecting: deferred re-price by worker)
+            start_time = time()
+            supplier_options = get_supplier_options(product_id=row.product_id)
+            row.top_n = supplier_audit.compact_top_n(supplier_scoring.score(to_supplier_options(supplier_options)))  # ranked candidates
+            if logic_row.is_inserted() and Config.AI_SUPPLIER_SELECTION == "deferred" \
+                    and choose_supplier_by_rule(to_supplier_options(supplier_options)) is None:
+                # provisional price now, AI re-prices Item later (logic/system/ai_supplier_worker.py)
+                provisional_supplier = min(supplier_options, key=lambda s: s.unit_cost)
+                row.chosen_supplier_id = provisional_supplier.supplier_id
+                row.chosen_unit_price = provisional_supplier.unit_cost
+                row.reason = "Provisional: lowest cost supplier, pending AI selection"
+                row.from_cache = False
+                row.status = "provisional"
+                ai_supplier_worker.defer(logic_row.session, row)
+                logic_row.log(f"Provisional supplier {row.chosen_supplier_id} for SysSupplierReq {row.id}, AI selection deferred")
+                ai_guard.get_guard().record_decision(time() - start_time, "Provisional")
+                return
+            if Config.AI_SUPPLIER_SELECTION == "batch":
+                decision = ai_supplier_batch.get_batch_decision(session=logic_row.session, product_id=row.product_id,
+                                                                choose_batch=call_ai_service_to_choose_suppliers_for_batch)
+                chosen_supplier, reason, request, from_cache = use_decision(supplier_options, decision or {}, (decision or {}).get('cache_key'))
+            else:
+                chosen_supplier, reason, request, from_cache = call_ai_service_to_choose_supplier(supplier_options)
             row.chosen_supplier_id = chosen_supplier.supplier_id
             row.chosen_unit_price = chosen_supplier.unit_cost
-            row.request = request
+            row.prompt_hash = None if request is None else supplier_audit.store_prompt(logic_row.session, request)  # deduplicated, compressed
             row.reason = reason  # audit trail for governance
-            logic_row.log(f"Chosen supplier {row.chosen_supplier_id} with reason '{reason}' for SysSupplierReq {row.id}")
+            row.from_cache = from_cache
+            row.status = "chosen"
+            logic_row.log(f"Chosen supplier {row.chosen_supplier_id} with reason '{reason}' for SysSupplierReq {row.id}"
+                          f"{' (from cache)' if from_cache else ''} in {time() - start_time:.3f}s")
+            ai_guard.get_guard().record_decision(time() - start_time, reason.split(":")[0])
+            if logic_row.is_updated():  # re-price Item (amount, amount_total, balance adjust)
+                ai_supplier_worker.reprice_item(logic_row, sys_supplier_req=row)
 
     Rule.early_row_event(models.SysSupplierReq, calling=choose_supplier_for_item_with_ai)
-
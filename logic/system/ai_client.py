@@ -0,0 +1,112 @@
+"""
+Process-wide AI (OpenAI) clients - used by logic/logic_discovery/check_credit.py
+
+Invoked at server start (api_logic_server_run.py -> config/server_setup.py)
+
+Each client (1 per api key / base url) holds a keep-alive connection pool, so supplier
+requests reuse connections (no TCP / TLS handshake per order line).
+
+Configured in config.Config:
+
+    AI_CLIENT_BASE_URL          e.g., http://localhost:8765/v1 for a local stub server (default: OpenAI)
+    AI_CLIENT_TIMEOUT           read timeout (seconds), AI_CLIENT_CONNECT_TIMEOUT for connect
+    AI_CLIENT_MAX_RETRIES       retries with exponential backoff (connection errors, 408, 409, 429, 5xx)
+    AI_CLIENT_MAX_CONNECTIONS   pool size, AI_CLIENT_KEEPALIVE idle seconds before connections are closed
+
+Fork-safe: gunicorn workers forked after setup discard inherited clients (sockets are shared
+with the parent), and create their own on first use.
+
+You do not normally need to alter this file
+"""
+import atexit
+import logging
+import os
+import threading
+from typing import Optional
+from openai import OpenAI, DefaultHttpxClient, Timeout, DEFAULT_CONNECTION_LIMITS
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+clients: dict = {}
+""" (api_key, base_url) -> OpenAI client """
+
+_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def ai_client():
+    """
+    Called by api_logic_server_run>server_setup to create the client for APILOGICSERVER_CHATGPT_APIKEY
+
+    Args:
+        none
+    """
+    client = get_client()
+    if client is None:
+        logger.debug("AI client not created - no APILOGICSERVER_CHATGPT_APIKEY")
+    else:
+        logger.info(f"AI client created - base url: {client.base_url}, timeout: {Config.AI_CLIENT_TIMEOUT}s, "
+                    f"retries: {Config.AI_CLIENT_MAX_RETRIES}, connections: {Config.AI_CLIENT_MAX_CONNECTIONS}")
+
+
+def get_client(api_key: Optional[str] = None) -> Optional[OpenAI]:
+    """ Return the pooled client for api_key (default: APILOGICSERVER_CHATGPT_APIKEY)
+
+    Args:
+        api_key (str, optional): api key
+
+    Returns:
+        OpenAI: shared client, or None if no api key
+    """
+    api_key = api_key or os.getenv("APILOGICSERVER_CHATGPT_APIKEY")
+    if not api_key:
+        return None
+    if os.getpid() != _pid:  # forked, and os.register_at_fork unavailable
+        _reset_after_fork()
+    key = (api_key, Config.AI_CLIENT_BASE_URL)
+    client = clients.get(key)
+    if client is None:
+        with _lock:
+            client = clients.get(key)
+            if client is None:
+                client = _create_client(api_key)
+                clients[key] = client
+    return client
+
+
+def _create_client(api_key: str) -> OpenAI:
+    limits = type(DEFAULT_CONNECTION_LIMITS)(  # httpx Limits, as used by the openai package
+        max_connections=int(Config.AI_CLIENT_MAX_CONNECTIONS),
+        max_keepalive_connections=int(Config.AI_CLIENT_MAX_CONNECTIONS),
+        keepalive_expiry=float(Config.AI_CLIENT_KEEPALIVE))
+    timeout = Timeout(float(Config.AI_CLIENT_TIMEOUT), connect=float(Config.AI_CLIENT_CONNECT_TIMEOUT))
+    return OpenAI(api_key=api_key,
+                  base_url=Config.AI_CLIENT_BASE_URL or None,  # None: OPENAI_BASE_URL, else api.openai.com
+                  timeout=timeout,
+                  max_retries=int(Config.AI_CLIENT_MAX_RETRIES),
+                  http_client=DefaultHttpxClient(limits=limits, timeout=timeout))
+
+
+def _reset_after_fork():
+    """ forked child: drop inherited clients without closing (the parent still uses the sockets) """
+    global _lock, _pid
+    _lock = threading.Lock()
+    _pid = os.getpid()
+    clients.clear()
+
+
+def close():
+    """ close all clients (connection pools) """
+    with _lock:
+        for each_client in clients.values():
+            try:
+                each_client.close()
+            except Exception as e:
+                logger.debug(f"AI client close failed: {e}")
+        clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(close)
@@ -0,0 +1,202 @@
+"""
+Content-addressed cache for AI decisions - used by logic/logic_discovery/check_credit.py
+
+Identical requests (same supplier options, world conditions and model) return the
+cached decision, so repeated products skip the AI round-trip.
+
+Backend is selected by config.Config.AI_DECISION_CACHE:
+
+    memory                  in-process LRU (default) - per server process
+    sqlite                  sys_supplier_decision_cache table, in the project database
+    redis://host:port/db    shared by all servers / workers (requires redis package)
+    none                    disabled
+
+Entries expire after AI_DECISION_CACHE_TTL seconds; beyond AI_DECISION_CACHE_SIZE entries,
+the least recently used are evicted.
+
+You do not normally need to alter this file
+"""
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+decision_cache = None
+""" cache selected by Config.AI_DECISION_CACHE (created on first use) """
+
+
+def decision_key(supplier_options: list[dict], world_conditions: str, model: str) -> str:
+    """ Return hash of the normalized request (order of supplier_options is not significant)
+
+    Args:
+        supplier_options (list[dict]): candidates, each with supplier_id, unit_cost, lead_time_days, region
+        world_conditions (str): current world conditions given to AI
+        model (str): AI model name
+
+    Returns:
+        str: sha256 hex digest
+    """
+    normalized = {"supplier_options": sorted(supplier_options, key=lambda s: str(s.get("supplier_id"))),
+                  "world_conditions": (world_conditions or "").strip(),
+                  "model": model}
+    normalized_json = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(normalized_json.encode("utf-8")).hexdigest()
+
+
+class DecisionCache(ABC):
+    """
+    Abstract cache - decisions are dicts: {"supplier_id": int, "reasoning": str, "request": str}
+
+    session is the current SQLAlchemy session (used by database backends, ignored by others)
+    """
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @abstractmethod
+    def get(self, key: str, session=None) -> Optional[dict]:
+        """ cached decision for key (None - not cached, or expired) """
+
+    @abstractmethod
+    def put(self, key: str, decision: dict, session=None):
+        """ cache decision for key """
+
+
+class NoDecisionCache(DecisionCache):
+    """ caching disabled """
+
+    def get(self, key: str, session=None) -> Optional[dict]:
+        return None
+
+    def put(self, key: str, decision: dict, session=None):
+        pass
+
+
+class MemoryDecisionCache(DecisionCache):
+    """ in-process LRU with TTL (thread safe) """
+
+    def __init__(self, ttl: int, max_size: int):
+        super().__init__(ttl, max_size)
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, decision)
+        self._lock = threading.Lock()
+
+    def get(self, key: str, session=None) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, decision = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return decision
+
+    def put(self, key: str, decision: dict, session=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, decision)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class SqliteDecisionCache(DecisionCache):
+    """
+    sys_supplier_decision_cache table, next to sys_supplier_req
+
+    Uses the caller's session, so entries are written in the same transaction as the SysSupplierReq
+    (a separate connection would deadlock on sqlite's database write lock).
+    """
+
+    def get(self, key: str, session=None) -> Optional[dict]:
+        from database import models
+        if session is None:
+            return None
+        cache_row = session.query(models.SysSupplierDecisionCache).filter_by(decision_key=key).one_or_none()
+        if cache_row is None:
+            return None
+        now = datetime.datetime.utcnow()
+        if cache_row.created_on + datetime.timedelta(seconds=self.ttl) < now:
+            session.delete(cache_row)
+            return None
+        cache_row.last_used_on = now
+        cache_row.hit_count = (cache_row.hit_count or 0) + 1
+        return {"supplier_id": cache_row.supplier_id, "reasoning": cache_row.reasoning, "request": cache_row.request}
+
+    def put(self, key: str, decision: dict, session=None):
+        from database import models
+        if session is None:
+            return
+        cache_row = session.query(models.SysSupplierDecisionCache).filter_by(decision_key=key).one_or_none()
+        if cache_row is None:
+            cache_row = models.SysSupplierDecisionCache(decision_key=key, hit_count=0)
+            session.add(cache_row)
+        now = datetime.datetime.utcnow()
+        cache_row.supplier_id = decision["supplier_id"]
+        cache_row.reasoning = (decision.get("reasoning") or "")[:2000]
+        cache_row.request = (decision.get("request") or "")[:2000]
+        cache_row.created_on = now
+        cache_row.last_used_on = now
+        self._evict(session)
+
+    def _evict(self, session):
+        """ delete expired and least recently used entries, beyond max_size """
+        from database import models
+        cache = models.SysSupplierDecisionCache
+        expired_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.ttl)
+        session.query(cache).filter(cache.created_on < expired_before).delete(synchronize_session=False)
+        count = session.query(cache).count()
+        if count > self.max_size:
+            lru_ids = [each_id for each_id, in session.query(cache.id)
+                       .order_by(cache.last_used_on).limit(count - self.max_size)]
+            session.query(cache).filter(cache.id.in_(lru_ids)).delete(synchronize_session=False)
+
+
+class RedisDecisionCache(DecisionCache):
+    """
+    Shared cache (all servers / gunicorn workers).
+
+    TTL is set per entry; size is bounded by the redis server (e.g., maxmemory-policy allkeys-lru).
+    """
+
+    key_prefix = "als:ai_decision:"
+
+    def __init__(self, ttl: int, max_size: int, url: str):
+        super().__init__(ttl, max_size)
+        import redis  # optional dependency - pip install redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str, session=None) -> Optional[dict]:
+        value = self._redis.get(self.key_prefix + key)
+        return None if value is None else json.loads(value)
+
+    def put(self, key: str, decision: dict, session=None):
+        self._redis.setex(self.key_prefix + key, self.ttl, json.dumps(decision))
+
+
+def get_decision_cache() -> DecisionCache:
+    """ Return the cache selected by Config.AI_DECISION_CACHE """
+    global decision_cache
+    if decision_cache is None:
+        backend = (Config.AI_DECISION_CACHE or "none").strip()
+        ttl = int(Config.AI_DECISION_CACHE_TTL)
+        max_size = int(Config.AI_DECISION_CACHE_SIZE)
+        if backend.lower() == "memory":
+            decision_cache = MemoryDecisionCache(ttl, max_size)
+        elif backend.lower() == "sqlite":
+            decision_cache = SqliteDecisionCache(ttl, max_size)
+        elif backend.lower().startswith("redis"):
+            decision_cache = RedisDecisionCache(ttl, max_size, url=backend)
+        else:
+            decision_cache = NoDecisionCache(ttl, max_size)
+        logger.info(f"AI decision cache: {decision_cache.__class__.__name__} (ttl: {ttl}, size: {max_size})")
+    return decision_cache
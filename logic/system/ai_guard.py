@@ -0,0 +1,171 @@
+"""
+Guard for AI supplier calls - used by logic/logic_discovery/check_credit.py
+
+Bounds order-entry latency when the AI provider degrades:
+
+    deadline            each AI call is abandoned after AI_GUARD_DEADLINE seconds
+    circuit breaker     AI_GUARD_FAILURES consecutive failures (errors, deadlines, or calls slower
+                        than AI_GUARD_SLOW_CALL seconds) open the circuit for AI_GUARD_RESET seconds;
+                        then 1 trial call (half open) closes it again, or re-opens it
+    budget              at most AI_GUARD_BUDGET AI calls per minute (0: unlimited)
+
+When the guard refuses or abandons a call, the caller falls back to the deterministic
+first-candidate path.
+
+Metrics (decision / AI latency percentiles, fallback rate, circuit state) are available at
+/ai_supplier_metrics (api/api_discovery/system.py).
+
+You do not normally need to alter this file
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+guard = None
+""" guard configured from Config.AI_GUARD_* (created on first use) """
+
+
+class AiGuard():
+    """ deadline, circuit breaker and per-minute budget for AI calls, with metrics (thread safe) """
+
+    def __init__(self, deadline: float, slow_call: float, failure_threshold: int, reset_after: float,
+                 budget_per_minute: int, max_workers: int = 10):
+        self.deadline = deadline
+        self.slow_call = slow_call
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.budget_per_minute = budget_per_minute
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai_guard")
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_progress = False
+        self._call_times: deque = deque()  # monotonic start times, last minute (budget)
+        self._ai_latencies: deque = deque(maxlen=1000)
+        self._decision_latencies: deque = deque(maxlen=1000)
+        self._decision_paths: Counter = Counter()
+        self._fallbacks: Counter = Counter()
+
+    def call(self, ai_call: Callable, *args) -> tuple[Optional[object], Optional[str]]:
+        """ Run ai_call(*args) if allowed, within the deadline
+
+        Returns:
+            tuple: (result, None), or (None, fallback reason)
+        """
+        refused = self._admit()
+        if refused:
+            return self._fallback(refused)
+        start_time = time.monotonic()
+        future = self._executor.submit(ai_call, *args)
+        try:
+            result = future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            future.cancel()
+            self._record_call(time.monotonic() - start_time, failed=True)
+            return self._fallback(f"AI call exceeded deadline ({self.deadline}s)")
+        except Exception as e:
+            self._record_call(time.monotonic() - start_time, failed=True)
+            logger.warning(f"AI call failed: {e}")
+            return self._fallback(f"AI call failed ({e.__class__.__name__})")
+        latency = time.monotonic() - start_time
+        self._record_call(latency, failed=latency > self.slow_call)
+        return result, None
+
+    def record_decision(self, seconds: float, path: str):
+        """ record the latency of a supplier decision, and the path (Rule, AI, AI (cached), Fallback) that decided """
+        with self._lock:
+            self._decision_latencies.append(seconds)
+            self._decision_paths[path] += 1
+
+    def _admit(self) -> Optional[str]:
+        """ None if the call may proceed, else the reason it is refused """
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is not None:
+                if now - self._opened_at < self.reset_after or self._trial_in_progress:
+                    return "circuit open"
+                self._trial_in_progress = True  # half open: this call is the trial
+            if self.budget_per_minute > 0:
+                while self._call_times and now - self._call_times[0] > 60:
+                    self._call_times.popleft()
+                if len(self._call_times) >= self.budget_per_minute:
+                    self._trial_in_progress = False
+                    return f"AI call budget exhausted ({self.budget_per_minute}/minute)"
+                self._call_times.append(now)
+        return None
+
+    def _record_call(self, seconds: float, failed: bool):
+        with self._lock:
+            self._ai_latencies.append(seconds)
+            self._trial_in_progress = False
+            if failed:
+                self._consecutive_failures += 1
+                if self._opened_at is not None or self._consecutive_failures >= self.failure_threshold:
+                    if self._opened_at is None:
+                        logger.warning(f"AI circuit opened after {self._consecutive_failures} consecutive failed / slow calls")
+                    self._opened_at = time.monotonic()
+            else:
+                if self._opened_at is not None:
+                    logger.info("AI circuit closed")
+                self._consecutive_failures = 0
+                self._opened_at = None
+
+    def _fallback(self, reason: str) -> tuple[None, str]:
+        with self._lock:
+            self._fallbacks[reason.split(" (")[0]] += 1
+        return None, reason
+
+    def metrics(self) -> dict:
+        """ Return decision / AI call latency percentiles (seconds), fallback rate, circuit state """
+        with self._lock:
+            ai_latencies = sorted(self._ai_latencies)
+            decision_latencies = sorted(self._decision_latencies)
+            decisions = sum(self._decision_paths.values())
+            fallbacks = self._decision_paths.get("Fallback", 0)
+            if self._opened_at is None:
+                circuit = "closed"
+            elif time.monotonic() - self._opened_at < self.reset_after:
+                circuit = "open"
+            else:
+                circuit = "half open"
+            return {"decisions": decisions,
+                    "decision_paths": dict(self._decision_paths),
+                    "decision_latency": percentiles(decision_latencies),
+                    "fallback_rate": round(fallbacks / decisions, 4) if decisions else 0.0,
+                    "fallbacks": dict(self._fallbacks),
+                    "ai_calls": len(ai_latencies),
+                    "ai_latency": percentiles(ai_latencies),
+                    "circuit": circuit,
+                    "consecutive_failures": self._consecutive_failures,
+                    "budget_per_minute": self.budget_per_minute,
+                    "calls_last_minute": len(self._call_times)}
+
+
+def percentiles(sorted_values: list[float]) -> dict:
+    """ p50 / p95 / p99 / max of sorted_values (nearest rank), rounded to ms """
+    if len(sorted_values) == 0:
+        return {}
+    def rank(p: float) -> float:
+        return round(sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))], 3)
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": round(sorted_values[-1], 3)}
+
+
+def get_guard() -> AiGuard:
+    """ Return the guard configured from Config.AI_GUARD_* """
+    global guard
+    if guard is None:
+        guard = AiGuard(deadline=float(Config.AI_GUARD_DEADLINE),
+                        slow_call=float(Config.AI_GUARD_SLOW_CALL),
+                        failure_threshold=int(Config.AI_GUARD_FAILURES),
+                        reset_after=float(Config.AI_GUARD_RESET),
+                        budget_per_minute=int(Config.AI_GUARD_BUDGET),
+                        max_workers=int(Config.AI_CLIENT_MAX_CONNECTIONS))
+        logger.info(f"AI guard: deadline {guard.deadline}s, circuit opens after {guard.failure_threshold} failures, "
+                    f"budget {guard.budget_per_minute}/minute")
+    return guard
@@ -0,0 +1,84 @@
+"""
+Batched AI supplier selection - used by logic/logic_discovery/check_credit.py
+
+When config.Config.AI_SUPPLIER_SELECTION = "batch", the first SysSupplierReq in a transaction
+collects every distinct supplier-sourced product of the pending Items (inserted, or altered to a new Product),
+and obtains all the decisions with 1 AI request.  Subsequent SysSupplierReq rows in the same
+flush reuse those decisions, so multi-item orders incur 1 round-trip (not 1 per Item).
+
+Decisions are held in session.info, and discarded when the flush completes or rolls back.
+
+You do not normally need to alter this file
+"""
+import logging
+from typing import Callable, Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from database import models
+
+logger = logging.getLogger(__name__)
+
+BATCH_KEY = "ai_supplier_batch"
+""" session.info key for {product_id: decision} """
+
+
+def get_batch_decision(session: Session, product_id: int,
+                       choose_batch: Callable[[list[int]], dict]) -> Optional[dict]:
+    """ Return the decision for product_id, choosing all pending products in 1 batch on first call
+
+    Args:
+        session (Session): current session (decisions are kept in session.info)
+        product_id (int): product being requested
+        choose_batch (Callable): given product_ids, returns {product_id: decision}
+
+    Returns:
+        dict: decision - {"supplier_id", "reasoning", "request", "from_cache", "cache_key"}, or None
+    """
+    decisions = session.info.get(BATCH_KEY)
+    if decisions is None:
+        decisions = {}
+        session.info[BATCH_KEY] = decisions
+        _register_cleanup(session)
+        product_ids = _pending_product_ids(session)
+        if product_id not in product_ids:
+            product_ids.append(product_id)
+        logger.debug(f"AI supplier batch: choosing suppliers for products {product_ids}")
+        decisions.update(choose_batch(product_ids))
+    elif product_id not in decisions:  # eg, Item inserted by logic after the batch was chosen
+        decisions.update(choose_batch([product_id]))
+    return decisions.get(product_id)
+
+
+def _pending_product_ids(session: Session) -> list[int]:
+    """ distinct product_ids of inserted Items (or altered Items with a new Product) whose Product is supplier-sourced """
+    product_ids = []
+    altered_items = [each for each in session.dirty if isinstance(each, models.Item) and _product_changed(each)]
+    for each_instance in list(session.new) + altered_items:
+        if isinstance(each_instance, models.Item) and each_instance.product_id is not None:
+            if each_instance.product_id in product_ids:
+                continue
+            product = session.get(models.Product, each_instance.product_id)
+            if product is not None and (product.count_suppliers or 0) > 0:
+                product_ids.append(each_instance.product_id)
+    return product_ids
+
+
+def _product_changed(item: models.Item) -> bool:
+    """ altered Item needs a supplier choice only if its Product changed (not, eg, its quantity) """
+    item_state = inspect(item)
+    return item_state.attrs.product_id.history.has_changes() or item_state.attrs.product.history.has_changes()
+
+
+def _register_cleanup(session: Session):
+    """ discard batch decisions when the flush completes (or fails) """
+    if not event.contains(session, "after_flush_postexec", _clear_batch):
+        event.listen(session, "after_flush_postexec", _clear_batch)
+        event.listen(session, "after_rollback", _clear_batch_on_rollback)
+
+
+def _clear_batch(session: Session, flush_context):
+    session.info.pop(BATCH_KEY, None)
+
+
+def _clear_batch_on_rollback(session: Session):
+    session.info.pop(BATCH_KEY, None)
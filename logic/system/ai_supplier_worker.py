@@ -0,0 +1,150 @@
+"""
+Deferred AI supplier selection - used by logic/logic_discovery/check_credit.py
+
+Invoked at server start (api_logic_server_run.py -> config/server_setup.py)
+
+When config.Config.AI_SUPPLIER_SELECTION = "deferred", Items are priced provisionally
+(lowest cost supplier) and their SysSupplierReq rows (status provisional) are queued here
+after the transaction commits - so write latency does not depend on the AI provider.
+
+A pool of AI_SUPPLIER_WORKERS threads then re-prices each Item with a normal, logic-enforced
+update (in its own transaction):
+
+    1. SysSupplierReq.status = selecting    -- early row event calls AI, status becomes chosen
+    2. the event updates the Item (logic)   -- with the chosen unit price,
+                                               so Item.amount, Order.amount_total, Customer.balance re-derive
+
+If the update fails (e.g., Customer balance exceeds credit limit), the provisional price
+stands, and the SysSupplierReq is marked failed (reason shows the error).
+
+Provisional requests left by a stopped server are re-queued at startup.
+
+You do not normally need to alter this file
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+executor: Optional[ThreadPoolExecutor] = None
+""" worker pool (or None if AI_SUPPLIER_SELECTION is not deferred) """
+
+flask_app: Optional[Flask] = None
+""" workers run in an app context of this app (for safrs.DB.session) """
+
+DEFERRED_KEY = "ai_supplier_deferred"
+""" session.info key for SysSupplierReq rows to queue on commit """
+
+
+def ai_supplier_worker(app: Flask):
+    """
+    Called by api_logic_server_run>server_setup to start the worker pool
+
+    Enabled by config.AI_SUPPLIER_SELECTION = "deferred"
+
+    Args:
+        app (Flask): the flask app
+    """
+    global executor, flask_app
+    if Config.AI_SUPPLIER_SELECTION != "deferred":
+        return
+    flask_app = app
+    executor = ThreadPoolExecutor(max_workers=int(Config.AI_SUPPLIER_WORKERS), thread_name_prefix="ai_supplier")
+    logger.info(f"AI supplier selection deferred to {Config.AI_SUPPLIER_WORKERS} background workers")
+    import safrs
+    from database import models
+    with flask_app.app_context():
+        session = safrs.DB.session
+        pending_ids = [each_id for each_id, in session.query(models.SysSupplierReq.id)
+                       .filter(models.SysSupplierReq.status == "provisional")]
+        session.close()
+    for each_id in pending_ids:  # left by a stopped server
+        submit(each_id)
+
+
+def defer(session: Session, sys_supplier_req):
+    """ queue sys_supplier_req for re-pricing, once the current transaction commits
+
+    Args:
+        session (Session): current session
+        sys_supplier_req (models.SysSupplierReq): provisional request (id assigned at flush)
+    """
+    session.info.setdefault(DEFERRED_KEY, []).append(sys_supplier_req)
+    if not event.contains(session, "after_commit", _submit_deferred):
+        event.listen(session, "after_commit", _submit_deferred)
+        event.listen(session, "after_rollback", _discard_deferred)
+
+
+def submit(sys_supplier_req_id: int):
+    """ queue sys_supplier_req_id for re-pricing (ignored if no worker pool, eg, test data loading) """
+    if executor is None:
+        logger.debug(f"AI supplier worker not started - SysSupplierReq {sys_supplier_req_id} remains provisional")
+        return
+    executor.submit(reprice, sys_supplier_req_id)
+
+
+def reprice_item(logic_row, sys_supplier_req):
+    """ update the Item of a re-priced sys_supplier_req with logic - called by the SysSupplierReq early row event
+
+    Args:
+        logic_row (LogicRow): the SysSupplierReq logic row
+        sys_supplier_req (models.SysSupplierReq): with chosen_unit_price
+    """
+    item = sys_supplier_req.item
+    if item is None or getattr(sys_supplier_req, "chosen_unit_price", None) is None:
+        return
+    item_logic_row = logic_row.user_row_update(row=item, ins_upd_dlt="upd")  # old_row: provisional price
+    item.unit_price = sys_supplier_req.chosen_unit_price  # changed dependency - Item.unit_price formula keeps it
+    item_logic_row.update(reason="AI supplier re-price")
+
+
+def _submit_deferred(session: Session):
+    for each_req in session.info.pop(DEFERRED_KEY, []):
+        submit(each_req.id)
+
+
+def _discard_deferred(session: Session):
+    session.info.pop(DEFERRED_KEY, None)
+
+
+def reprice(sys_supplier_req_id: int):
+    """ choose supplier (AI) and re-price the Item, in a new logic-enforced transaction
+
+    Args:
+        sys_supplier_req_id (int): provisional SysSupplierReq
+    """
+    import safrs
+    from database import models
+    with flask_app.app_context():
+        session = safrs.DB.session
+        try:
+            sys_supplier_req = session.get(models.SysSupplierReq, sys_supplier_req_id)
+            if sys_supplier_req is None or sys_supplier_req.status != "provisional":
+                return
+            sys_supplier_req.status = "selecting"
+            session.commit()  # early row event chooses supplier, and re-prices the Item with logic
+            logger.info(f"SysSupplierReq {sys_supplier_req_id} re-priced with supplier {sys_supplier_req.chosen_supplier_id}")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"SysSupplierReq {sys_supplier_req_id} re-price failed, provisional price stands: {e}")
+            _mark_failed(session, sys_supplier_req_id, e)
+        finally:
+            session.close()
+
+
+def _mark_failed(session: Session, sys_supplier_req_id: int, error: Exception):
+    from database import models
+    try:
+        sys_supplier_req = session.get(models.SysSupplierReq, sys_supplier_req_id)
+        if sys_supplier_req is not None:
+            sys_supplier_req.status = "failed"
+            sys_supplier_req.reason = f"AI re-price failed, provisional price stands: {getattr(error, 'message', None) or error}"[:500]
+            session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"SysSupplierReq {sys_supplier_req_id} could not be marked failed: {e}")
@@ -0,0 +1,152 @@
+"""
+Bulk order import - check_credit logic (logic/logic_discovery/check_credit.py), in batches
+
+Loading orders through JSON:API costs 1 request (and 1 transaction) per row.
+Here, orders are added in batches of FLUSH_SIZE, with 1 flush per batch, in 1 transaction.
+Logic runs on each flush, as for any other update (safrs.DB.session) - so every rule applies,
+row by row (each Item adjusts its Order and Customer, and the credit limit is checked on each adjustment):
+
+    Item.unit_price         from the Product, or the chosen supplier (SysSupplierReq)
+    Item.amount             quantity * unit_price
+    Order.amount_total      sum of its Items' amount
+    Customer.balance        sum of its unshipped Orders' amount_total
+    constraint              balance <= credit_limit
+    events                  eg, shipped Orders are sent to Kafka (logic/logic_discovery/app_integration.py)
+
+The saving is per-request and per-transaction overhead; this is not a set-oriented (1 update per Customer) load.
+Customers and Products are read once, up front (1 query each), so rules find them in the session.
+With config.py AI_SUPPLIER_SELECTION = "batch", suppliers for each flush are chosen with 1 AI request.
+Any failure (eg, constraint) rejects the whole import - nothing is saved.
+
+Orders are dicts:  {"customer_id": 1, "notes": "..", "date_shipped": None, "items": [{"product_id": 5, "quantity": 2}]}
+
+Entry points:
+
+    API:  POST /bulk_order_import  {"orders": [...]}          (api/api_discovery/bulk_order_import.py)
+    CLI:  python logic/system/bulk_order_import.py orders.json   (from the project directory)
+
+You do not normally need to alter this file
+"""
+import datetime
+import logging
+from typing import Callable, Optional
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 100
+""" orders per flush (logic runs on each flush) """
+
+
+class BulkImportError(Exception):
+    """ the batch was rejected (nothing was saved) - errors lists each problem """
+
+    def __init__(self, errors: list[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def import_orders(session: Session, orders: list[dict], log: Optional[Callable[[str], None]] = None) -> dict:
+    """ Insert orders (with items), with logic, flushing FLUSH_SIZE orders at a time, in 1 transaction
+
+    Args:
+        session (Session): logic-enabled session (eg, safrs.DB.session)
+        orders (list[dict]): orders to insert, each with customer_id, notes, date_shipped, items (product_id, quantity)
+        log (Callable, optional): progress messages (default: debug log)
+
+    Raises:
+        BulkImportError: invalid keys or quantities, or logic failures (eg, balance exceeds credit limit)
+
+    Returns:
+        dict: {"orders": count, "items": count, "order_ids": [...], "customers": {customer_id: balance}}
+    """
+    from database import models
+    log = log or logger.debug
+
+    customer_ids = {each_order.get("customer_id") for each_order in orders}
+    product_ids = {each_item.get("product_id") for each_order in orders for each_item in each_order.get("items", [])}
+    customers = {each.id: each for each in session.query(models.Customer).filter(models.Customer.id.in_(customer_ids))}
+    products = {each.id: each for each in session.query(models.Product).filter(models.Product.id.in_(product_ids))}
+    errors = _validate(orders, customers, products)
+    if errors:
+        raise BulkImportError(errors)
+
+    new_orders = []
+    try:
+        for batch_start in range(0, len(orders), FLUSH_SIZE):
+            for each_order in orders[batch_start:batch_start + FLUSH_SIZE]:
+                order = models.Order(customer_id=each_order["customer_id"], notes=each_order.get("notes"),
+                                     date_shipped=_as_date(each_order.get("date_shipped")))
+                for each_item in each_order.get("items", []):
+                    order.ItemList.append(models.Item(product_id=each_item["product_id"], quantity=each_item["quantity"]))
+                session.add(order)
+                new_orders.append(order)
+            session.flush()  # logic for this batch
+            log(f"Bulk order import: {len(new_orders)} of {len(orders)} orders flushed")
+        session.commit()
+    except Exception as ex:
+        session.rollback()
+        raise BulkImportError([f"{ex.message if hasattr(ex, 'message') else ex}"]) from ex
+    item_count = sum(len(each_order.ItemList) for each_order in new_orders)
+    balances = {each_id: float(customers[each_id].balance or 0) for each_id in customer_ids}
+    log(f"Bulk order import: {len(new_orders)} orders, {item_count} items, {len(balances)} customers")
+    return {"orders": len(new_orders), "items": item_count,
+            "order_ids": [each_order.id for each_order in new_orders],
+            "customers": balances}
+
+
+def _validate(orders: list[dict], customers: dict, products: dict) -> list[str]:
+    errors = []
+    for order_number, each_order in enumerate(orders):
+        if each_order.get("customer_id") not in customers:
+            errors.append(f"order {order_number}: customer {each_order.get('customer_id')} not found")
+        for each_item in each_order.get("items", []):
+            if each_item.get("product_id") not in products:
+                errors.append(f"order {order_number}: product {each_item.get('product_id')} not found")
+            quantity = each_item.get("quantity")
+            if not isinstance(quantity, int) or isinstance(quantity, bool):  # bool is an int subclass
+                errors.append(f"order {order_number}: product {each_item.get('product_id')} quantity is required (integer)")
+    return errors
+
+
+def _as_date(value) -> Optional[datetime.date]:
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+def main():
+    """ python logic/system/bulk_order_import.py orders.json - file contains a list of orders, or {"orders": [...]} """
+    import json
+    import sys
+    from pathlib import Path
+    project_dir = Path(__file__).parent.parent.parent
+    sys.path.extend([str(project_dir), '.'])
+    from flask import Flask
+    from config import server_setup
+    import config.config as config
+    import safrs
+
+    if len(sys.argv) < 2:
+        print("usage: python logic/system/bulk_order_import.py orders.json")
+        sys.exit(1)
+    payload = json.loads(Path(sys.argv[1]).read_text())
+    orders = payload["orders"] if isinstance(payload, dict) else payload
+
+    server_setup.logging_setup()
+    flask_app = Flask("API Logic Server", template_folder='ui/templates')
+    flask_app.config.from_object(config.Config)
+    flask_app.config.from_prefixed_env(prefix="APILOGICPROJECT")
+    args = server_setup.get_args(flask_app)
+    server_setup.api_logic_server_setup(flask_app, args)
+    with flask_app.app_context():
+        try:
+            result = import_orders(safrs.DB.session, orders, log=print)
+        except BulkImportError as e:
+            print("Bulk order import rejected:\n  " + "\n  ".join(e.errors))
+            sys.exit(1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Compact, bounded storage for SysSupplierReq audit rows - used by logic/logic_discovery/check_credit.py
+
+Compaction:
+
+    prompts         each distinct AI request is stored once, zlib compressed, in sys_supplier_prompt
+                    (keyed by sha256) - SysSupplierReq.prompt_hash references it
+    top_n           only the best AI_AUDIT_TOP_N ranked candidates are kept
+
+Retention job (run daily, eg, from cron), from the project directory:
+
+    python logic/system/supplier_audit.py                    # AI_AUDIT_RETENTION_DAYS, AI_AUDIT_ARCHIVE_DIR
+    python logic/system/supplier_audit.py --days 30 --archive-dir database/archive
+    python logic/system/supplier_audit.py --compact          # also move legacy request strings to prompts
+
+Rows older than the retention period are (optionally) archived to gzipped json lines,
+1 file per day of created_on, then deleted - with prompts no longer referenced.
+Audit queries by item / product use the item_id / product_id indexes; created_on is indexed for retention.
+
+You do not normally need to alter this file
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import sys
+import zlib
+from pathlib import Path
+from typing import Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+if __name__ == "__main__":
+    sys.path.extend([str(Path(__file__).parent.parent.parent), '.'])
+
+from config.config import Config  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+""" rows per delete / update statement """
+
+
+def prompt_hash(request: str) -> str:
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+def store_prompt(session: Session, request: str) -> str:
+    """ Store request once (compressed), returning its hash (for SysSupplierReq.prompt_hash)
+
+    Safe for concurrent writers: duplicates are ignored by the database (insert .. on conflict do nothing),
+    so it can run inside the logic flush (no ORM objects are added).
+
+    Args:
+        session (Session): current session
+        request (str): AI request (json)
+
+    Returns:
+        str: prompt hash
+    """
+    from database import models
+    the_hash = prompt_hash(request)
+    values = {"prompt_hash": the_hash,
+              "payload": zlib.compress(request.encode("utf-8"), 9),
+              "created_on": datetime.datetime.utcnow()}
+    dialect = session.get_bind().dialect.name
+    table = models.SysSupplierPrompt.__table__
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        session.execute(dialect_insert(table).values(**values).on_conflict_do_nothing())
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        session.execute(dialect_insert(table).values(**values).on_conflict_do_nothing())
+    elif dialect in ["mysql", "mariadb"]:
+        session.execute(insert(table).values(**values).prefix_with("IGNORE"))
+    elif session.query(models.SysSupplierPrompt.prompt_hash).filter_by(prompt_hash=the_hash).first() is None:
+        session.execute(insert(table).values(**values))
+    return the_hash
+
+
+def compact_top_n(ranked: list[dict]) -> list[dict]:
+    """ best AI_AUDIT_TOP_N ranked candidates """
+    top_n = int(Config.AI_AUDIT_TOP_N)
+    return ranked[:top_n] if top_n > 0 else ranked
+
+
+def compact(session: Session) -> int:
+    """ move legacy SysSupplierReq.request strings to sys_supplier_prompt; returns rows compacted """
+    from database import models
+    req = models.SysSupplierReq
+    compacted = 0
+    while True:
+        rows = session.query(req.id, req.request).filter(req.request.isnot(None), req.prompt_hash.is_(None)) \
+            .order_by(req.id).limit(CHUNK_SIZE).all()
+        if len(rows) == 0:
+            break
+        for each_id, each_request in rows:
+            the_hash = store_prompt(session, each_request)
+            session.query(req).filter(req.id == each_id) \
+                .update({req.prompt_hash: the_hash, req.request: None}, synchronize_session=False)
+        session.commit()
+        compacted += len(rows)
+    return compacted
+
+
+def purge(session: Session, days: int, archive_dir: Optional[str] = None) -> dict:
+    """ archive (optional) and delete SysSupplierReq rows created more than days ago, and unreferenced prompts
+
+    Args:
+        session (Session): session (not logic-enabled - these are audit rows)
+        days (int): retention period
+        archive_dir (str, optional): directory for sys_supplier_req_<yyyy-mm-dd>.jsonl.gz files
+
+    Returns:
+        dict: {"archived", "deleted", "prompts_deleted"}
+    """
+    from database import models
+    req = models.SysSupplierReq
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    archived = deleted = 0
+    while True:
+        rows = session.query(req).filter(req.created_on < cutoff).order_by(req.id).limit(CHUNK_SIZE).all()
+        if len(rows) == 0:
+            break
+        if archive_dir:
+            archived += _archive(rows, Path(archive_dir))
+        ids = [each.id for each in rows]
+        session.query(req).filter(req.id.in_(ids)).delete(synchronize_session=False)
+        session.commit()
+        session.expunge_all()
+        deleted += len(ids)
+    prompt = models.SysSupplierPrompt
+    referenced = session.query(req.prompt_hash).filter(req.prompt_hash.isnot(None))
+    prompts_deleted = session.query(prompt).filter(prompt.created_on < cutoff, prompt.prompt_hash.notin_(referenced)) \
+        .delete(synchronize_session=False)
+    session.commit()
+    return {"archived": archived, "deleted": deleted, "prompts_deleted": prompts_deleted}
+
+
+def _archive(rows: list, archive_dir: Path) -> int:
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    by_day: dict = {}
+    for each_row in rows:
+        by_day.setdefault(each_row.created_on.date().isoformat(), []).append(
+            {"id": each_row.id, "item_id": each_row.item_id, "product_id": each_row.product_id,
+             "chosen_supplier_id": each_row.chosen_supplier_id, "reason": each_row.reason,
+             "top_n": each_row.top_n, "from_cache": each_row.from_cache, "status": each_row.status,
+             "request": each_row.prompt, "created_on": each_row.created_on.isoformat()})
+    for each_day, each_rows in by_day.items():
+        with gzip.open(archive_dir.joinpath(f"sys_supplier_req_{each_day}.jsonl.gz"), "at", encoding="utf-8") as archive:
+            for each in each_rows:
+                archive.write(json.dumps(each, default=str) + "\n")
+    return len(rows)
+
+
+def main():
+    import argparse
+    import os
+    os.environ["APILOGICPROJECT_NO_FLASK"] = "1"  # models without Flask (and no logic: audit rows only)
+    from sqlalchemy import create_engine
+    parser = argparse.ArgumentParser(description="SysSupplierReq retention: archive and delete old audit rows")
+    parser.add_argument("--days", type=int, default=int(Config.AI_AUDIT_RETENTION_DAYS), help="retention period (0: keep all)")
+    parser.add_argument("--archive-dir", default=Config.AI_AUDIT_ARCHIVE_DIR, help="archive before delete (default: none)")
+    parser.add_argument("--compact", action="store_true", help="move legacy request strings to compressed prompts")
+    parser.add_argument("--db-url", default=Config.SQLALCHEMY_DATABASE_URI)
+    args = parser.parse_args()
+    with Session(create_engine(args.db_url)) as session:
+        if args.compact:
+            print(f"Compacted {compact(session)} SysSupplierReq rows")
+        if args.days > 0:
+            print(f"Retention ({args.days} days): {purge(session, args.days, args.archive_dir)}")
+
+
+if __name__ == "__main__":
+    main()
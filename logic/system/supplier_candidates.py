@@ -0,0 +1,47 @@
+"""
+Supplier candidates for a Product - used by logic/logic_discovery/check_credit.py
+
+1 pre-joined query (ProductSupplier + Supplier) per product, returning compact immutable
+records, rather than walking Product.ProductSupplierList and each ProductSupplier.supplier
+(1 lazy SELECT per supplier, plus the product).
+
+You do not normally need to alter this file
+"""
+from decimal import Decimal
+from typing import NamedTuple, Optional
+from sqlalchemy.orm import Session
+from database import models
+
+
+class SupplierCandidate(NamedTuple):
+    """ a ProductSupplier, with its Supplier's region """
+    supplier_id: int
+    unit_cost: Decimal
+    lead_time_days: Optional[int]
+    region: Optional[str]
+
+    def to_option(self) -> dict:
+        """ json-ready dict, as sent to AI """
+        return {'supplier_id': self.supplier_id, 'unit_cost': float(self.unit_cost),
+                'lead_time_days': self.lead_time_days, 'region': self.region}
+
+
+def get_supplier_candidates(session: Session, product_id: int) -> tuple[SupplierCandidate, ...]:
+    """ Return the product's supplier candidates (ProductSupplier order), with 1 query
+
+    Args:
+        session (Session): current session
+        product_id (int): product
+
+    Returns:
+        tuple[SupplierCandidate, ...]: candidates
+    """
+    rows = session.query(models.ProductSupplier.supplier_id,
+                         models.ProductSupplier.unit_cost,
+                         models.ProductSupplier.lead_time_days,
+                         models.Supplier.region) \
+        .outerjoin(models.Supplier, models.ProductSupplier.supplier_id == models.Supplier.id) \
+        .filter(models.ProductSupplier.product_id == product_id) \
+        .order_by(models.ProductSupplier.id) \
+        .all()
+    return tuple(SupplierCandidate(*each_row) for each_row in rows)
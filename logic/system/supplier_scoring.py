@@ -0,0 +1,85 @@
+"""
+Deterministic supplier pre-filter - used by logic/logic_discovery/check_credit.py
+
+Decides locally (no AI call) when there is no real trade-off:
+
+    single candidate        only 1 supplier
+    Pareto dominant         1 supplier is no worse on both unit_cost and lead_time_days,
+                            and better on at least one, than every other supplier
+                            (with world conditions, only if all candidates share 1 region -
+                            otherwise the AI weighs the regional risk)
+
+Otherwise, escalates to AI.  Candidates are also scored (weighted, normalized cost and
+lead time - lower is better), ranked for SysSupplierReq.top_n.
+
+Enabled by config.Config.AI_SUPPLIER_PREFILTER.
+
+You do not normally need to alter this file
+"""
+from typing import Optional
+
+SCORE_WEIGHTS = {"unit_cost": 0.5, "lead_time_days": 0.5}
+""" relative weight of each criterion in the score """
+
+
+def score(supplier_options: list[dict], weights: dict = SCORE_WEIGHTS) -> list[dict]:
+    """ Return supplier_options ranked by score (each, a copy with 'score' and 'pareto')
+
+    Args:
+        supplier_options (list[dict]): candidates, each with supplier_id, unit_cost, lead_time_days, region
+        weights (dict, optional): criterion -> weight
+
+    Returns:
+        list[dict]: ranked candidates, best first
+    """
+    if len(supplier_options) == 0:
+        return []
+    columns = {each_criterion: [float(each[each_criterion] or 0) for each in supplier_options] for each_criterion in weights}
+    normalized = {}
+    for each_criterion, values in columns.items():
+        low, high = min(values), max(values)
+        spread = (high - low) or 1.0
+        normalized[each_criterion] = [(each_value - low) / spread for each_value in values]
+    scores = [sum(weights[each_criterion] * normalized[each_criterion][i] for each_criterion in weights)
+              for i in range(len(supplier_options))]
+    front = pareto_front(supplier_options)
+    ranked = [{**each, "score": round(scores[i], 4), "pareto": i in front} for i, each in enumerate(supplier_options)]
+    return sorted(ranked, key=lambda each: each["score"])
+
+
+def pareto_front(supplier_options: list[dict]) -> list[int]:
+    """ Return indexes of the candidates not dominated on (unit_cost, lead_time_days) """
+    points = [(float(each["unit_cost"] or 0), float(each["lead_time_days"] or 0)) for each in supplier_options]
+    front = []
+    for i, (cost, lead) in enumerate(points):
+        dominated = any(other_cost <= cost and other_lead <= lead and (other_cost < cost or other_lead < lead)
+                        for j, (other_cost, other_lead) in enumerate(points) if j != i)
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def prefilter(supplier_options: list[dict], world_conditions: str = "") -> Optional[dict]:
+    """ Return the decision when there is no real trade-off, else None (escalate to AI)
+
+    Args:
+        supplier_options (list[dict]): candidates, each with supplier_id, unit_cost, lead_time_days, region
+        world_conditions (str, optional): current world conditions
+
+    Returns:
+        dict: {"supplier_id", "reasoning"}, or None
+    """
+    if len(supplier_options) == 0:
+        return None
+    if len(supplier_options) == 1:
+        return {"supplier_id": supplier_options[0]["supplier_id"], "reasoning": "single candidate supplier"}
+    front = pareto_front(supplier_options)
+    if len(front) != 1:
+        return None  # real cost / lead time trade-off
+    regions = {each.get("region") for each in supplier_options}
+    if (world_conditions or "").strip() and len(regions) > 1:
+        return None  # regional risk - AI weighs world conditions
+    dominant = supplier_options[front[0]]
+    return {"supplier_id": dominant["supplier_id"],
+            "reasoning": f"supplier {dominant['supplier_id']} dominates on unit_cost ({dominant['unit_cost']}) "
+                         f"and lead_time_days ({dominant['lead_time_days']})"}
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""
+Replay historical AI supplier decisions (SysSupplierReq rows) - offline benchmark
+
+Re-sends each stored request (SysSupplierReq.request) to a model, and reports throughput,
+latency percentiles, and agreement with the historical choice (chosen_supplier_id).
+Use it to measure the AI path (logic/logic_discovery/check_credit.py) before changing it.
+
+Responses come from 1 of:
+
+    --stub                  in-process OpenAI-compatible stub server (no network, no key),
+                            choosing by --policy (cost | lead_time), after --stub-latency ms
+    --base-url URL          any OpenAI-compatible server (eg, a local stub), with --api-key
+    --responses FILE        a cached response set, recorded by a previous run with --record FILE
+    (default)               OpenAI, with APILOGICSERVER_CHATGPT_APIKEY
+
+Compare configurations with --model, and --system-prompt (replaces the stored system message).
+
+Examples (from the project directory):
+
+    python test/ai_supplier_replay/ai_supplier_replay.py --stub --policy cost --concurrency 4
+    python test/ai_supplier_replay/ai_supplier_replay.py --record /tmp/responses.json
+    python test/ai_supplier_replay/ai_supplier_replay.py --responses /tmp/responses.json --json
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+project_dir = Path(__file__).parent.parent.parent
+sys.path.extend([str(project_dir), '.'])
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from config.config import Config  # noqa: E402
+from logic.system.ai_guard import percentiles  # noqa: E402
+
+
+def load_requests(db_url: str, limit: Optional[int], since: Optional[str]) -> list[dict]:
+    """ SysSupplierReq rows decided by AI (request stored, or compressed in sys_supplier_prompt), oldest first """
+    sql = "select r.id, r.product_id, r.request, p.payload, r.chosen_supplier_id, r.from_cache, r.created_on " \
+          "from sys_supplier_req r left join sys_supplier_prompt p on p.prompt_hash = r.prompt_hash " \
+          "where (r.request is not null or p.payload is not null)"
+    params = {}
+    if since:
+        sql += " and r.created_on >= :since"
+        params["since"] = since
+    sql += " order by r.id"
+    if limit:
+        sql += " limit :limit"
+        params["limit"] = limit
+    engine = create_engine(db_url)
+    with engine.connect() as connection:
+        rows = [dict(each_row._mapping) for each_row in connection.execute(text(sql), params)]
+    for each_row in rows:
+        if each_row["request"] is None:
+            each_row["request"] = zlib.decompress(each_row["payload"]).decode("utf-8")
+    return rows
+
+
+def prepare_messages(request: str, system_prompt: Optional[str]) -> list[dict]:
+    messages = json.loads(request)
+    if system_prompt is not None:
+        messages = [{"role": "system", "content": system_prompt} if each["role"] == "system" else each
+                    for each in messages]
+    return messages
+
+
+def response_key(model: str, messages: list[dict]) -> str:
+    return hashlib.sha256(json.dumps({"model": model, "messages": messages}, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def chosen_supplier(response: dict, product_id: int) -> Optional[int]:
+    """ supplier_id from a single (ai_supplier) or batch (decisions) response """
+    if "decisions" in response:
+        for each_decision in response.get("decisions") or []:
+            if isinstance(each_decision, dict) and each_decision.get("product_id") == product_id:
+                return each_decision.get("supplier_id")
+        return None
+    return (response.get("ai_supplier") or {}).get("supplier_id")
+
+
+def stub_choice(messages: list[dict], policy: str) -> dict:
+    """ deterministic model: lowest unit_cost (or lead_time_days) supplier, for each product """
+    criterion = "lead_time_days" if policy == "lead_time" else "unit_cost"
+    for each_message in messages:
+        content = each_message.get("content", "")
+        if content.startswith("Products and supplier options:"):
+            products = json.loads(content.split(":", 1)[1])
+            return {"decisions": [{"product_id": each["product_id"],
+                                   "supplier_id": min(each["supplier_options"], key=lambda s: s[criterion])["supplier_id"],
+                                   "reasoning": f"stub: lowest {criterion}"} for each in products]}
+        if content.startswith("Supplier options:"):
+            options = json.loads(content.split(":", 1)[1])
+            return {"reasoning": f"stub: lowest {criterion}", "ai_supplier": min(options, key=lambda s: s[criterion])}
+    return {"reasoning": "stub: no supplier options"}
+
+
+def start_stub_server(policy: str, latency_ms: float) -> str:
+    """ start an OpenAI-compatible chat completions stub on a free port; returns its base url """
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency_ms / 1000)
+            content = json.dumps(stub_choice(body["messages"], policy))
+            response = {"id": "stub", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+            data = json.dumps(response).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def replay(args) -> dict:
+    rows = load_requests(args.db_url, args.limit, args.since)
+    cached_responses = json.loads(Path(args.responses).read_text()) if args.responses else None
+    recorded_responses = {}
+    client = None
+    if cached_responses is None:
+        from logic.system import ai_client
+        if args.stub:
+            Config.AI_CLIENT_BASE_URL = start_stub_server(args.policy, args.stub_latency)
+        elif args.base_url:
+            Config.AI_CLIENT_BASE_URL = args.base_url
+        client = ai_client.get_client("stub" if args.stub else args.api_key)
+        if client is None:
+            raise SystemExit("No API key - use --stub, --responses, --api-key, or set APILOGICSERVER_CHATGPT_APIKEY")
+
+    def replay_row(row: dict) -> dict:
+        messages = prepare_messages(row["request"], args.system_prompt)
+        key = response_key(args.model, messages)
+        start_time = time.perf_counter()
+        try:
+            if cached_responses is not None:
+                if key not in cached_responses:
+                    return {"id": row["id"], "error": "no cached response"}
+                response = cached_responses[key]
+            else:
+                completion = client.chat.completions.create(model=args.model, messages=messages,
+                                                            response_format={"type": "json_object"})
+                response = json.loads(completion.choices[0].message.content)
+                recorded_responses[key] = response
+        except Exception as e:
+            return {"id": row["id"], "error": f"{e.__class__.__name__}: {e}", "latency": time.perf_counter() - start_time}
+        supplier_id = chosen_supplier(response, row["product_id"])
+        return {"id": row["id"], "latency": time.perf_counter() - start_time, "supplier_id": supplier_id,
+                "agrees": supplier_id == row["chosen_supplier_id"]}
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(replay_row, rows))
+    elapsed = time.perf_counter() - start_time
+
+    if args.record:
+        Path(args.record).write_text(json.dumps(recorded_responses, indent=2))
+    decided = [each for each in results if "error" not in each]
+    agreed = [each for each in decided if each["agrees"]]
+    return {"source": "responses" if cached_responses is not None else Config.AI_CLIENT_BASE_URL or "openai",
+            "model": args.model,
+            "system_prompt": "replaced" if args.system_prompt is not None else "stored",
+            "requests": len(rows),
+            "errors": len(results) - len(decided),
+            "elapsed": round(elapsed, 3),
+            "throughput": round(len(rows) / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency": percentiles(sorted(each["latency"] for each in decided)),
+            "agreement": round(len(agreed) / len(decided), 4) if decided else 0.0,
+            "disagreements": [{"id": each["id"], "supplier_id": each["supplier_id"]} for each in decided if not each["agrees"]][:20]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay SysSupplierReq AI decisions, report throughput, latency, agreement")
+    parser.add_argument("--db-url", default=Config.SQLALCHEMY_DATABASE_URI, help="database (default: project database)")
+    parser.add_argument("--limit", type=int, help="replay at most this many requests")
+    parser.add_argument("--since", help="only requests created on / after (eg, 2025-01-31)")
+    parser.add_argument("--model", default="gpt-4o-2024-08-06", help="model to replay against")
+    parser.add_argument("--system-prompt", help="replaces the stored system message")
+    parser.add_argument("--stub", action="store_true", help="use in-process stub model")
+    parser.add_argument("--policy", default="cost", choices=["cost", "lead_time"], help="stub model choice")
+    parser.add_argument("--stub-latency", type=float, default=0, help="stub model latency (ms)")
+    parser.add_argument("--base-url", help="OpenAI-compatible server, eg, http://localhost:8765/v1")
+    parser.add_argument("--api-key", default=os.getenv("APILOGICSERVER_CHATGPT_APIKEY"))
+    parser.add_argument("--responses", help="replay from cached response set (json)")
+    parser.add_argument("--record", help="save responses as a cached response set (json)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print report as json")
+    args = parser.parse_args()
+
+    report = replay(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"\nAI supplier replay - {report['requests']} requests from {report['source']}, model {report['model']}, "
+          f"{report['system_prompt']} system prompt")
+    print(f"  throughput:  {report['throughput']} requests/s ({report['elapsed']}s, {report['errors']} errors)")
+    print(f"  latency (s): {report['latency']}")
+    print(f"  agreement:   {report['agreement']:.1%} with historical chosen_supplier_id")
+    for each in report["disagreements"]:
+        print(f"    SysSupplierReq {each['id']}: replay chose {each['supplier_id']}")
+
+
+if __name__ == "__main__":
+    main()
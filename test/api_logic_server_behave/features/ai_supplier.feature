@@ -0,0 +1,70 @@
+Feature: AI Supplier Selection
+
+  Scenario: Identical supplier requests are served from the AI decision cache
+    Given the AI service chooses the lowest cost supplier
+    When Order for Customer 4 is inserted with 1 of Product 5
+    And Order for Customer 4 is inserted with 1 of Product 5
+    Then the AI service received 1 request
+    And Item unit_price is 105, chosen by "AI (cached)"
+
+  Scenario: Batch selection chooses suppliers for a multi-item order with 1 AI request
+    Given AI supplier selection is batch, without decision cache
+    And the AI service chooses the lowest cost supplier
+    When Order for Customer 4 is inserted with 1 and 2 of Product 5
+    Then the AI service received 1 request
+    And Item unit_price is 105, chosen by "AI"
+
+  Scenario: Batch selection chooses suppliers only for Items with a new Product
+    When the quantity of Item 5 is altered
+    Then the batch chooses suppliers for no Products
+    When Item 1 is altered to Product 5
+    Then the batch chooses suppliers for Product 5
+
+  Scenario: Deferred selection prices provisionally, then re-prices the Item with logic
+    Given AI supplier selection is deferred
+    When Order for Customer 4 is inserted with 2 of Product 5
+    Then Item unit_price is 105, and Customer balance increased 210 (provisional)
+    When the AI supplier worker re-prices the Item
+    Then Item unit_price is 205, and Item amount, Order amount_total and Customer balance re-derive to 410
+
+  Scenario: Item unit_price is copied, so altering the quantity keeps it
+    Given the unit_price of Product 1 is changed without logic
+    When the quantity of Item 1 is altered, and flushed
+    Then Item 1 keeps its unit_price, and its amount re-derives
+
+  Scenario: Supplier requests reuse 1 pooled AI client
+    When the AI client is obtained for 2 supplier requests
+    Then both use the same client, with the configured timeout and retries
+
+  Scenario: Rules choose a dominant supplier without calling AI
+    Given the AI service chooses the lowest cost supplier
+    And the suppliers of Product 5 share 1 region
+    When Order for Customer 4 is inserted with 1 of Product 5
+    Then the AI service received 0 requests
+    And Item unit_price is 105, chosen by "Rule"
+
+  Scenario: Supplier candidates are fetched with 1 query
+    When the supplier candidates of Product 5 are fetched
+    Then 1 query returns suppliers 2 and 1, with unit_cost and region
+
+  Scenario: Failing AI calls open the circuit, and Items are priced by fallback
+    Given the AI service fails, and the circuit opens after 2 failures
+    When Order for Customer 4 is inserted with 1 of Product 5
+    And Order for Customer 4 is inserted with 1 of Product 5
+    And Order for Customer 4 is inserted with 1 of Product 5
+    Then the AI service received 2 requests
+    And Item unit_price is 205, chosen by "Fallback"
+
+  Scenario: Replaying AI decisions against a stub model reports agreement
+    Given the AI service chooses the lowest cost supplier
+    When Order for Customer 4 is inserted with 1 of Product 5
+    And AI decisions since the Order are replayed with the lowest cost stub model
+    Then the replay reports 1 request, with full agreement
+
+  Scenario: Identical AI requests are stored once, and top_n is bounded
+    Given AI supplier audit keeps the top 1 candidate, without decision cache
+    And the AI service chooses the lowest cost supplier
+    When Order for Customer 4 is inserted with 1 of Product 5
+    And Order for Customer 4 is inserted with 1 of Product 5
+    Then the AI service received 2 requests
+    And both SysSupplierReq rows share 1 stored prompt, with top_n of 1 candidate
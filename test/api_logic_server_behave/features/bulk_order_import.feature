@@ -0,0 +1,20 @@
+Feature: Bulk Order Import
+
+  Scenario: Bulk import applies the same logic as inserting each Order
+    Given Kafka messages are recorded
+    When orders for Customer 4 are bulk imported: 1 and 2 of Product 5, and 1 of Product 5 shipped
+    Then the shipped Order is sent to Kafka
+    And Order amount_totals and Customer balance match inserting the same orders with logic
+
+  Scenario: Bulk import exceeding the credit limit is rejected, and nothing is saved
+    When orders for Customer 4 are bulk imported: 10 of Product 5
+    Then the import is rejected with "Customer balance exceeds credit limit", and no Orders are saved
+
+  Scenario: Bulk import rejects a boolean quantity
+    When an order for Customer 4 with a quantity of true of Product 5 is bulk imported
+    Then the import is rejected with "quantity is required (integer)", and no Orders are saved
+
+  Scenario: Bulk import requires an access token when security is enabled
+    Given security is enabled
+    When orders for Customer 4 are bulk imported: 1 of Product 5
+    Then the import is refused (401), and no Orders are saved
@@ -0,0 +1,95 @@
+Feature: Custom Endpoint
+
+  Scenario: Nested rows are linked to their parents
+    When the Customer endpoint with orders, items and product is executed
+    Then each Customer has its Orders, each Order its Items, and each Item its Product
+
+  Scenario: Child rows are limited per parent, across chunks of parent keys
+    Given Order 1 has 12 more Items, and Order 2 has 2 more Items
+    And parent keys are fetched 1 per query
+    When the Order endpoint with items is executed
+    Then Order 1 has 10 Items, and Order 2 has 4 Items
+    And Item rows are limited per Order in SQL
+
+  Scenario: Compiled queries return the rows of per-level queries
+    Given Order 1 has 12 more Items, and Order 2 has 2 more Items
+    When the Customer endpoint is executed with per-level and with compiled queries
+    Then the per-level and compiled responses are the same
+
+  Scenario: Compiled queries apply grants to child rows
+    Given security is enabled
+    And the current user may read only the Orders of Customer 2
+    When the Customer endpoint is executed with per-level and with compiled queries
+    Then the per-level and compiled responses are the same
+    And only Customer 2 has Orders
+
+  Scenario: Updates read the row through the grants
+    Given Order 1 is read into the session
+    And security is enabled
+    And the current user may read only the Orders of Customer 2
+    When the notes of Order 1 are updated with the Order endpoint
+    Then the update is rejected, and Order 1 is unchanged
+
+  Scenario: Only fields and keys are selected
+    When the Order endpoint with items is executed
+    Then the Item query selects only its fields and keys
+
+  Scenario: get filters by attribute value
+    When Orders are read with get, using sysfilter "equal(customer_id:2)"
+    Then Orders 2 and 3 are returned
+
+  Scenario: get filter values are bound, not SQL
+    When Orders are read with get, using sysfilter "equal(customer_id:2 or 1=1)"
+    Then no Orders are returned
+
+  Scenario: get filter arguments are bound, not SQL
+    When Orders are read with get, using filter "customer_id=2"
+    Then Orders 2 and 3 are returned
+    When Orders are read with get, using filter "customer_id=2 or 1=1"
+    Then no Orders are returned
+    When Orders are read with get, using filter "1=1 or customer_id=2"
+    Then the get is rejected
+
+  Scenario: get rejects unknown filter attributes
+    When Orders are read with get, using sysfilter "equal(no_such_attribute:2)"
+    Then the get is rejected
+
+  Scenario: Streamed responses are the executed responses
+    When the Order endpoint with items is streamed, and executed
+    Then the streamed and executed responses are the same
+
+  Scenario: Streamed responses without children are the executed responses
+    When the Customer endpoint without children is streamed, and executed
+    Then the streamed and executed responses are the same
+
+  Scenario: Keyset pages return each row once, in sort order
+    When Items are read in keyset pages of 2, sorted by descending quantity
+    Then the pages return each Item once, by descending quantity and id
+
+  Scenario: Page limits are clamped to the page size
+    When Customers are read with a page size of 2, and page[limit] 100, 0 and -5
+    Then the pages have 2, 1 and 1 Customers
+
+  Scenario: Records are not counted unless requested
+    When the Customer endpoint without children is executed
+    Then the response has no totalQueryRecordsNumber, and no rows were counted
+
+  Scenario: Exact counts follow writes and rollbacks
+    When the Customer endpoint without children is executed with count=exact
+    Then totalQueryRecordsNumber is 4
+    When a Customer is inserted, and the Customer endpoint without children is executed with count=exact
+    Then totalQueryRecordsNumber is 5
+    When the transaction is rolled back, and the Customer endpoint without children is executed with count=exact
+    Then totalQueryRecordsNumber is 4
+
+  Scenario: Fields are returned under their aliases
+    When the Item endpoint with aliased, attribute and named fields is executed
+    Then Item rows have only the aliased, attribute and named fields
+
+  Scenario: Calling functions use dot notation on rows
+    When the Item endpoint with a calling function is executed
+    Then Item rows have the attributes set by the calling function
+
+  Scenario: Requests do not print
+    When the Customer endpoint is executed, read with get and streamed
+    Then nothing was printed
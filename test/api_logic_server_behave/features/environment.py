@@ -0,0 +1,71 @@
+"""
+Behave environment - the server runs in-process (Flask test client), on a copy of database/db.sqlite
+
+Run from test/api_logic_server_behave:
+
+    python behave_run.py
+    python behave_run.py features/custom_endpoint.feature
+
+Steps use:
+
+    context.client      Flask test client (eg, context.client.post("/ontimizeweb/services/rest/Order/search", json=..))
+    context.session     safrs.DB.session - logic and grants apply; rolled back after each scenario
+    context.undo        functions run after each scenario (eg, to delete committed rows, restore config)
+    context.statements  SQL statements executed (clear it, then count the queries of a step)
+    context.flask_app   the app
+"""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+project_dir = Path(__file__).parent.parent.parent.parent
+
+db_dir = tempfile.mkdtemp(prefix="behave_db_")
+shutil.copy(project_dir.joinpath("database", "db.sqlite"), db_dir)
+os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_dir}/db.sqlite"  # scenarios do not alter the project database
+sys.path.insert(0, str(project_dir))  # before steps are loaded (they import database.models)
+
+
+def before_all(context):
+    from flask import Flask
+    from config import server_setup
+    import config.config as config
+    server_setup.logging_setup()
+    flask_app = Flask("API Logic Server", template_folder='ui/templates')
+    flask_app.config.from_object(config.Config)
+    args = server_setup.get_args(flask_app)
+    server_setup.api_logic_server_setup(flask_app, args)
+    if "flask-jwt-extended" not in flask_app.extensions:  # scenarios may enable security (eg, tokens required)
+        from flask_jwt_extended import JWTManager
+        JWTManager(flask_app)
+    context.flask_app = flask_app
+    context.client = flask_app.test_client()
+    context.statements = []
+    import safrs
+    from sqlalchemy import event
+    with flask_app.app_context():
+        event.listen(safrs.DB.engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: context.statements.append(statement))
+
+
+def before_scenario(context, scenario):
+    import safrs
+    context.request_context = context.flask_app.test_request_context()
+    context.request_context.push()
+    context.session = safrs.DB.session
+    context.undo = []
+
+
+def after_scenario(context, scenario):
+    context.session.rollback()
+    for each_undo in reversed(context.undo):
+        each_undo()
+    context.session.rollback()
+    context.session.remove()
+    context.request_context.pop()
+
+
+def after_all(context):
+    shutil.rmtree(db_dir, ignore_errors=True)
@@ -0,0 +1,49 @@
+Feature: Ontimize services
+
+  Scenario: Searches return the client page, without counting rows
+    When Customers are searched with pageSize 2
+    Then 2 Customers are returned, and no rows were counted
+
+  Scenario: Searches count rows when the client asks
+    When Customers are searched with pageSize 2, and count "exact"
+    Then 2 Customers are returned, and totalQueryRecordsNumber is 4
+
+  Scenario: Resources are built once, with their columns and keys
+    When the Customer resource is looked up twice
+    Then the same Customer resource is returned, with its columns and primary key
+    And the Customer resource cannot be altered
+
+  Scenario: Resources are rebuilt when the models are reloaded
+    Given the Customer model class is reloaded
+    When the Customer resource is looked up twice
+    Then the Customer resource is for the reloaded class
+
+  Scenario: AMOUNT counts rows, even with an amount attribute
+    When Items are aggregated by order_id, with AMOUNT and SUM(amount)
+    Then each Order's Item count is AMOUNT, and their total amount is SUM(amount)
+
+  Scenario: Aggregates reject filters on unknown columns
+    When Items are aggregated by order_id, filtered by "1=1) or (1"
+    Then the aggregate is rejected
+
+  Scenario: Batch writes find rows by typed keys
+    When Customers "02" and 3 are updated in 1 batch, with credit_limit 5000
+    Then the batch is written, and Customers 2 and 3 have credit_limit 5000
+
+  Scenario: Batch writes reject keys that are not the key type
+    When Customers "x" and 3 are updated in 1 batch, with credit_limit 5000
+    Then the batch is rejected for Customer "x", and Customer 3 has credit_limit 1500
+
+  Scenario: Parsed filter args are copies
+    When a filter arg is parsed, altered, and parsed again
+    Then the second parse is not altered
+
+  Scenario: Filter clauses accept only attribute names
+    When a Customer filter clause is built for "NAME", and for "1=1 or name"
+    Then the clause compares the name attribute, and the other key is rejected
+
+  Scenario: Model reloads discard the parsed filter metadata
+    Given Customers are filtered by name
+    And the Customer model class is reloaded
+    When the Customer resource is looked up twice
+    Then the expression parser has no metadata for the replaced Customer class
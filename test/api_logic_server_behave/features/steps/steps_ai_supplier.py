@@ -0,0 +1,299 @@
+import argparse
+import importlib.util
+import json
+import os
+from types import SimpleNamespace
+from pathlib import Path
+from behave import given, when, then
+from config.config import Config
+from database import models
+from logic.system import ai_client, ai_decision_cache, ai_guard, ai_supplier_batch, ai_supplier_worker, supplier_candidates
+
+
+class StubAiClient():
+    """ OpenAI client stand-in - chooses the lowest cost supplier, and records the requests """
+
+    def __init__(self, fails: bool = False):
+        self.requests = []
+        self.fails = fails
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model: str, messages: list[dict], **kwargs):
+        self.requests.append(messages)
+        if self.fails:
+            raise ConnectionError("AI service unavailable")
+        options = messages[2]["content"].split(": ", 1)[1]
+        if messages[2]["content"].startswith("Products and supplier options"):  # batch
+            response = {"decisions": [{"product_id": each["product_id"], "reasoning": "lowest cost",
+                                       "supplier_id": self.lowest_cost(each["supplier_options"])}
+                                      for each in json.loads(options)]}
+        else:
+            response = {"reasoning": "lowest cost", "ai_supplier": {"supplier_id": self.lowest_cost(json.loads(options))}}
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(response)))])
+
+    @staticmethod
+    def lowest_cost(supplier_options: list[dict]) -> int:
+        return min(supplier_options, key=lambda each: float(each["unit_cost"]))["supplier_id"]
+
+
+def set_config(context, **settings):
+    """ alter Config for this scenario """
+    saved = {each_name: getattr(Config, each_name) for each_name in settings}
+    for each_name, each_value in settings.items():
+        setattr(Config, each_name, each_value)
+    context.undo.append(lambda: [setattr(Config, each_name, each_value) for each_name, each_value in saved.items()])
+
+
+def delete_order(context, order_id: int):
+    """ delete a committed order with logic (adjusts balance) """
+    session = context.session
+    order = session.get(models.Order, order_id)
+    if order is not None:
+        for each_item in order.ItemList:
+            for each_req in each_item.SysSupplierReqList:
+                session.delete(each_req)
+            session.delete(each_item)
+        session.delete(order)
+        session.commit()
+
+
+@given('AI supplier selection is batch, without decision cache')
+def step_impl(context):
+    set_config(context, AI_SUPPLIER_SELECTION="batch", AI_DECISION_CACHE="none")
+
+
+@given('AI supplier audit keeps the top {top_n:d} candidate, without decision cache')
+def step_impl(context, top_n):
+    set_config(context, AI_AUDIT_TOP_N=top_n, AI_DECISION_CACHE="none")
+
+
+@given('AI supplier selection is deferred')
+def step_impl(context):
+    set_config(context, AI_SUPPLIER_SELECTION="deferred")
+    saved_app = ai_supplier_worker.flask_app
+    ai_supplier_worker.flask_app = context.flask_app  # no worker pool - scenario calls reprice
+    context.undo.append(lambda: setattr(ai_supplier_worker, "flask_app", saved_app))
+
+
+@given('the AI service chooses the lowest cost supplier')
+def step_impl(context):
+    use_ai_service(context, StubAiClient())
+
+
+@given('the AI service fails, and the circuit opens after {failures:d} failures')
+def step_impl(context, failures):
+    set_config(context, AI_GUARD_FAILURES=failures)
+    ai_guard.guard = None  # new guard, per Config.AI_GUARD_*
+    context.undo.append(lambda: setattr(ai_guard, "guard", None))
+    use_ai_service(context, StubAiClient(fails=True))
+
+
+def use_ai_service(context, ai_service: StubAiClient):
+    """ ai_service replaces the OpenAI client for this scenario """
+    saved_api_key = os.environ.get("APILOGICSERVER_CHATGPT_APIKEY")
+    os.environ["APILOGICSERVER_CHATGPT_APIKEY"] = "behave"
+    context.ai_service = ai_service
+    ai_client.clients[("behave", Config.AI_CLIENT_BASE_URL)] = context.ai_service
+    ai_decision_cache.decision_cache = None  # new cache, per Config.AI_DECISION_CACHE
+
+    def restore():
+        ai_client.clients.pop(("behave", Config.AI_CLIENT_BASE_URL), None)
+        ai_decision_cache.decision_cache = None
+        if saved_api_key is None:
+            os.environ.pop("APILOGICSERVER_CHATGPT_APIKEY", None)
+        else:
+            os.environ["APILOGICSERVER_CHATGPT_APIKEY"] = saved_api_key
+    context.undo.append(restore)
+
+
+@when('Order for Customer {customer_id:d} is inserted with {quantities} of Product {product_id:d}')
+def step_impl(context, customer_id, quantities, product_id):
+    """ quantities: eg, 1, or 1 and 2 (1 Item each) """
+    session = context.session
+    context.balance_before = session.get(models.Customer, customer_id).balance
+    order = models.Order(customer_id=customer_id, notes="behave ai supplier")
+    for each_quantity in quantities.split(" and "):
+        order.ItemList.append(models.Item(product_id=product_id, quantity=int(each_quantity)))
+    session.add(order)
+    session.commit()
+    context.order_ids = getattr(context, "order_ids", []) + [order.id]
+    context.order_id = order.id
+    context.customer_id = customer_id
+    context.undo.append(lambda: delete_order(context, order.id))
+
+
+def read_order(context) -> tuple[models.Item, models.SysSupplierReq, models.Order, models.Customer]:
+    """ first Item of the last inserted Order, its SysSupplierReq, the Order and its Customer """
+    session = context.session
+    session.expire_all()
+    order = session.get(models.Order, context.order_id)
+    item = order.ItemList[0]
+    return item, item.SysSupplierReqList[0], order, session.get(models.Customer, context.customer_id)
+
+
+@then('the AI service received {count:d} request')
+@then('the AI service received {count:d} requests')
+def step_impl(context, count):
+    assert len(context.ai_service.requests) == count, f"AI service received {len(context.ai_service.requests)} requests"
+
+
+@then('Item unit_price is {unit_price:d}, chosen by "{path}"')
+def step_impl(context, unit_price, path):
+    item, sys_supplier_req, order, customer = read_order(context)
+    assert item.unit_price == unit_price, f"unit_price is {item.unit_price}"
+    assert sys_supplier_req.reason.startswith(f"{path}:"), f"reason is {sys_supplier_req.reason}"
+
+
+@then('Item unit_price is {unit_price:d}, and Customer balance increased {increase:d} (provisional)')
+def step_impl(context, unit_price, increase):
+    item, sys_supplier_req, order, customer = read_order(context)
+    assert sys_supplier_req.status == "provisional", f"status is {sys_supplier_req.status}"
+    assert item.unit_price == unit_price, f"unit_price is {item.unit_price}"
+    assert customer.balance == context.balance_before + increase, f"balance is {customer.balance}"
+
+
+@when('the AI supplier worker re-prices the Item')
+def step_impl(context):
+    item, sys_supplier_req, order, customer = read_order(context)
+    context.session.commit()  # end read transaction - the worker writes in its own session
+    ai_supplier_worker.reprice(sys_supplier_req.id)
+
+
+@then('Item unit_price is {unit_price:d}, and Item amount, Order amount_total and Customer balance re-derive to {amount:d}')
+def step_impl(context, unit_price, amount):
+    item, sys_supplier_req, order, customer = read_order(context)
+    assert sys_supplier_req.status == "chosen", f"status is {sys_supplier_req.status}: {sys_supplier_req.reason}"
+    assert item.unit_price == unit_price, f"unit_price is {item.unit_price}"
+    assert item.amount == amount, f"Item.amount is {item.amount}"
+    assert order.amount_total == amount, f"Order.amount_total is {order.amount_total}"
+    assert customer.balance == context.balance_before + amount, f"Customer.balance is {customer.balance}"
+
+
+@given('the unit_price of Product {product_id:d} is changed without logic')
+def step_impl(context, product_id):
+    product_table = models.Product.__table__
+    context.session.execute(product_table.update().where(product_table.c.id == product_id)
+                            .values(unit_price=product_table.c.unit_price + 1))  # rolled back after the scenario
+    context.session.expire_all()
+
+
+@when('the quantity of Item {item_id:d} is altered, and flushed')
+def step_impl(context, item_id):
+    item = context.session.get(models.Item, item_id)
+    context.unit_price_before = item.unit_price
+    item.quantity += 1
+    context.session.flush()  # logic
+
+
+@then('Item {item_id:d} keeps its unit_price, and its amount re-derives')
+def step_impl(context, item_id):
+    item = context.session.get(models.Item, item_id)
+    assert item.unit_price == context.unit_price_before, f"unit_price is {item.unit_price}, Product unit_price is {item.product.unit_price}"
+    assert item.amount == item.quantity * item.unit_price, f"amount is {item.amount}"
+
+
+@when('the quantity of Item {item_id:d} is altered')
+def step_impl(context, item_id):
+    context.session.get(models.Item, item_id).quantity += 1  # not flushed - rolled back after the scenario
+
+
+@when('Item {item_id:d} is altered to Product {product_id:d}')
+def step_impl(context, item_id, product_id):
+    context.session.get(models.Item, item_id).product_id = product_id
+
+
+@then('the batch chooses suppliers for no Products')
+def step_impl(context):
+    product_ids = ai_supplier_batch._pending_product_ids(context.session)
+    assert product_ids == [], f"batch Products are {product_ids}"
+
+
+@then('the batch chooses suppliers for Product {product_id:d}')
+def step_impl(context, product_id):
+    product_ids = ai_supplier_batch._pending_product_ids(context.session)
+    assert product_ids == [product_id], f"batch Products are {product_ids}"
+
+
+@when('the AI client is obtained for {count:d} supplier requests')
+def step_impl(context, count):
+    context.ai_clients = [ai_client.get_client("behave-pool") for _ in range(count)]
+
+    def close():
+        each_client = ai_client.clients.pop(("behave-pool", Config.AI_CLIENT_BASE_URL), None)
+        if each_client is not None:
+            each_client.close()
+    context.undo.append(close)
+
+
+@then('both use the same client, with the configured timeout and retries')
+def step_impl(context):
+    first_client = context.ai_clients[0]
+    assert all(each_client is first_client for each_client in context.ai_clients), "clients differ"
+    assert first_client.max_retries == Config.AI_CLIENT_MAX_RETRIES, f"max_retries is {first_client.max_retries}"
+    assert first_client.timeout.read == Config.AI_CLIENT_TIMEOUT, f"timeout is {first_client.timeout}"
+
+
+@given('the suppliers of Product {product_id:d} share 1 region')
+def step_impl(context, product_id):
+    session = context.session
+    suppliers = [each.supplier for each in session.get(models.Product, product_id).ProductSupplierList]
+    saved_regions = {each.id: each.region for each in suppliers}
+    for each_supplier in suppliers:
+        each_supplier.region = suppliers[0].region
+
+    def restore():
+        for each_id, each_region in saved_regions.items():
+            session.get(models.Supplier, each_id).region = each_region
+        session.commit()
+    context.undo.append(restore)
+
+
+@when('the supplier candidates of Product {product_id:d} are fetched')
+def step_impl(context, product_id):
+    context.session.get(models.Product, product_id)  # eg, Item.product, already loaded by logic
+    context.statements.clear()
+    context.candidates = supplier_candidates.get_supplier_candidates(context.session, product_id)
+
+
+@then('1 query returns suppliers 2 and 1, with unit_cost and region')
+def step_impl(context):
+    assert len(context.statements) == 1, f"{len(context.statements)} queries: {context.statements}"
+    assert [each.supplier_id for each in context.candidates] == [2, 1], f"candidates are {context.candidates}"
+    assert context.candidates[0].unit_cost == 205 and context.candidates[0].region == "New Jersey", \
+        f"candidate is {context.candidates[0]}"
+
+
+@when('AI decisions since the Order are replayed with the lowest cost stub model')
+def step_impl(context):
+    replay_path = Path(__file__).parent.parent.parent.parent.joinpath("ai_supplier_replay", "ai_supplier_replay.py")
+    spec = importlib.util.spec_from_file_location("ai_supplier_replay", replay_path)
+    ai_supplier_replay = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(ai_supplier_replay)
+    set_config(context, AI_CLIENT_BASE_URL=Config.AI_CLIENT_BASE_URL)  # replay sets the stub server url
+    since = context.session.get(models.Order, context.order_id).ItemList[0].SysSupplierReqList[0].created_on
+    context.session.commit()
+    args = argparse.Namespace(db_url=Config.SQLALCHEMY_DATABASE_URI, limit=None, since=str(since), model="gpt-4o-2024-08-06",
+                              system_prompt=None, stub=True, policy="cost", stub_latency=0, base_url=None, api_key=None,
+                              responses=None, record=None, concurrency=1)
+    context.replay_report = ai_supplier_replay.replay(args)
+    stub_client = ai_client.clients.pop(("stub", Config.AI_CLIENT_BASE_URL), None)
+    if stub_client is not None:
+        stub_client.close()
+
+
+@then('the replay reports {count:d} request, with full agreement')
+def step_impl(context, count):
+    report = context.replay_report
+    assert report["requests"] == count and report["errors"] == 0, f"replay report is {report}"
+    assert report["agreement"] == 1.0, f"replay disagrees: {report['disagreements']}"
+
+
+@then('both SysSupplierReq rows share 1 stored prompt, with top_n of {top_n:d} candidate')
+def step_impl(context, top_n):
+    session = context.session
+    sys_supplier_reqs = [session.get(models.Order, each_id).ItemList[0].SysSupplierReqList[0] for each_id in context.order_ids]
+    prompt_hashes = {each.prompt_hash for each in sys_supplier_reqs}
+    assert len(prompt_hashes) == 1 and None not in prompt_hashes, f"prompt hashes are {prompt_hashes}"
+    assert session.query(models.SysSupplierPrompt).filter_by(prompt_hash=prompt_hashes.pop()).count() == 1
+    assert all(each.request is None for each in sys_supplier_reqs), "request stored uncompressed"
+    assert all(len(each.top_n) == top_n for each in sys_supplier_reqs), f"top_n is {sys_supplier_reqs[0].top_n}"
@@ -0,0 +1,123 @@
+import datetime
+from types import SimpleNamespace
+from behave import given, when, then
+from config.config import Args
+from database import models
+import integration.kafka.kafka_producer as kafka_producer
+
+
+def as_orders(customer_id: int, order_specs: str) -> list[dict]:
+    """ eg, '1 and 2 of Product 5, and 1 of Product 5 shipped' -> 2 orders (import payload) """
+    orders = []
+    for each_spec in order_specs.split(", and "):
+        quantities, product = each_spec.split(" of Product ")
+        order = {"customer_id": customer_id, "notes": "behave bulk import", "items": []}
+        if product.endswith(" shipped"):
+            product = product[:-len(" shipped")]
+            order["date_shipped"] = datetime.date.today().isoformat()
+        for each_quantity in quantities.split(" and "):
+            order["items"].append({"product_id": int(product), "quantity": int(each_quantity)})
+        orders.append(order)
+    return orders
+
+
+def delete_orders(context, order_ids: list[int]):
+    """ delete committed orders with logic (adjusts balance) """
+    session = context.session
+    session.rollback()
+    for each_order in session.query(models.Order).filter(models.Order.id.in_(order_ids)):
+        for each_item in each_order.ItemList:
+            for each_req in each_item.SysSupplierReqList:
+                session.delete(each_req)
+            session.delete(each_item)
+        session.delete(each_order)
+    session.commit()
+
+
+def order_count(context) -> int:
+    context.session.rollback()
+    return context.session.query(models.Order).count()
+
+
+@given('Kafka messages are recorded')
+def step_impl(context):
+    context.kafka_messages = []
+    saved_producer = kafka_producer.producer
+    kafka_producer.producer = SimpleNamespace(produce=lambda **kwargs: context.kafka_messages.append(kwargs))
+    context.undo.append(lambda: setattr(kafka_producer, "producer", saved_producer))
+
+
+@given('security is enabled')
+def step_impl(context):
+    saved_security_enabled = Args.instance.security_enabled
+    Args.instance.security_enabled = True
+    context.undo.append(lambda: setattr(Args.instance, "security_enabled", saved_security_enabled))
+
+
+@when('orders for Customer {customer_id:d} are bulk imported: {order_specs}')
+def step_impl(context, customer_id, order_specs):
+    context.customer_id = customer_id
+    context.orders = as_orders(customer_id, order_specs)
+    context.balance_before = context.session.get(models.Customer, customer_id).balance
+    context.order_count_before = order_count(context)
+    context.response = context.client.post("/bulk_order_import", json={"orders": context.orders})
+    if context.response.status_code == 200:
+        order_ids = context.response.json["order_ids"]
+        context.undo.append(lambda: delete_orders(context, order_ids))
+
+
+@when('an order for Customer {customer_id:d} with a quantity of true of Product {product_id:d} is bulk imported')
+def step_impl(context, customer_id, product_id):
+    context.order_count_before = order_count(context)
+    context.response = context.client.post("/bulk_order_import", json={"orders": [
+        {"customer_id": customer_id, "items": [{"product_id": product_id, "quantity": True}]}]})
+
+
+@then('Order amount_totals and Customer balance match inserting the same orders with logic')
+def step_impl(context):
+    assert context.response.status_code == 200, f"import failed: {context.response.json}"
+    session = context.session
+    session.rollback()
+    imported_orders = [session.get(models.Order, each_id) for each_id in context.response.json["order_ids"]]
+    imported_totals = [each_order.amount_total for each_order in imported_orders]
+    imported_balance = session.get(models.Customer, context.customer_id).balance
+    assert imported_balance == context.response.json["customers"][str(context.customer_id)], "balance in response"
+    delete_orders(context, context.response.json["order_ids"])
+
+    inserted_orders = []
+    for each_order in context.orders:  # as JSON:API would (1 Order at a time)
+        order = models.Order(customer_id=each_order["customer_id"], notes=each_order["notes"],
+                             date_shipped=datetime.date.fromisoformat(each_order["date_shipped"]) if "date_shipped" in each_order else None)
+        for each_item in each_order["items"]:
+            order.ItemList.append(models.Item(**each_item))
+        session.add(order)
+        session.commit()
+        inserted_orders.append(order)
+    inserted_order_ids = [each_order.id for each_order in inserted_orders]
+    context.undo.append(lambda: delete_orders(context, inserted_order_ids))
+    inserted_totals = [each_order.amount_total for each_order in inserted_orders]
+    inserted_balance = session.get(models.Customer, context.customer_id).balance
+    assert imported_totals == inserted_totals, f"imported {imported_totals}, inserted {inserted_totals}"
+    assert imported_balance == inserted_balance, f"imported balance {imported_balance}, inserted {inserted_balance}"
+    assert imported_balance == context.balance_before + imported_totals[0], "shipped orders are not in balance"
+
+
+@then('the shipped Order is sent to Kafka')
+def step_impl(context):
+    assert context.response.status_code == 200, f"import failed: {context.response.json}"
+    shipped_order_id = context.response.json["order_ids"][-1]
+    sent_order_ids = {each["key"]["id"] for each in context.kafka_messages if each["topic"] == "order_shipping"}
+    assert sent_order_ids == {shipped_order_id}, f"Kafka messages: {context.kafka_messages}"
+
+
+@then('the import is rejected with "{error}", and no Orders are saved')
+def step_impl(context, error):
+    assert context.response.status_code == 400, f"status is {context.response.status_code}"
+    assert any(error in each for each in context.response.json["errors"]), f"errors are {context.response.json['errors']}"
+    assert order_count(context) == context.order_count_before, "orders saved"
+
+
+@then('the import is refused ({status_code:d}), and no Orders are saved')
+def step_impl(context, status_code):
+    assert context.response.status_code == status_code, f"status is {context.response.status_code}: {context.response.json}"
+    assert order_count(context) == context.order_count_before, "orders saved"
@@ -0,0 +1,368 @@
+import contextlib
+import io
+import json
+import re
+from decimal import Decimal
+from types import SimpleNamespace
+from urllib.parse import urlencode
+from behave import given, when, then
+from sqlalchemy import insert, select
+from database import models
+
+
+def customer_endpoint(**root_args):
+    """ Customer, with orders, their items, and each item's product (isParent) """
+    from api.system.custom_endpoint import CustomEndpoint  # after server setup (uses safrs.DB)
+    return CustomEndpoint(model_class=models.Customer, alias="Customer", **root_args
+        , fields=[(models.Customer.id, "id"), (models.Customer.name, "Name"), (models.Customer.balance, "Balance")]
+        , children=CustomEndpoint(model_class=models.Order, alias="orders"
+            , join_on=models.Order.customer_id
+            , fields=[(models.Order.id, "id"), (models.Order.amount_total, "Total")]
+            , children=CustomEndpoint(model_class=models.Item, alias="items"
+                , join_on=models.Item.order_id
+                , fields=[(models.Item.id, "id"), (models.Item.quantity, "Quantity"), (models.Item.amount, "Amount")]
+                , children=CustomEndpoint(model_class=models.Product, alias="product"
+                    , join_on=models.Item.product_id
+                    , fields=[(models.Product.id, "id"), (models.Product.name, "Product")]
+                    , isParent=True))))
+
+
+def order_endpoint(**root_args):
+    """ Order, with its items """
+    from api.system.custom_endpoint import CustomEndpoint
+    return CustomEndpoint(model_class=models.Order, alias="Order", **root_args
+        , fields=[(models.Order.id, "id")]
+        , children=CustomEndpoint(model_class=models.Item, alias="items"
+            , join_on=models.Item.order_id
+            , fields=[(models.Item.id, "id"), (models.Item.quantity, "Quantity")]))
+
+
+def customer_only_endpoint(**root_args):
+    """ Customer, without children (streamed rows are read in batches) """
+    from api.system.custom_endpoint import CustomEndpoint
+    return CustomEndpoint(model_class=models.Customer, alias="Customer", **root_args
+        , fields=[(models.Customer.id, "id"), (models.Customer.name, "Name"), (models.Customer.balance, "Balance")])
+
+
+def stream(context, endpoint, query_string: str = "") -> dict:
+    """ endpoint.stream for a GET request - returns the streamed response (dict) """
+    with context.flask_app.test_request_context(f"/behave?{query_string}", method="GET"):
+        from flask import request
+        response = endpoint.stream(request)
+        return json.loads(response.get_data())
+
+
+def execute(context, endpoint, query_string: str = "", payload: dict = None) -> dict:
+    """ endpoint.execute for a GET request with query_string / payload - returns the response (dict) """
+    with context.flask_app.test_request_context(f"/behave?{query_string}", method="GET",
+                                                data=json.dumps(payload) if payload is not None else None):
+        from flask import request
+        response = endpoint.execute(request)
+    assert isinstance(response, bytes), f"execute failed: {response}"
+    return json.loads(response)
+
+
+def expected_customers(context) -> list[dict]:
+    """ the Customer tree, read through the relationships """
+    session = context.session
+    return [{"id": each_customer.id,
+             "orders": [{"id": each_order.id,
+                         "items": [{"id": each_item.id, "product": [each_item.product.id]}
+                                   for each_item in each_order.ItemList]}
+                        for each_order in each_customer.OrderList]}
+            for each_customer in session.query(models.Customer).order_by(models.Customer.id)]
+
+
+def linked_customers(response: dict) -> list[dict]:
+    """ the Customer tree of a response, as expected_customers (ids only) """
+    return [{"id": each_customer["id"],
+             "orders": [{"id": each_order["id"],
+                         "items": [{"id": each_item["id"], "product": [each_product["id"] for each_product in each_item["product"]]}
+                                   for each_item in each_order["items"]]}
+                        for each_order in each_customer["orders"]]}
+            for each_customer in sorted(response["Customer"], key=lambda each: each["id"])]
+
+
+@when('the Customer endpoint with orders, items and product is executed')
+def step_impl(context):
+    context.response = execute(context, customer_endpoint(), "page[limit]=100")
+
+
+@then('each Customer has its Orders, each Order its Items, and each Item its Product')
+def step_impl(context):
+    expected, actual = expected_customers(context), linked_customers(context.response)
+    assert actual == expected, f"linked rows are {actual}, expected {expected}"
+
+
+@given('Order 1 has 12 more Items, and Order 2 has 2 more Items')
+def step_impl(context):
+    """ core inserts (no logic) - rolled back after the scenario """
+    items = [{"order_id": 1, "product_id": 1, "quantity": 1}] * 12 + [{"order_id": 2, "product_id": 1, "quantity": 1}] * 2
+    context.session.execute(insert(models.Item.__table__), items)
+
+
+@given('parent keys are fetched 1 per query')
+def step_impl(context):
+    from api.system import custom_endpoint
+    chunk_sizes = dict(custom_endpoint.IN_LIST_CHUNK_SIZE)
+    custom_endpoint.IN_LIST_CHUNK_SIZE["sqlite"] = 1
+    context.undo.append(lambda: custom_endpoint.IN_LIST_CHUNK_SIZE.update(chunk_sizes))
+
+
+@when('the Order endpoint with items is executed')
+def step_impl(context):
+    context.statements.clear()
+    context.response = execute(context, order_endpoint(), "page[limit]=100")
+
+
+@then('Order 1 has 10 Items, and Order 2 has 4 Items')
+def step_impl(context):
+    item_counts = {each_order["id"]: len(each_order["items"]) for each_order in context.response["Order"]}
+    assert item_counts[1] == 10 and item_counts[2] == 4, f"Items per Order are {item_counts}"
+
+
+@then('Item rows are limited per Order in SQL')
+def step_impl(context):
+    item_statements = [each for each in context.statements if "FROM item" in each]
+    assert len(item_statements) > 1, f"Item statements are {item_statements}"
+    for each_statement in item_statements:
+        assert "row_number() OVER (PARTITION BY item.order_id" in each_statement, f"unbounded Item statement {each_statement}"
+
+
+@given('the current user may read only the Orders of Customer 2')
+def step_impl(context):
+    from security.system import authorization
+    from security.system.authorization import DefaultRolePermission, Grant
+    saved_user = authorization.current_user
+    authorization.current_user = SimpleNamespace(id="behave", UserRoleList=[SimpleNamespace(role_name="behave")])
+    DefaultRolePermission(to_role="behave", can_read=True, can_insert=False, can_update=False, can_delete=False)
+    Grant(on_entity=models.Order, to_role="behave", filter=lambda: models.Order.customer_id == 2)
+
+    def undo():
+        authorization.current_user = saved_user
+        DefaultRolePermission.grants_by_role.pop("behave")
+        Grant.grants_by_table["Order"] = [each_grant for each_grant in Grant.grants_by_table["Order"] if each_grant.role_name != "behave"]
+    context.undo.append(undo)
+
+
+@when('the Customer endpoint is executed with per-level and with compiled queries')
+def step_impl(context):
+    context.response = execute(context, customer_endpoint(), "page[limit]=100")
+    context.compiled_response = execute(context, customer_endpoint(compiled_query=True), "page[limit]=100")
+
+
+@then('the per-level and compiled responses are the same')
+def step_impl(context):
+    per_level, compiled = linked_customers(context.response), linked_customers(context.compiled_response)
+    assert compiled == per_level, f"compiled rows are {compiled}, per-level {per_level}"
+
+
+@then('only Customer 2 has Orders')
+def step_impl(context):
+    customers_with_orders = [each_customer["id"] for each_customer in context.compiled_response["Customer"] if each_customer["orders"]]
+    assert customers_with_orders == [2], f"Customers with Orders are {customers_with_orders}"
+
+
+@then('the Item query selects only its fields and keys')
+def step_impl(context):
+    item_selects = [each for each in context.statements if "FROM item" in each]
+    assert item_selects, f"no Item query in {context.statements}"
+    for each_select in item_selects:
+        columns = set(re.findall(r"item\.(\w+) AS", each_select))
+        assert columns == {"id", "order_id", "product_id", "quantity"}, f"Item query selects {columns}"
+
+
+@when('Orders are read with get, using {arg_name} "{arg_value}"')
+def step_impl(context, arg_name, arg_value):
+    from safrs.errors import ValidationError
+    with context.flask_app.test_request_context("/behave", query_string={arg_name: arg_value}, method="GET"):
+        from flask import request
+        try:
+            context.response = json.loads(order_endpoint().get(request, include=""))
+            context.error = None
+        except ValidationError as ex:
+            context.error = ex
+
+
+@given('Order {order_id:d} is read into the session')
+def step_impl(context, order_id):
+    context.notes_before = context.session.get(models.Order, order_id).notes  # in the identity map, before grants
+
+
+@when('the notes of Order {order_id:d} are updated with the Order endpoint')
+def step_impl(context, order_id):
+    from safrs.errors import ValidationError
+    payload = {"id": order_id, "notes": "behave update"}
+    with context.flask_app.test_request_context("/behave", method="PATCH", data=json.dumps(payload)):
+        from flask import request
+        try:
+            context.response = order_endpoint().execute(request)
+            context.error = None
+        except ValidationError as ex:
+            context.error = ex
+
+
+@then('the update is rejected, and Order {order_id:d} is unchanged')
+def step_impl(context, order_id):
+    assert context.error is not None, f"update returned {context.response}"
+    order_table = models.Order.__table__  # core select - not filtered by the grant
+    notes = context.session.execute(select(order_table.c.notes).where(order_table.c.id == order_id)).scalar()
+    assert notes == context.notes_before, f"Order {order_id} notes are {notes}"
+
+
+@then('Orders 2 and 3 are returned')
+def step_impl(context):
+    assert context.error is None, f"get failed: {context.error}"
+    order_ids = [each_order["id"] for each_order in context.response["Order"]]
+    assert order_ids == [2, 3], f"Orders returned: {order_ids}"
+
+
+@then('no Orders are returned')
+def step_impl(context):
+    assert context.error is None, f"get failed: {context.error}"
+    assert context.response["Order"] == [], f"Orders returned: {context.response['Order']}"
+
+
+@then('the get is rejected')
+def step_impl(context):
+    assert context.error is not None, f"get returned {context.response}"
+
+
+@when('the {endpoint_name} endpoint {description} is streamed, and executed')
+def step_impl(context, endpoint_name, description):
+    new_endpoint = order_endpoint if endpoint_name == "Order" else customer_only_endpoint
+    context.streamed_response = stream(context, new_endpoint(), "page[limit]=100")
+    context.response = execute(context, new_endpoint(), "page[limit]=100")
+
+
+@then('the streamed and executed responses are the same')
+def step_impl(context):
+    assert context.streamed_response == context.response, \
+        f"streamed {context.streamed_response}, executed {context.response}"
+
+
+@when('Items are read in keyset pages of 2, sorted by descending quantity')
+def step_impl(context):
+    from api.system.custom_endpoint import CustomEndpoint
+    context.pages = []
+    token = ""
+    while token is not None and len(context.pages) < 10:
+        item_endpoint = CustomEndpoint(model_class=models.Item, alias="Item", pagesize=2
+            , fields=[(models.Item.id, "id"), (models.Item.quantity, "Quantity")])
+        response = execute(context, item_endpoint, urlencode({"sort": "-quantity", "page[limit]": 2, "continuationToken": token}))
+        context.pages.append(response["Item"])
+        token = response["continuationToken"]
+
+
+@then('the pages return each Item once, by descending quantity and id')
+def step_impl(context):
+    items = context.session.query(models.Item).all()
+    expected = [each_item.id for each_item in sorted(items, key=lambda each: (each.quantity, each.id), reverse=True)]
+    actual = [each_item["id"] for each_page in context.pages for each_item in each_page]
+    assert actual == expected, f"keyset pages returned {actual}, expected {expected}"
+    assert all(len(each_page) <= 2 for each_page in context.pages), f"pages are {context.pages}"
+
+
+@when('Customers are read with a page size of {pagesize:d}, and page[limit] {limits}')
+def step_impl(context, pagesize, limits):
+    context.pages = [execute(context, customer_only_endpoint(pagesize=pagesize), f"page[limit]={each_limit}")
+                     for each_limit in limits.replace(" and ", ", ").split(", ")]
+
+
+@then('the pages have {counts} Customers')
+def step_impl(context, counts):
+    expected = [int(each) for each in counts.replace(" and ", ", ").split(", ")]
+    actual = [len(each_page["Customer"]) for each_page in context.pages]
+    assert actual == expected, f"pages have {actual} Customers"
+
+
+@when('the Customer endpoint without children is executed')
+def step_impl(context):
+    context.statements.clear()
+    context.response = execute(context, customer_only_endpoint(), "page[limit]=100")
+
+
+@then('the response has no totalQueryRecordsNumber, and no rows were counted')
+def step_impl(context):
+    assert "totalQueryRecordsNumber" not in context.response, f"response is {context.response}"
+    counts = [each for each in context.statements if "count(" in each.lower()]
+    assert counts == [], f"count queries: {counts}"
+
+
+@when('the Customer endpoint without children is executed with count=exact')
+def step_impl(context):
+    context.response = execute(context, customer_only_endpoint(), "page[limit]=100&count=exact")
+
+
+@when('a Customer is inserted, and the Customer endpoint without children is executed with count=exact')
+def step_impl(context):
+    context.session.add(models.Customer(name="Behave Count", balance=0, credit_limit=100))
+    context.session.flush()
+    context.response = execute(context, customer_only_endpoint(), "page[limit]=100&count=exact")
+
+
+@when('the transaction is rolled back, and the Customer endpoint without children is executed with count=exact')
+def step_impl(context):
+    context.session.rollback()
+    context.response = execute(context, customer_only_endpoint(), "page[limit]=100&count=exact")
+
+
+@then('totalQueryRecordsNumber is {count:d}')
+def step_impl(context, count):
+    assert context.response["totalQueryRecordsNumber"] == count, \
+        f"totalQueryRecordsNumber is {context.response['totalQueryRecordsNumber']}, expected {count}"
+
+
+def item_endpoint(**args):
+    """ Item, with fields as (attribute, alias), attribute and name """
+    from api.system.custom_endpoint import CustomEndpoint
+    return CustomEndpoint(model_class=models.Item, alias="Item", **args
+        , fields=[(models.Item.id, "ItemId"), models.Item.quantity, "amount"])
+
+
+def describe_item(row, table_row, parent_row):
+    row.Description = f"{row.quantity} of Product {table_row.product_id}"
+
+
+@when('the Item endpoint with aliased, attribute and named fields is executed')
+def step_impl(context):
+    context.response = execute(context, item_endpoint(), "page[limit]=100")
+
+
+@when('the Item endpoint with a calling function is executed')
+def step_impl(context):
+    context.response = execute(context, item_endpoint(calling=describe_item), "page[limit]=100")
+
+
+@then('Item rows have only the aliased, attribute and named fields')
+def step_impl(context):
+    items = {each_item.id: each_item for each_item in context.session.query(models.Item)}
+    assert len(context.response["Item"]) == len(items), f"Items returned: {context.response['Item']}"
+    for each_row in context.response["Item"]:
+        item = items[each_row["ItemId"]]
+        fields = {key: Decimal(value) if key == "amount" else value for key, value in each_row.items() if key != "CheckSum"}
+        assert fields == {"ItemId": item.id, "quantity": item.quantity, "amount": item.amount}, f"Item row is {each_row}"
+
+
+@then('Item rows have the attributes set by the calling function')
+def step_impl(context):
+    items = {each_item.id: each_item for each_item in context.session.query(models.Item)}
+    for each_row in context.response["Item"]:
+        item = items[each_row["ItemId"]]
+        assert each_row["Description"] == f"{item.quantity} of Product {item.product_id}", f"Item row is {each_row}"
+
+
+@when('the Customer endpoint is executed, read with get and streamed')
+def step_impl(context):
+    context.stdout = io.StringIO()
+    with contextlib.redirect_stdout(context.stdout):
+        execute(context, customer_endpoint(), "page[limit]=100")
+        with context.flask_app.test_request_context("/behave", query_string={"sysfilter": "equal(id:2)"}, method="GET"):
+            from flask import request
+            customer_endpoint().get(request, include="")
+        stream(context, customer_endpoint(), "page[limit]=100")
+
+
+@then('nothing was printed')
+def step_impl(context):
+    assert context.stdout.getvalue() == "", f"printed: {context.stdout.getvalue()}"
@@ -0,0 +1,201 @@
+import json
+import sys
+from behave import given, when, then
+from sqlalchemy.orm import declarative_base
+from database import models
+
+
+def search(context, entity_name: str, **payload) -> dict:
+    """ POST an Ontimize search - returns the response (dict) """
+    response = context.client.post(f"/ontimizeweb/services/rest/{entity_name}/search",
+                                   json={"filter": {}, "columns": [], "offset": 0, **payload})
+    assert response.status_code == 200, f"search failed: {response.status_code} {response.get_data(as_text=True)}"
+    return response.json
+
+
+@when('Customers are searched with pageSize {page_size:d}')
+def step_impl(context, page_size):
+    context.statements.clear()
+    context.response = search(context, "Customer", pageSize=page_size)
+
+
+@when('Customers are searched with pageSize {page_size:d}, and count "{count}"')
+def step_impl(context, page_size, count):
+    context.response = search(context, "Customer", pageSize=page_size, count=count)
+
+
+@then('{count:d} Customers are returned, and no rows were counted')
+def step_impl(context, count):
+    assert len(context.response["data"]) == count, f"Customers returned: {context.response['data']}"
+    counts = [each for each in context.statements if "count(" in each.lower()]
+    assert counts == [], f"count queries: {counts}"
+
+
+@then('{count:d} Customers are returned, and totalQueryRecordsNumber is {total:d}')
+def step_impl(context, count, total):
+    assert len(context.response["data"]) == count, f"Customers returned: {context.response['data']}"
+    assert context.response["totalQueryRecordsNumber"] == total, f"response is {context.response}"
+
+
+@given('the Customer model class is reloaded')
+def step_impl(context):
+    """ as after importlib.reload(database.models): the module holds a new Customer class """
+    from api.system import resource_registry
+    Base = declarative_base()
+
+    class Customer(Base):
+        __table__ = models.Customer.__table__
+    Customer.__module__ = models.__name__
+    models_module = sys.modules[models.__name__]
+    saved_customer = models_module.Customer
+    models_module.Customer = Customer
+    context.reloaded_class = Customer
+    context.undo.append(resource_registry.build)
+    context.undo.append(lambda: setattr(models_module, "Customer", saved_customer))
+
+
+@when('the Customer resource is looked up twice')
+def step_impl(context):
+    from api.system import resource_registry
+    context.resources = [resource_registry.resource("Customer"), resource_registry.resource("Customer")]
+
+
+@then('the same Customer resource is returned, with its columns and primary key')
+def step_impl(context):
+    first, second = context.resources
+    assert first is second, "Customer resource was rebuilt"
+    assert first["model"] is models.Customer, f"Customer resource model is {first['model']}"
+    assert list(first["columns"]) == ["id", "name", "balance", "credit_limit"], f"columns are {list(first['columns'])}"
+    assert first["primary_key"] == ("id",), f"primary key is {first['primary_key']}"
+
+
+@then('the Customer resource cannot be altered')
+def step_impl(context):
+    resource = context.resources[0]
+    for each_mapping, each_key in [(resource, "name"), (resource["columns"], "id"), (resource["attributes"][0], "name")]:
+        try:
+            each_mapping[each_key] = None
+        except TypeError:
+            continue
+        raise AssertionError(f"resource {each_mapping} was altered")
+
+
+@then('the Customer resource is for the reloaded class')
+def step_impl(context):
+    first, second = context.resources
+    assert first["model"] is context.reloaded_class, f"Customer resource model is {first['model']}"
+    assert first is second, "Customer resource was rebuilt again"
+
+
+@when('Items are aggregated by order_id, with AMOUNT and SUM(amount)')
+def step_impl(context):
+    response = context.client.post("/ontimizeweb/services/rest/Item/itemTypeAggregate",
+                                   json={"filter": {}, "columns": ["order_id", "AMOUNT", "SUM(amount)"]})
+    assert response.status_code == 200 and response.json["code"] == 0, f"aggregate failed: {response.get_data(as_text=True)}"
+    context.response = response.json
+
+
+@then("each Order's Item count is AMOUNT, and their total amount is SUM(amount)")
+def step_impl(context):
+    expected = {}
+    for each_item in context.session.query(models.Item):
+        count, amount = expected.get(each_item.order_id, (0, 0))
+        expected[each_item.order_id] = (count + 1, amount + float(each_item.amount))
+    actual = {each_row["order_id"]: (each_row["AMOUNT"], each_row["SUM(amount)"]) for each_row in context.response["data"]}
+    assert actual == expected, f"aggregates are {actual}, expected {expected}"
+
+
+@when('Items are aggregated by order_id, filtered by "{filter_key}"')
+def step_impl(context, filter_key):
+    from api.system import aggregate_query
+    from safrs.errors import ValidationError
+    try:
+        context.response = aggregate_query.aggregate(context.session, models.Item, ["order_id", "AMOUNT"], {filter_key: 1}, {})
+        context.error = None
+    except ValidationError as ex:
+        context.error = ex
+
+
+@then('the aggregate is rejected')
+def step_impl(context):
+    assert context.error is not None, f"aggregate returned {context.response}"
+    assert "Unknown filter column" in str(context.error.message), f"aggregate error is {context.error.message}"
+
+
+@when('Customers {first_key} and {second_key} are updated in 1 batch, with credit_limit {credit_limit:d}')
+def step_impl(context, first_key, second_key, credit_limit):
+    session = context.session
+    saved_limits = {each.id: each.credit_limit for each in session.query(models.Customer)}
+
+    def restore_limits():
+        for each_id, each_limit in saved_limits.items():
+            session.get(models.Customer, each_id).credit_limit = each_limit
+        session.commit()
+    context.undo.append(restore_limits)
+    rows = [{"filter": {"id": json.loads(each_key)}, "data": {"credit_limit": credit_limit}} for each_key in [first_key, second_key]]
+    context.response = context.client.patch("/ontimizeweb/services/rest/Customer", json=rows).json
+    session.expire_all()
+
+
+@then('the batch is written, and Customers 2 and 3 have credit_limit {credit_limit:d}')
+def step_impl(context, credit_limit):
+    assert context.response["code"] == 0, f"batch failed: {context.response}"
+    limits = [context.session.get(models.Customer, each_id).credit_limit for each_id in [2, 3]]
+    assert limits == [credit_limit, credit_limit], f"credit limits are {limits}"
+
+
+@then('the batch is rejected for Customer "x", and Customer 3 has credit_limit {credit_limit:d}')
+def step_impl(context, credit_limit):
+    assert context.response["code"] == 1, f"batch written: {context.response}"
+    messages = [each_result["message"] for each_result in context.response["data"]]
+    assert "must be int" in messages[0], f"results are {context.response['data']}"
+    assert context.session.get(models.Customer, 3).credit_limit == credit_limit, "Customer 3 was written"
+
+
+@when('a Customer filter clause is built for "{attribute_key}", and for "{other_key}"')
+def step_impl(context, attribute_key, other_key):
+    from api.system import expression_parser
+    from safrs.errors import ValidationError
+    context.clause = expression_parser.filterClause(models.Customer, {attribute_key: "Customer 2"})
+    try:
+        context.other_clause = expression_parser.filterClause(models.Customer, {other_key: "Customer 2"})
+        context.error = None
+    except ValidationError as ex:
+        context.error = ex
+
+
+@then('the clause compares the name attribute, and the other key is rejected')
+def step_impl(context):
+    customer_ids = [each.id for each in context.session.query(models.Customer).filter(context.clause)]
+    assert customer_ids == [2], f"clause {context.clause} finds Customers {customer_ids}"
+    assert context.error is not None, f"clause built for the other key: {context.other_clause}"
+
+
+@when('a filter arg is parsed, altered, and parsed again')
+def step_impl(context):
+    from api.system import expression_parser
+    filter_arg = json.dumps({"name": "Alice", "orders": [1, 2]})
+    first = expression_parser._loadFilterArg(filter_arg)
+    first["name"] = "Altered"
+    first["orders"].append(3)
+    context.parsed = expression_parser._loadFilterArg(filter_arg)
+
+
+@then('the second parse is not altered')
+def step_impl(context):
+    assert context.parsed == {"name": "Alice", "orders": [1, 2]}, f"parsed filter arg is {context.parsed}"
+
+
+@given('Customers are filtered by name')
+def step_impl(context):
+    from api.system import expression_parser
+    context.filtered_class = models.Customer
+    expression_parser.advancedFilter(models.Customer, {"filter[name]": json.dumps("Alice")})
+    assert models.Customer in expression_parser._attribute_names, "Customer attribute names not cached"
+
+
+@then('the expression parser has no metadata for the replaced Customer class')
+def step_impl(context):
+    from api.system import expression_parser
+    assert context.filtered_class not in expression_parser._attribute_names, "replaced Customer attribute names are cached"
+    assert not any(each_key[0] is context.filtered_class for each_key in expression_parser._plans), "replaced Customer plans are cached"